@@ -0,0 +1,272 @@
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+from llm_backends import LLMBackend
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; maps to HTTP 429 with Retry-After."""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Request rejected ({reason}), retry after {self.retry_after_header}s")
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+# ─────────────────────────────────────────────────────────────
+# PER-USER TOKEN BUCKETS
+# ─────────────────────────────────────────────────────────────
+
+class UserRateLimiter:
+    """Token bucket per user: ``rate`` requests/second with bursts of ``burst``.
+
+    Buckets are kept in LRU order and capped at ``max_users``; a user whose
+    bucket was dropped simply starts again with a full bucket.
+    """
+
+    def __init__(self, rate: float, burst: float, max_users: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+
+        # user_id -> [tokens, last refill time]
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, user_id: str) -> float:
+        """Take one token; returns 0 on success, else seconds until one is available."""
+        if self.rate <= 0:
+            return 0.0
+
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = self._buckets[user_id] = [self.burst, now]
+                if len(self._buckets) > self.max_users:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(user_id)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / self.rate
+
+
+# ─────────────────────────────────────────────────────────────
+# GLOBAL UPSTREAM CONCURRENCY LIMIT
+# ─────────────────────────────────────────────────────────────
+
+class UpstreamLimiter:
+    """Caps in-flight upstream calls, with a bounded FIFO wait queue.
+
+    A call that finds every slot busy waits in the queue for at most
+    ``queue_timeout`` seconds. When the queue already holds ``max_queue``
+    waiters the call is rejected immediately instead of piling up.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._avg_call_seconds = 1.0
+
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> float:
+        """Rough time for the current backlog to drain."""
+        backlog = self.queue_depth + 1
+        return backlog * self._avg_call_seconds / max(self.max_in_flight, 1)
+
+    def saturated(self) -> bool:
+        return self.in_flight >= self.max_in_flight and self.queue_depth >= self.max_queue
+
+    async def acquire(self):
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        if self.queue_depth >= self.max_queue:
+            self.rejected_full += 1
+            raise AdmissionRejected("queue_full", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            # The slot is handed over by release(), so in_flight is already counted
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+            self.admitted += 1
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the deadline hit: keep the slot
+                self.admitted += 1
+                return
+            waiter.cancel()
+            self.rejected_timeout += 1
+            raise AdmissionRejected("queue_timeout", self.retry_after())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, call_seconds: Optional[float] = None):
+        if call_seconds is not None:
+            self._avg_call_seconds = 0.9 * self._avg_call_seconds + 0.1 * call_seconds
+
+        # Hand the slot straight to the oldest live waiter
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+
+# ─────────────────────────────────────────────────────────────
+# ADMISSION-CONTROLLED BACKEND
+# ─────────────────────────────────────────────────────────────
+
+class AdmittedBackend(LLMBackend):
+    """Wraps a backend so every upstream call holds an UpstreamLimiter slot.
+
+    Chat sessions, one-shot calls and streams all go through ``complete`` or
+    ``stream``, so nothing reaches the model without admission.
+    """
+
+    def __init__(self, backend: LLMBackend, limiter: UpstreamLimiter):
+        super().__init__(backend.model_name, backend.generation_config)
+        self.backend = backend
+        self.limiter = limiter
+        self.name = backend.name
+
+    async def complete(self, contents: List[Dict], system_instruction: Optional[Dict] = None) -> str:
+        async with self.limiter.slot():
+            return await self.backend.complete(contents, system_instruction)
+
+    async def stream(self, contents: List[Dict], system_instruction: Optional[Dict] = None) -> AsyncIterator[str]:
+        async with self.limiter.slot():
+            async for chunk in self.backend.stream(contents, system_instruction):
+                yield chunk
+
+    async def close(self):
+        await self.backend.close()
+
+    def __getattr__(self, name):
+        # Backend-specific helpers (e.g. the fake backend's stats)
+        return getattr(self.backend, name)
+
+
+# ─────────────────────────────────────────────────────────────
+# ADMISSION CONTROLLER
+# ─────────────────────────────────────────────────────────────
+
+class AdmissionController:
+    """Per-user rate limits plus the shared upstream limiter."""
+
+    def __init__(self, users: UserRateLimiter, upstream: UpstreamLimiter):
+        self.users = users
+        self.upstream = upstream
+        self.rejected_rate = 0
+
+    def admit(self, user_id: Optional[str]):
+        """Charge one request to the user's bucket; raises AdmissionRejected."""
+        if user_id:
+            wait = self.users.acquire(str(user_id))
+            if wait:
+                self.rejected_rate += 1
+                raise AdmissionRejected("rate_limited", wait)
+
+    def check_capacity(self):
+        """Fail fast when the upstream queue is already full."""
+        if self.upstream.saturated():
+            self.upstream.rejected_full += 1
+            raise AdmissionRejected("queue_full", self.upstream.retry_after())
+
+    def wrap(self, backend: LLMBackend) -> AdmittedBackend:
+        return AdmittedBackend(backend, self.upstream)
+
+    def stats(self) -> Dict:
+        upstream = self.upstream
+        return {
+            "in_flight": upstream.in_flight,
+            "max_in_flight": upstream.max_in_flight,
+            "queue_depth": upstream.queue_depth,
+            "max_queue": upstream.max_queue,
+            "admitted": upstream.admitted,
+            "queued": upstream.queued,
+            "rejected": {
+                "rate_limited": self.rejected_rate,
+                "queue_full": upstream.rejected_full,
+                "queue_timeout": upstream.rejected_timeout,
+            },
+        }
+
+
+# ─────────────────────────────────────────────────────────────
+# GLOBAL CONTROLLER ACCESSOR
+# ─────────────────────────────────────────────────────────────
+
+_admission: Optional[AdmissionController] = None
+
+
+def get_admission() -> AdmissionController:
+    """Return the process-wide AdmissionController (singleton pattern)."""
+
+    global _admission
+
+    if _admission is None:
+        _admission = AdmissionController(
+            users=UserRateLimiter(
+                rate=float(os.getenv("CHATBOT_USER_RATE", 1.0)),
+                burst=float(os.getenv("CHATBOT_USER_BURST", 10)),
+            ),
+            upstream=UpstreamLimiter(
+                max_in_flight=int(os.getenv("CHATBOT_MAX_UPSTREAM_CALLS", 64)),
+                max_queue=int(os.getenv("CHATBOT_UPSTREAM_QUEUE_SIZE", 256)),
+                queue_timeout=float(os.getenv("CHATBOT_UPSTREAM_QUEUE_TIMEOUT", 10)),
+            ),
+        )
+
+    return _admission
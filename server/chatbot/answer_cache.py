@@ -0,0 +1,273 @@
+import os
+import re
+import zlib
+import random
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+_APOSTROPHE_RE = re.compile(r"['\u2019]")
+# Everything but word characters, whitespace, math operators and decimal points
+_PUNCTUATION_RE = re.compile(r"[^\w\s.+\-*/^=<>%\u00d7\u00f7]+|(?<!\d)\.|\.(?!\d)")
+_OPERATOR_RE = re.compile(r"([+\-*/^=<>%\u00d7\u00f7])")
+_WHITESPACE_RE = re.compile(r"\s+")
+_ROMAN_NUMERAL_RE = re.compile(r"^[ivxlcdm]+$")
+
+# Negating and restricting words (contractions as normalize_text leaves them)
+NEGATION_WORDS = frozenset({
+    "no", "not", "nor", "never", "neither", "none", "nothing", "cannot",
+    "without", "except", "excluding", "exclude", "besides", "unless", "only",
+    "dont", "doesnt", "didnt", "isnt", "arent", "wasnt", "werent", "cant",
+    "wont", "shouldnt", "wouldnt", "couldnt", "hasnt", "havent", "hadnt",
+})
+
+# Mersenne prime used for the MinHash permutations
+_MINHASH_PRIME = (1 << 61) - 1
+
+
+def normalize_text(text: str) -> str:
+    """Case-fold, strip punctuation and collapse whitespace.
+
+    Math operators and decimal points are kept (operators as tokens of their
+    own), so "2+3" and "2*3" stay different questions.
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _APOSTROPHE_RE.sub("", text)
+    text = _PUNCTUATION_RE.sub(" ", text)
+    text = _OPERATOR_RE.sub(r" \1 ", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def word_tokens(text: str) -> FrozenSet[str]:
+    """Distinct words (and operators) of normalized text."""
+    return frozenset(text.split())
+
+
+def key_tokens(text: str) -> Tuple[str, ...]:
+    """Tokens a near-duplicate must repeat exactly, in order.
+
+    Numbers, operators, short words, roman numerals and negating words
+    change what a study question asks ("x^2" / "x^3", "World War I" /
+    "World War II", "... except Earth") while barely moving its similarity,
+    so they are compared exactly instead.
+    """
+    return tuple(
+        token for token in text.split()
+        if len(token) <= 3
+        or token in NEGATION_WORDS
+        or any(char.isdigit() for char in token)
+        or _OPERATOR_RE.fullmatch(token)
+        or _ROMAN_NUMERAL_RE.match(token)
+    )
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# ─────────────────────────────────────────────────────────────
+# MINHASH SIGNATURES
+# ─────────────────────────────────────────────────────────────
+
+class MinHasher:
+    """Deterministic MinHash over crc32-hashed tokens (no network, no numpy)."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [
+            (rng.randrange(1, _MINHASH_PRIME), rng.randrange(0, _MINHASH_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, tokens: FrozenSet[str]) -> Tuple[int, ...]:
+        hashes = [zlib.crc32(token.encode("utf-8")) for token in tokens]
+        return tuple(
+            min((a * h + b) % _MINHASH_PRIME for h in hashes)
+            for a, b in self._perms
+        )
+
+
+# ─────────────────────────────────────────────────────────────
+# STUDY-HELP ANSWER CACHE
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class CachedAnswer:
+    subject: str
+    exact_key: Tuple[str, str, str]
+    tokens: FrozenSet[str]
+    key_tokens: Tuple[str, ...]
+    band_keys: List[Tuple[int, Tuple[int, ...]]]
+    answer: str
+
+
+@dataclass
+class AnswerHit:
+    answer: str
+    match: str          # "exact" or "similar"
+    score: float
+
+
+class StudyAnswerCache:
+    """Local answer cache for /chat/study-help.
+
+    Exact hits use a normalized (subject, topic, question) key. Near-duplicate
+    hits use a per-subject MinHash LSH index over the words of the topic and
+    question. A candidate from the LSH buckets must repeat every number,
+    operator, short word and negating word exactly (``key_tokens``), differ
+    only by added or reordered words (one word set contains the other) and
+    reach ``threshold`` word Jaccard similarity. The cache holds at most
+    ``max_entries`` answers and evicts the least recently used.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        num_perm: int = 64,
+        bands: int = 16,
+    ):
+        if threshold is None:
+            threshold = float(os.getenv("CHATBOT_STUDY_CACHE_THRESHOLD", 0.85))
+        if max_entries is None:
+            max_entries = int(os.getenv("CHATBOT_STUDY_CACHE_SIZE", 5000))
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm=bands * self.rows)
+
+        self._entries: "OrderedDict[Tuple[str, str, str], CachedAnswer]" = OrderedDict()
+        # subject -> band key -> exact keys of answers in that bucket
+        self._buckets: Dict[str, Dict[Tuple[int, Tuple[int, ...]], Set[Tuple[str, str, str]]]] = {}
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ─────────────────────────────────────────────────────────────
+    # KEYS
+    # ─────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _exact_key(subject: str, topic: str, question: str) -> Tuple[str, str, str]:
+        return normalize_text(subject), normalize_text(topic), normalize_text(question)
+
+    def _band_keys(self, tokens: FrozenSet[str]) -> List[Tuple[int, Tuple[int, ...]]]:
+        signature = self.hasher.signature(tokens)
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    # ─────────────────────────────────────────────────────────────
+    # LOOKUP / STORE
+    # ─────────────────────────────────────────────────────────────
+
+    def lookup(self, subject: str, topic: str, question: str) -> Optional[AnswerHit]:
+        key = self._exact_key(subject, topic, question)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return AnswerHit(entry.answer, "exact", 1.0)
+
+            partition = self._buckets.get(key[0])
+            if partition:
+                text = f"{key[1]} {key[2]}"
+                tokens, required = word_tokens(text), key_tokens(text)
+                candidates: Set[Tuple[str, str, str]] = set()
+                for band_key in self._band_keys(tokens):
+                    candidates.update(partition.get(band_key, ()))
+
+                best_key, best_score = None, 0.0
+                for candidate in candidates:
+                    entry = self._entries[candidate]
+                    # Only reworded or padded questions, never a swapped word
+                    if entry.key_tokens != required or not (tokens <= entry.tokens or entry.tokens <= tokens):
+                        continue
+                    score = jaccard(tokens, entry.tokens)
+                    if score > best_score:
+                        best_key, best_score = candidate, score
+
+                if best_key is not None and best_score >= self.threshold:
+                    self._entries.move_to_end(best_key)
+                    self.similar_hits += 1
+                    return AnswerHit(self._entries[best_key].answer, "similar", best_score)
+
+            self.misses += 1
+            return None
+
+    def store(self, subject: str, topic: str, question: str, answer: str):
+        key = self._exact_key(subject, topic, question)
+        text = f"{key[1]} {key[2]}"
+        tokens = word_tokens(text)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            entry = CachedAnswer(key[0], key, tokens, key_tokens(text), self._band_keys(tokens), answer)
+            self._entries[key] = entry
+
+            partition = self._buckets.setdefault(entry.subject, {})
+            for band_key in entry.band_keys:
+                partition.setdefault(band_key, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Tuple[str, str, str]):
+        entry = self._entries.pop(key)
+        partition = self._buckets.get(entry.subject, {})
+        for band_key in entry.band_keys:
+            bucket = partition.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del partition[band_key]
+        if not partition:
+            self._buckets.pop(entry.subject, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "subjects": len(self._buckets),
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# ─────────────────────────────────────────────────────────────
+# GLOBAL CACHE ACCESSOR
+# ─────────────────────────────────────────────────────────────
+
+_answer_cache: Optional[StudyAnswerCache] = None
+
+
+def get_answer_cache() -> StudyAnswerCache:
+    """Return the process-wide StudyAnswerCache (singleton pattern)."""
+
+    global _answer_cache
+
+    if _answer_cache is None:
+        _answer_cache = StudyAnswerCache()
+
+    return _answer_cache
@@ -1,61 +1,97 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import os
+import time
 import logging
 from dotenv import load_dotenv
-import asyncio
 
-# Import chatbot modules
-from chatbot_service import get_chatbot_service
-from chatbot_context import ChatbotContext, UserProfile
-
-# Load environment variables
+# Load environment variables before the chatbot modules read their settings
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Import chatbot modules (cheap: the LLM backend and knowledge-base index
+# are built by the readiness warm-up, not at import)
+from async_runtime import get_background_loop
+from logging_setup import (
+    REQUEST_ID_HEADER,
+    bind_request_id,
+    configure_logging,
+    run_with_request_id,
+    stream_with_request_id,
+)
+from readiness import get_readiness
+from static_content import StaticContent
+import handlers
+
+# Structured logging through a background queue (CHATBOT_LOG_* settings)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
 
-# Global chatbot instance
-chatbot_service = get_chatbot_service()
+# One long-lived event loop shared by every worker thread
+background_loop = get_background_loop()
 
-# Per-user contexts
-user_contexts = {}
+# Build the LLM backend and knowledge-base index in the background; /readyz
+# answers 200 once done, then knowledge-base answers are pre-generated
+background_loop.loop.call_soon_threadsafe(get_readiness().start)
 
+# Per-user sessions (shared with the ASGI app through handlers)
+user_sessions = handlers.user_sessions
+get_user_context = handlers.get_user_context
 
-# -------------------------------------------------------------------------
-# Context Management
-# -------------------------------------------------------------------------
-def get_user_context(user_id: str, user_data: dict = None) -> ChatbotContext:
-    """Retrieve or create a user's ChatbotContext."""
-    if user_id not in user_contexts:
-        profile = UserProfile(
-            user_id=user_id,
-            name=user_data.get("name", "") if user_data else "",
-            email=user_data.get("email", "") if user_data else "",
-            study_level=user_data.get("study_level", "beginner") if user_data else "beginner",
-            subjects_of_interest=user_data.get("subjects_of_interest", []) if user_data else [],
-            is_registered=user_data.get("is_registered", True) if user_data else True,
-        )
-        user_contexts[user_id] = ChatbotContext(profile)
 
-    return user_contexts[user_id]
+def dispatch(handler, data=None):
+    """Run an async handler on the background loop and jsonify its result."""
+    # The caller's X-Request-ID (or a new one) tags every log line of the request
+    request_id = bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+
+    start = time.perf_counter()
+    payload, status, headers = handlers.split_result(
+        background_loop.run(run_with_request_id(request_id, handler(data if data is not None else {})))
+    )
+    if isinstance(payload, StaticContent):
+        status, payload, content_headers = payload.respond(
+            request.headers.get("If-None-Match"), request.headers.get("Accept-Encoding")
+        )
+        headers = {**content_headers, **headers}
+    handlers.observe_request(request.method, request.url_rule.rule, status, time.perf_counter() - start)
+    headers = {**headers, REQUEST_ID_HEADER: request_id}
+
+    if hasattr(payload, "__aiter__"):
+        return Response(
+            background_loop.iterate(stream_with_request_id(request_id, payload)),
+            status=status,
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **headers}
+        )
+    if isinstance(payload, (str, bytes)):
+        return Response(payload, status=status, headers=headers)
+    return jsonify(payload), status, headers
 
 
 # -------------------------------------------------------------------------
-# Health Check
+# Health Check & Metrics
 # -------------------------------------------------------------------------
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({
-        "status": "healthy",
-        "service": "ProgressBrain Chatbot API",
-        "version": "1.0.0"
-    }), 200
+    return dispatch(handlers.health)
+
+
+@app.route("/livez", methods=["GET"])
+def livez():
+    return dispatch(handlers.liveness)
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    return dispatch(handlers.readiness)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return dispatch(handlers.metrics_text)
 
 
 # -------------------------------------------------------------------------
@@ -63,70 +99,12 @@ def health():
 # -------------------------------------------------------------------------
 @app.route("/chat/generate", methods=["POST"])
 def generate_response():
-    try:
-        data = request.json
-        user_id = data.get("user_id")
-        user_message = data.get("user_message")
-        context = data.get("context", {})
-        subject = data.get("subject")
-        topic = data.get("topic")
-
-        if not user_id or not user_message:
-            return jsonify({"error": "user_id and user_message are required"}), 400
-
-        # Retrieve or create context
-        user_ctx = get_user_context(user_id, context)
-
-        # Update user profile fields
-        user_ctx.user_profile.name = context.get("name", user_ctx.user_profile.name)
-        user_ctx.user_profile.email = context.get("email", user_ctx.user_profile.email)
-        user_ctx.user_profile.study_level = context.get("study_level", user_ctx.user_profile.study_level)
-        user_ctx.user_profile.subjects_of_interest = context.get(
-            "subjects_of_interest",
-            user_ctx.user_profile.subjects_of_interest
-        )
-        user_ctx.user_profile.is_registered = context.get(
-            "is_registered",
-            user_ctx.user_profile.is_registered
-        )
+    return dispatch(handlers.generate_response, request.json)
 
-        if "preferences" in context:
-            user_ctx.user_profile.preferences.update(context["preferences"])
-
-        # Build prompts
-        system_prompt = user_ctx.build_system_prompt()
-        context_prompt = user_ctx.get_response_prompt(user_message)
-
-        # Generate chatbot response
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            response = loop.run_until_complete(
-                chatbot_service.generate_response(
-                    user_message=user_message,
-                    user_id=user_id,
-                    system_prompt=system_prompt,
-                    context_prompt=context_prompt
-                )
-            )
-        finally:
-            loop.close()
-
-        # Save conversation memory
-        user_ctx.memory.add_exchange(
-            user_message,
-            response,
-            {"subject": subject, "topic": topic}
-        )
 
-        return jsonify({
-            "response": response,
-            "timestamp": user_ctx.session_start_time.isoformat()
-        }), 200
-
-    except Exception as e:
-        logger.error(f"Error in generate_response: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+@app.route("/chat/generate/stream", methods=["POST"])
+def generate_response_stream():
+    return dispatch(handlers.generate_response_stream, request.json)
 
 
 # -------------------------------------------------------------------------
@@ -134,50 +112,7 @@ def generate_response():
 # -------------------------------------------------------------------------
 @app.route("/chat/feature-info", methods=["POST"])
 def feature_info():
-    try:
-        data = request.json
-        feature = data.get("feature")
-        user_id = data.get("user_id")
-
-        if not feature:
-            return jsonify({"error": "feature is required"}), 400
-
-        user_ctx = get_user_context(user_id)
-        feature_data = user_ctx.knowledge_base.get_feature_info(feature)
-
-        if not feature_data:
-            return jsonify({"error": f"Feature '{feature}' not found"}), 404
-
-        explanation_prompt = f"""
-Explain the '{feature}' feature of ProgressBrain in a beginner-friendly, clear way.
-
-Feature Details:
-- Description: {feature_data['description']}
-- How to use: {feature_data['how_to']}
-- Benefits: {', '.join(feature_data['benefits'])}
-- Tips: {', '.join(feature_data['tips'])}
-
-Write an engaging explanation combining these elements.
-"""
-
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            response = loop.run_until_complete(
-                chatbot_service.model.generate_content(explanation_prompt)
-            )
-            explanation = response.text
-        finally:
-            loop.close()
-
-        return jsonify({
-            "explanation": explanation,
-            "feature": feature
-        }), 200
-
-    except Exception as e:
-        logger.error(f"Error in feature_info: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+    return dispatch(handlers.feature_info, request.json)
 
 
 # -------------------------------------------------------------------------
@@ -185,47 +120,7 @@ Write an engaging explanation combining these elements.
 # -------------------------------------------------------------------------
 @app.route("/chat/registration-guidance", methods=["POST"])
 def registration_guidance():
-    try:
-        data = request.json
-        step = data.get("step", 1)
-        user_id = data.get("user_id")
-
-        if step < 1 or step > 4:
-            return jsonify({"error": "Step must be 1–4"}), 400
-
-        user_ctx = get_user_context(user_id)
-        step_data = user_ctx.knowledge_base.get_registration_step(step)
-
-        if not step_data:
-            return jsonify({"error": f"Step {step} not found"}), 404
-
-        guidance_prompt = f"""
-Provide warm, encouraging guidance for Step {step} of ProgressBrain registration.
-
-Step Title: {step_data['title']}
-Description: {step_data['description']}
-Fields Required: {', '.join(step_data['fields'])}
-Tips: {', '.join(step_data['tips'])}
-{f"Action: {step_data['action']}" if "action" in step_data else ""}
-
-Help the user feel confident and informed.
-"""
-
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            response = loop.run_until_complete(
-                chatbot_service.model.generate_content(guidance_prompt)
-            )
-            guidance = response.text
-        finally:
-            loop.close()
-
-        return jsonify({"guidance": guidance, "step": step}), 200
-
-    except Exception as e:
-        logger.error(f"Error in registration_guidance: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+    return dispatch(handlers.registration_guidance, request.json)
 
 
 # -------------------------------------------------------------------------
@@ -233,55 +128,7 @@ Help the user feel confident and informed.
 # -------------------------------------------------------------------------
 @app.route("/chat/study-help", methods=["POST"])
 def study_help():
-    try:
-        data = request.json
-        subject = data.get("subject")
-        topic = data.get("topic")
-        question = data.get("question")
-        user_id = data.get("user_id")
-
-        if not all([subject, topic, question]):
-            return jsonify({"error": "subject, topic, and question are required"}), 400
-
-        user_ctx = get_user_context(user_id)
-
-        study_prompt = f"""
-Help a student understand a concept clearly.
-
-Subject: {subject}
-Topic: {topic}
-Question: {question}
-
-Use simple explanation, examples, analogies, and encouragement.
-Keep it conversational and friendly.
-"""
-
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            response = loop.run_until_complete(
-                chatbot_service.model.generate_content(study_prompt)
-            )
-            help_text = response.text
-        finally:
-            loop.close()
-
-        # Save memory
-        user_ctx.memory.add_exchange(
-            question,
-            help_text,
-            {"subject": subject, "topic": topic}
-        )
-
-        return jsonify({
-            "help": help_text,
-            "subject": subject,
-            "topic": topic
-        }), 200
-
-    except Exception as e:
-        logger.error(f"Error in study_help: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+    return dispatch(handlers.study_help, request.json)
 
 
 # -------------------------------------------------------------------------
@@ -289,54 +136,25 @@ Keep it conversational and friendly.
 # -------------------------------------------------------------------------
 @app.route("/chat/motivation", methods=["POST"])
 def motivation():
-    try:
-        data = request.json
-        user_name = data.get("user_name", "Friend")
-        streak = data.get("streak", 0)
-        user_id = data.get("user_id")
-
-        motivation_prompt = f"""
-Generate a short, positive motivational message.
-
-Name: {user_name}
-Streak: {f'{streak}-day streak!' if streak > 0 else 'Just beginning.'}
-
-Make it supportive, warm, and under 3 sentences.
-"""
-
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            response = loop.run_until_complete(
-                chatbot_service.model.generate_content(motivation_prompt)
-            )
-            message = response.text
-        finally:
-            loop.close()
-
-        return jsonify({"message": message}), 200
-
-    except Exception as e:
-        logger.error(f"Error in motivation: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+    return dispatch(handlers.motivation, request.json)
 
 
 # -------------------------------------------------------------------------
-# FAQ
+# Static Knowledge-Base Content (FAQ, features, registration flow)
 # -------------------------------------------------------------------------
 @app.route("/chat/faq", methods=["GET"])
 def get_faq():
-    try:
-        temp_ctx = get_user_context("temp")
-        faq_items = [
-            {"question": item["q"], "answer": item["a"]}
-            for _, item in temp_ctx.knowledge_base.FAQ.items()
-        ]
-        return jsonify({"faq": faq_items}), 200
+    return dispatch(handlers.get_faq)
 
-    except Exception as e:
-        logger.error(f"Error in get_faq: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+
+@app.route("/chat/features", methods=["GET"])
+def get_features():
+    return dispatch(handlers.get_features)
+
+
+@app.route("/chat/registration-flow", methods=["GET"])
+def get_registration_flow():
+    return dispatch(handlers.get_registration_flow)
 
 
 # -------------------------------------------------------------------------
@@ -344,19 +162,15 @@ def get_faq():
 # -------------------------------------------------------------------------
 @app.route("/chat/clear", methods=["POST"])
 def clear_context():
-    try:
-        data = request.json
-        user_id = data.get("user_id")
+    return dispatch(handlers.clear_context, request.json)
 
-        if user_id in user_contexts:
-            del user_contexts[user_id]
-            chatbot_service.clear_session(user_id)
 
-        return jsonify({"message": "Context cleared successfully"}), 200
-
-    except Exception as e:
-        logger.error(f"Error in clear_context: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+# -------------------------------------------------------------------------
+# Batch Operations
+# -------------------------------------------------------------------------
+@app.route("/chat/batch", methods=["POST"])
+def batch():
+    return dispatch(handlers.batch, request.json)
 
 
 # -------------------------------------------------------------------------
@@ -0,0 +1,188 @@
+"""
+ASGI serving mode for the ProgressBrain chatbot.
+
+Runs every route on a single long-lived event loop with a pooled, non-blocking
+Gemini client, so one process can hold hundreds of concurrent chats without a
+thread per request:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+"""
+
+import json
+import time
+import logging
+from typing import Dict, List, Tuple
+
+from dotenv import load_dotenv
+
+# Load environment variables before the chatbot modules read their settings
+load_dotenv()
+
+from async_runtime import run_until_disconnect
+from chatbot_service import peek_chatbot_service
+from logging_setup import REQUEST_ID_HEADER, bind_request_id, configure_logging
+from readiness import get_readiness
+from motivation_pool import get_motivation_pool
+from response_cache import get_response_cache
+from static_content import StaticContent
+import handlers
+
+# Structured logging through a background queue (CHATBOT_LOG_* settings)
+configure_logging()
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER_KEY = REQUEST_ID_HEADER.lower().encode()
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-headers", b"Content-Type, X-Request-ID, If-None-Match"),
+    (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+]
+
+
+# -------------------------------------------------------------------------
+# Request / Response Helpers
+# -------------------------------------------------------------------------
+async def read_body(receive) -> bytes:
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+
+async def send_json(send, payload: Dict, status: int, headers: List[Tuple[bytes, bytes]] = None):
+    await send_body(send, json.dumps(payload).encode("utf-8"), status, [(b"content-type", b"application/json"), *(headers or [])])
+
+
+async def send_body(send, body: bytes, status: int, headers: List[Tuple[bytes, bytes]]):
+    """Send a complete response; ``headers`` must include the content-type (except on a 304)."""
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            *headers,
+            (b"content-length", str(len(body)).encode()),
+            *CORS_HEADERS,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_stream(send, stream, status: int, headers: List[Tuple[bytes, bytes]] = None):
+    """Forward server-sent event frames to the client as they are produced."""
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+            *CORS_HEADERS,
+            *(headers or []),
+        ],
+    })
+    try:
+        async for frame in stream:
+            await send({"type": "http.response.body", "body": frame.encode("utf-8"), "more_body": True})
+    finally:
+        await stream.aclose()
+    await send({"type": "http.response.body", "body": b""})
+
+
+# -------------------------------------------------------------------------
+# Lifespan
+# -------------------------------------------------------------------------
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Start serving right away; the warm-up flips /readyz when done
+            get_readiness().start()
+            logger.info("ProgressBrain Chatbot ASGI app started")
+            await send({"type": "lifespan.startup.complete"})
+
+        elif message["type"] == "lifespan.shutdown":
+            await get_readiness().stop()
+            await get_response_cache().stop()
+            await get_motivation_pool().stop()
+            service = peek_chatbot_service()
+            if service is not None:
+                await service.close()
+            if handlers.persistence is not None:
+                handlers.persistence.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+# -------------------------------------------------------------------------
+# ASGI Application
+# -------------------------------------------------------------------------
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    if scope["type"] != "http":
+        return
+
+    method = scope["method"]
+    path = scope["path"].rstrip("/") or "/"
+
+    if method == "OPTIONS":
+        await send({"type": "http.response.start", "status": 204, "headers": CORS_HEADERS})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    handler = handlers.ROUTES.get((method, path))
+    if handler is None:
+        allowed = any(route_path == path for _, route_path in handlers.ROUTES)
+        status = 405 if allowed else 404
+        await send_json(send, {"error": "Method not allowed" if allowed else "Not found"}, status)
+        return
+
+    # The caller's X-Request-ID (or a new one) tags every log line of the request
+    request_headers = dict(scope["headers"])
+
+    if (method, path) in handlers.INTERNAL_ROUTES:
+        secret = request_headers.get(handlers.WORKER_SECRET_HEADER.lower().encode(), b"").decode("latin-1")
+        client_host = (scope.get("client") or (None,))[0]
+        if not handlers.internal_request_allowed(secret, client_host):
+            logger.warning(f"Rejected {method} {path} from {client_host}")
+            await send_json(send, {"error": "Forbidden"}, 403)
+            return
+    request_id = bind_request_id(request_headers.get(REQUEST_ID_HEADER_KEY, b"").decode("latin-1"))
+
+    body = await read_body(receive)
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        await send_json(send, {"error": "Invalid JSON body"}, 400)
+        return
+
+    async def respond():
+        start = time.perf_counter()
+        payload, status, headers = handlers.split_result(await handler(data))
+        if isinstance(payload, StaticContent):
+            status, payload, content_headers = payload.respond(
+                request_headers.get(b"if-none-match", b"").decode("latin-1"),
+                request_headers.get(b"accept-encoding", b"").decode("latin-1"),
+            )
+            headers = {**content_headers, **headers}
+        handlers.observe_request(method, path, status, time.perf_counter() - start)
+
+        extra_headers = [(name.lower().encode(), str(value).encode()) for name, value in headers.items()]
+        extra_headers.append((REQUEST_ID_HEADER_KEY, request_id.encode("latin-1")))
+        if hasattr(payload, "__aiter__"):
+            await send_stream(send, payload, status, extra_headers)
+        elif isinstance(payload, bytes):
+            await send_body(send, payload, status, extra_headers)
+        elif isinstance(payload, str):
+            await send_body(send, payload.encode("utf-8"), status, extra_headers)
+        else:
+            await send_json(send, payload, status, extra_headers)
+
+    # A client that goes away cancels the handler and its upstream calls
+    await run_until_disconnect(receive, respond())
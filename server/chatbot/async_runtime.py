@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import queue
+import threading
+import contextvars
+from typing import Any, AsyncIterator, Awaitable, Coroutine, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────────────────────
+# LONG-LIVED EVENT LOOP FOR THE WSGI (FLASK) SERVING MODE
+# ─────────────────────────────────────────────────────────────
+
+class BackgroundLoop:
+    """Runs one asyncio event loop on a daemon thread.
+
+    WSGI worker threads submit coroutines here instead of creating a new
+    event loop per request, so every upstream call in the process shares one
+    loop and one pooled HTTP client.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self.start()
+        return self._loop
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=self._run_forever,
+                name="chatbot-event-loop",
+                daemon=True,
+            )
+            self._thread.start()
+            logger.info("Background event loop started")
+
+    def _run_forever(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the background loop and block until it finishes."""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return future.result(timeout)
+
+    def iterate(self, stream: AsyncIterator) -> Iterator:
+        """Drain an async iterator on the background loop from a worker thread.
+
+        The iterator is driven by a single task on the loop and its items are
+        handed over through a thread-safe queue. Closing the returned generator
+        (e.g. when the client disconnects) cancels that task.
+        """
+        items: queue.Queue = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in stream:
+                    items.put(item)
+            finally:
+                items.put(done)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        try:
+            while True:
+                item = items.get()
+                if item is done:
+                    break
+                yield item
+            future.result()
+        finally:
+            future.cancel()
+
+    def stop(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            if self._thread is not None:
+                self._thread.join(timeout=5)
+            self._loop.close()
+            self._loop = None
+            self._thread = None
+
+
+# ─────────────────────────────────────────────────────────────
+# BACKGROUND TASKS
+# ─────────────────────────────────────────────────────────────
+
+def create_task_in(context: contextvars.Context, coro: Coroutine) -> asyncio.Task:
+    """Start ``coro`` as a task on the running loop, in a copy of ``context``.
+
+    Like ``create_task(coro, context=context)``, which needs Python 3.11: a
+    task copies the context current when it is created, so creating it
+    inside ``context`` works on every supported version.
+    """
+    return context.run(asyncio.get_running_loop().create_task, coro)
+
+
+# ─────────────────────────────────────────────────────────────
+# CLIENT DISCONNECTS (ASGI)
+# ─────────────────────────────────────────────────────────────
+
+async def wait_for_disconnect(receive):
+    """Return once the ASGI server reports that the client went away."""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def run_until_disconnect(receive, coro: Awaitable) -> bool:
+    """Run ``coro`` (which sends the response), cancelling it if the client disconnects.
+
+    Must be called after the request body has been read. Cancellation
+    propagates into the handler, so upstream calls made on behalf of a gone
+    client are cancelled too. Returns False if the client disconnected first.
+    """
+    work = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not work.done():
+            work.cancel()
+
+    if work.cancelled() or not work.done():
+        try:
+            await work
+        except asyncio.CancelledError:
+            pass
+        logger.info("Client disconnected; request cancelled")
+        return False
+
+    work.result()
+    return True
+
+
+_background_loop: Optional[BackgroundLoop] = None
+
+
+def get_background_loop() -> BackgroundLoop:
+    """Return the process-wide BackgroundLoop (singleton pattern)."""
+
+    global _background_loop
+
+    if _background_loop is None:
+        _background_loop = BackgroundLoop()
+
+    return _background_loop
@@ -0,0 +1,364 @@
+"""
+Load test and latency benchmark for the chatbot API, run against the fake
+LLM backend (llm_backends.FakeLLMBackend), so results do not depend on the
+network or on Gemini.
+
+    python bench_chatbot_api.py [--mode asgi|flask] [--concurrency 50]
+                                [--users 1000] [--requests 500]
+                                [--memory-users 10000] [--output FILE]
+                                [--compare OLD.json]
+
+Every route is driven in-process (through the ASGI app or the Flask test
+client) at the given concurrency, spread over the given number of simulated
+users. The report has throughput and p50/p95/p99 latency per route, plus heap
+and RSS growth scaled to 10k users who each take one chat turn. Results are
+written as JSON; --compare prints the change against an earlier result file.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# ─────────────────────────────────────────────────────────────
+# WORKLOAD
+# ─────────────────────────────────────────────────────────────
+
+CHAT_MESSAGES = [
+    "How do streaks work?",
+    "Can you explain how derivatives relate to slopes?",
+    "What's a good way to revise organic chemistry reactions?",
+    "Recommended session duration?",
+    "I keep losing focus after twenty minutes, any advice?",
+    "Summarize the causes of World War I in a few points",
+]
+
+STUDY_QUESTIONS = [
+    ("math", "limits", "What is a limit?"),
+    ("physics", "kinematics", "How do I find average velocity?"),
+    ("biology", "cells", "What does the mitochondria do?"),
+]
+
+
+def route_table(rng: random.Random, users: int) -> Dict[str, Tuple[str, str, Callable[[], Optional[Dict]]]]:
+    """Route name -> (method, path, body factory)."""
+
+    def user() -> str:
+        return f"bench-user-{rng.randrange(users)}"
+
+    def study() -> Dict:
+        subject, topic, question = rng.choice(STUDY_QUESTIONS)
+        return {"user_id": user(), "subject": subject, "topic": topic, "question": question}
+
+    return {
+        "health": ("GET", "/health", lambda: None),
+        "generate": ("POST", "/chat/generate", lambda: {
+            "user_id": user(), "user_message": rng.choice(CHAT_MESSAGES), "context": {"name": "Bench"}
+        }),
+        "generate_stream": ("POST", "/chat/generate/stream", lambda: {
+            "user_id": user(), "user_message": rng.choice(CHAT_MESSAGES)
+        }),
+        "feature_info": ("POST", "/chat/feature-info", lambda: {
+            "user_id": user(), "feature": rng.choice(["study_sessions", "streaks", "reports", "chatbot", "settings"])
+        }),
+        "registration_guidance": ("POST", "/chat/registration-guidance", lambda: {
+            "user_id": user(), "step": rng.randint(1, 4)
+        }),
+        "study_help": ("POST", "/chat/study-help", study),
+        "motivation": ("POST", "/chat/motivation", lambda: {
+            "user_id": user(), "user_name": "Bench", "streak": rng.randint(0, 40)
+        }),
+        "faq": ("GET", "/chat/faq", lambda: None),
+        "batch": ("POST", "/chat/batch", lambda: {
+            "user_id": user(),
+            "operations": [
+                {"op": "motivation", "data": {"user_name": "Bench", "streak": 3}},
+                {"op": "generate", "data": {"user_message": rng.choice(CHAT_MESSAGES)}},
+            ],
+        }),
+        "clear": ("POST", "/chat/clear", lambda: {"user_id": user()}),
+    }
+
+
+# ─────────────────────────────────────────────────────────────
+# IN-PROCESS TRANSPORTS
+# ─────────────────────────────────────────────────────────────
+
+class AsgiDriver:
+    """Calls asgi.app directly on this process's event loop."""
+
+    def __init__(self):
+        import asgi
+        self.app = asgi.app
+
+    async def request(self, method: str, path: str, body: Optional[Dict]) -> int:
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        scope = {"type": "http", "method": method, "path": path, "headers": [], "query_string": b""}
+        status = 0
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                await asyncio.sleep(3600)
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        await self.app(scope, receive, send)
+        return status
+
+    async def run(self, jobs: List[Tuple[str, str, Optional[Dict]]], concurrency: int) -> List[Tuple[float, int]]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(job):
+            async with semaphore:
+                start = time.perf_counter()
+                status = await self.request(*job)
+                return time.perf_counter() - start, status
+
+        return await asyncio.gather(*(one(job) for job in jobs))
+
+    def execute(self, jobs, concurrency):
+        return self.loop.run_until_complete(self.run(jobs, concurrency))
+
+    def __enter__(self):
+        self.loop = asyncio.new_event_loop()
+        return self
+
+    def __exit__(self, *exc):
+        from chatbot_service import get_chatbot_service
+        self.loop.run_until_complete(get_chatbot_service().close())
+        self.loop.close()
+
+
+class FlaskDriver:
+    """Calls the Flask app through its test client from a thread pool."""
+
+    def __init__(self):
+        import app as flask_app
+        self.app = flask_app.app
+
+    def request(self, method: str, path: str, body: Optional[Dict]) -> int:
+        client = self.app.test_client()
+        if method == "GET":
+            response = client.get(path)
+        else:
+            response = client.post(path, json=body)
+        response.get_data()     # drain streamed bodies
+        return response.status_code
+
+    def execute(self, jobs, concurrency):
+        def one(job):
+            start = time.perf_counter()
+            status = self.request(*job)
+            return time.perf_counter() - start, status
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(one, jobs))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+# ─────────────────────────────────────────────────────────────
+# MEASUREMENT
+# ─────────────────────────────────────────────────────────────
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples: List[Tuple[float, int]], elapsed: float) -> Dict:
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, status in samples if status >= 400)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux), or 0 when unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def measure_memory(driver, users: int, concurrency: int) -> Dict:
+    """Heap and RSS growth while `users` new users each take one chat turn."""
+    jobs = [
+        ("POST", "/chat/generate", {"user_id": f"mem-user-{i}", "user_message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)]})
+        for i in range(users)
+    ]
+
+    tracemalloc.start()
+    heap_before = tracemalloc.get_traced_memory()[0]
+    rss_before = rss_bytes()
+
+    driver.execute(jobs, concurrency)
+
+    heap_after = tracemalloc.get_traced_memory()[0]
+    rss_after = rss_bytes()
+    tracemalloc.stop()
+
+    scale = 10000 / users
+    return {
+        "users": users,
+        "heap_bytes_per_10k_users": int((heap_after - heap_before) * scale),
+        "rss_bytes_per_10k_users": int((rss_after - rss_before) * scale),
+        "heap_bytes_per_user": int((heap_after - heap_before) / users),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(old: Dict, new: Dict):
+    print(f"\nChange vs {old['meta'].get('commit', '?')}:")
+    print(f"{'route':<24}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+
+    def delta(a, b):
+        return f"{(b - a) / a * 100:+.0f}%" if a else "n/a"
+
+    for name, result in new["routes"].items():
+        before = old.get("routes", {}).get(name)
+        if before is None:
+            continue
+        print(
+            f"{name:<24}{delta(before['throughput_rps'], result['throughput_rps']):>10}"
+            f"{delta(before['p50_ms'], result['p50_ms']):>10}{delta(before['p95_ms'], result['p95_ms']):>10}"
+            f"{delta(before['p99_ms'], result['p99_ms']):>10}"
+        )
+
+    if old.get("memory") and new.get("memory"):
+        print(
+            "heap per 10k users: "
+            f"{delta(old['memory']['heap_bytes_per_10k_users'], new['memory']['heap_bytes_per_10k_users'])}"
+        )
+
+
+# ─────────────────────────────────────────────────────────────
+# MAIN
+# ─────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["asgi", "flask"], default="asgi")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=500, help="requests per route")
+    parser.add_argument("--routes", default="", help="comma-separated subset of routes")
+    parser.add_argument("--memory-users", type=int, default=10000, help="0 skips the memory phase")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=2000.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier result file to diff against")
+    args = parser.parse_args()
+
+    # Configure the stubbed LLM and an in-memory, non-evicting deployment
+    # before any chatbot module is imported
+    os.environ.update({
+        "CHATBOT_LLM_BACKEND": "fake",
+        "CHATBOT_FAKE_LATENCY_MS": str(args.llm_latency_ms),
+        "CHATBOT_FAKE_LATENCY_JITTER_MS": str(args.llm_jitter_ms),
+        "CHATBOT_FAKE_TOKENS_PER_SEC": str(args.llm_tokens_per_sec),
+        "CHATBOT_FAKE_SEED": str(args.seed),
+        "CHATBOT_STORE_BACKEND": os.getenv("CHATBOT_STORE_BACKEND", "none"),
+        "CHATBOT_MAX_SESSIONS": str(max(args.users, args.memory_users) * 2),
+        "CHATBOT_SESSION_MEMORY_MB": os.getenv("CHATBOT_SESSION_MEMORY_MB", "65536"),
+    })
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import logging
+    logging.disable(logging.INFO)
+
+    rng = random.Random(args.seed)
+    routes = route_table(rng, args.users)
+    selected = [name.strip() for name in args.routes.split(",") if name.strip()] or list(routes)
+
+    driver = AsgiDriver() if args.mode == "asgi" else FlaskDriver()
+    results: Dict[str, Dict] = {}
+
+    with driver:
+        for name in selected:
+            method, path, body = routes[name]
+            jobs = [(method, path, body()) for _ in range(args.requests)]
+
+            start = time.perf_counter()
+            samples = driver.execute(jobs, args.concurrency)
+            results[name] = summarize(samples, time.perf_counter() - start)
+
+            r = results[name]
+            print(
+                f"{name:<24}{r['throughput_rps']:>9.1f} rps  p50 {r['p50_ms']:>8.2f} ms  "
+                f"p95 {r['p95_ms']:>8.2f} ms  p99 {r['p99_ms']:>8.2f} ms  errors {r['errors']}"
+            )
+
+        memory = measure_memory(driver, args.memory_users, args.concurrency) if args.memory_users else None
+
+    if memory:
+        print(
+            f"\nmemory: {memory['heap_bytes_per_10k_users'] / 2**20:.1f} MiB heap, "
+            f"{memory['rss_bytes_per_10k_users'] / 2**20:.1f} MiB RSS per 10k users "
+            f"({memory['heap_bytes_per_user']} B/user)"
+        )
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "args": vars(args),
+        },
+        "routes": results,
+        "memory": memory,
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
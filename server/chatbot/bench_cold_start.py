@@ -0,0 +1,87 @@
+"""
+Cold-start profile: time to import each entry point, and time until the app
+is live (/livez) and ready (/readyz), each measured in a fresh interpreter.
+
+    python bench_cold_start.py [--runs N] [--backend gemini|fake]
+
+The slowest imports of the entry point are listed with ``--profile``
+(from ``python -X importtime``). The gemini backend needs no network here:
+only construction is timed, not calls.
+"""
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+# Runs in the child interpreter; prints "<import ms> <live ms> <ready ms>"
+PROBE = """
+import time, sys
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+while client.get("/livez").status_code != 200:
+    time.sleep(0.001)
+live = time.perf_counter()
+while client.get("/readyz").status_code != 200:
+    time.sleep(0.001)
+ready = time.perf_counter()
+print(f"{(imported - start) * 1000:.1f} {(live - start) * 1000:.1f} {(ready - start) * 1000:.1f}")
+sys.stdout.flush()
+import os; os._exit(0)
+"""
+
+
+def run(env, *extra) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *extra], env=env, capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)), timeout=120,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--backend", default="gemini")
+    parser.add_argument("--profile", action="store_true", help="list the slowest imports of app.py")
+    args = parser.parse_args()
+
+    env = {
+        **os.environ,
+        "CHATBOT_LLM_BACKEND": args.backend,
+        "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY", "bench"),
+        "CHATBOT_STORE_BACKEND": "none",
+        "CHATBOT_LOG_LEVEL": "WARNING",
+    }
+
+    samples = []
+    for _ in range(args.runs):
+        result = run(env, "-c", PROBE)
+        if result.returncode != 0:
+            print(result.stderr)
+            sys.exit(1)
+        samples.append([float(value) for value in result.stdout.split()[-3:]])
+
+    print(f"{'milestone (ms)':<16}{'median':>10}{'min':>10}{'max':>10}")
+    for index, name in enumerate(("import app", "live", "ready")):
+        values = [sample[index] for sample in samples]
+        print(f"{name:<16}{statistics.median(values):>10.1f}{min(values):>10.1f}{max(values):>10.1f}")
+
+    if args.profile:
+        result = run(env, "-X", "importtime", "-c", "import app")
+        rows = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative_us, name = line[len("import time:"):].split("|")
+            rows.append((int(cumulative_us), name.rstrip()))
+        # Includes what the warm-up thread imports while app.py is still loading
+        print("\nSlowest imports of app.py (cumulative ms):")
+        for cumulative_us, name in sorted(rows, reverse=True)[:15]:
+            print(f"{cumulative_us / 1000:>10.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Memory benchmark: bytes per user held by ConversationMemory, slotted ring
+buffer (with and without compressed old replies) vs the original layout of
+one dict per exchange in a list that is re-sliced when trimmed.
+
+    python bench_conversation_memory.py [--users N] [--turns N]
+"""
+
+import random
+import argparse
+import timeit
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import chatbot_context
+from chatbot_context import ConversationMemory
+
+
+class LegacyConversationMemory:
+    """Original storage: a dict per exchange, list re-sliced past max_history."""
+
+    def __init__(self, max_history: int = 20):
+        self.max_history = max_history
+        self.conversation_context: List[Dict] = []
+        self.current_topic: Optional[str] = None
+
+    def add_exchange(self, user_input: str, bot_response: str, context_info: Optional[Dict] = None):
+        exchange = {
+            "timestamp": datetime.now().isoformat(),
+            "user": user_input,
+            "bot": bot_response,
+            "topic": self.current_topic,
+            "context": context_info or {}
+        }
+        self.conversation_context.append(exchange)
+        if len(self.conversation_context) > self.max_history:
+            self.conversation_context = self.conversation_context[-self.max_history:]
+
+
+TOPICS = ["study_sessions", "streaks", "reports", "registration", "general"]
+SUBJECTS = ["Biology", "Physics", "Mathematics", "History", "Chemistry"]
+
+# A typical formatted reply: short paragraphs, bullets, emojis and <br> breaks
+REPLY = (
+    "📚 Great question! Here's how {subject} works for turn {turn}:<br><br>"
+    "• 🔬 Start with the core idea and write it in your own words.<br>"
+    "• 🧠 Connect it to something you already know, like an example from class.<br>"
+    "• ✍️ Practice with two or three short problems before moving on.<br>"
+    "• ⏱️ Use a 25-minute study session so your streak keeps growing.<br><br>"
+    "💡 Tip: review this topic again tomorrow; spaced repetition helps it stick. "
+    "You're making steady progress, keep going! 🚀"
+)
+
+
+def fill(memory, turns: int, rng: random.Random):
+    for turn in range(turns):
+        subject = rng.choice(SUBJECTS)
+        memory.current_topic = rng.choice(TOPICS)
+        # Fresh string objects per turn, as real requests and replies are
+        user = f"Can you explain {subject.lower()} concept number {rng.randint(1, 10 ** 6)} again?"
+        bot = REPLY.format(subject=subject, turn=rng.randint(1, 10 ** 6))
+        memory.add_exchange(user, bot, {"subject": subject, "topic": memory.current_topic, "channel": "chat"})
+
+
+def bytes_per_user(factory, users: int, turns: int) -> float:
+    rng = random.Random(7)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    memories = []
+    for _ in range(users):
+        memory = factory()
+        fill(memory, turns, rng)
+        memories.append(memory)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / users
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=30, help="exchanges per user (history keeps 20)")
+    args = parser.parse_args()
+
+    compress_after = chatbot_context.COMPRESS_AFTER_TURNS or 5
+
+    def slotted(compress: int):
+        def factory():
+            chatbot_context.COMPRESS_AFTER_TURNS = compress
+            return ConversationMemory(keep_recent=0)
+        return factory
+
+    layouts = [
+        ("legacy dicts", LegacyConversationMemory),
+        ("slotted ring", slotted(0)),
+        (f"+ zlib > {compress_after} turns", slotted(compress_after)),
+    ]
+
+    print(f"{'layout':<22}{'bytes/user':>12}{'vs legacy':>11}{'µs/exchange':>13}")
+    baseline = None
+    for name, factory in layouts:
+        size = bytes_per_user(factory, args.users, args.turns)
+        baseline = baseline or size
+        seconds = timeit.timeit(lambda: fill(factory(), args.turns, random.Random(1)), number=200)
+        print(f"{name:<22}{size:>12,.0f}{size / baseline:>10.0%}{seconds / (200 * args.turns) * 1e6:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Input tokens per chat turn, measured on the fake backend: what each request
+sends (system instruction + replayed history + the new turn), and how much
+of it is the shared system-prompt prefix a provider can serve from cache.
+
+    python bench_prompt_tokens.py [--users N] [--turns N]
+
+Token counts use the same ~4 characters per token estimate as the prompt
+budget, so they compare runs rather than predict billing exactly.
+"""
+
+import os
+import asyncio
+import argparse
+from collections import defaultdict
+
+os.environ.setdefault("CHATBOT_LLM_BACKEND", "fake")
+os.environ.setdefault("CHATBOT_STORE_BACKEND", "none")
+os.environ.setdefault("CHATBOT_FAKE_LATENCY_MS", "0")
+os.environ.setdefault("CHATBOT_FAKE_TOKENS_PER_SEC", "0")
+os.environ.setdefault("CHATBOT_LOG_LEVEL", "WARNING")
+
+import handlers
+from chatbot_service import get_chatbot_service
+from prompt_builder import estimate_tokens
+
+SUBJECTS = ["Biology", "Physics", "Mathematics", "History", "Chemistry"]
+
+
+def tokens(parts) -> int:
+    return sum(estimate_tokens(part.get("text", "")) for part in parts)
+
+
+async def run(users: int, turns: int):
+    fake = get_chatbot_service().model.backend.backend
+    per_turn = defaultdict(lambda: [0, 0, 0, 0])  # requests, total, cached prefix, instruction
+    seen_prefixes = set()
+
+    for turn in range(turns):
+        for user in range(users):
+            subject = SUBJECTS[(user + turn) % len(SUBJECTS)]
+            result = await handlers.generate_response({
+                "user_id": f"bench-{user}",
+                "user_message": f"Help me plan revision for {subject} chapter {turn + 1}, I keep forgetting it",
+                "context": {"name": f"Student {user}", "study_level": "High school"},
+            })
+            assert result[1] == 200 and not result[0].get("local"), result
+
+            contents, instruction = fake.calls[-1], fake.instructions[-1]
+            row = per_turn[turn]
+            row[0] += 1
+            row[1] += sum(tokens(content["parts"]) for content in contents)
+            if instruction:
+                row[1] += tokens(instruction["parts"])
+                row[3] += tokens(instruction["parts"])
+                prefix = instruction["parts"][0]["text"]
+                if prefix in seen_prefixes:
+                    row[2] += estimate_tokens(prefix)
+                seen_prefixes.add(prefix)
+
+    print(f"{'turn':>5}{'input tok':>11}{'instruction':>13}{'cached prefix':>15}{'uncached':>10}")
+    totals = [0, 0, 0, 0]
+    for turn in sorted(per_turn):
+        requests, total, cached, instruction = per_turn[turn]
+        totals = [a + b for a, b in zip(totals, per_turn[turn])]
+        print(f"{turn + 1:>5}{total / requests:>11.0f}{instruction / requests:>13.0f}"
+              f"{cached / requests:>15.0f}{(total - cached) / requests:>10.0f}")
+    requests, total, cached, instruction = totals
+    print(f"{'mean':>5}{total / requests:>11.0f}{instruction / requests:>13.0f}"
+          f"{cached / requests:>15.0f}{(total - cached) / requests:>10.0f}")
+    print(f"\nfake backend: {fake.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=12)
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.turns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Microbenchmark: compiled TopicClassifier vs the original per-call keyword scan
+that ConversationMemory.extract_topic used before.
+
+    python bench_topic_classifier.py [--iterations N]
+"""
+
+import argparse
+import timeit
+
+from topic_classifier import TopicClassifier
+
+
+def legacy_extract_topic(text: str) -> str:
+    """Original implementation: dict rebuilt per call, substring scan, first match wins."""
+    text_lower = text.lower()
+
+    topics = {
+        "registration": ["register", "sign up", "create account", "onboarding"],
+        "study_sessions": ["study", "session", "timer", "focus", "concentrate"],
+        "streaks": ["streak", "consistency", "daily study"],
+        "reports": ["report", "analytics", "statistics", "insights"],
+        "settings": ["settings", "preferences", "profile", "update"],
+        "features": ["feature", "explain", "tell me about"],
+        "help": ["help", "support", "issue", "problem", "error"],
+        "motivation": ["motivation", "encourage", "tips"],
+        "general": []
+    }
+
+    for topic, keywords in topics.items():
+        if any(keyword in text_lower for keyword in keywords):
+            return topic
+
+    return "general"
+
+
+SAMPLE_MESSAGES = [
+    "How do streaks work if I miss a day?",
+    "Can you explain the reports page and the analytics it shows?",
+    "I want to sign up, how does registration work?",
+    "What's the best way to focus during a long session?",
+    "I updated my profile but nothing changed",
+    "I'm feeling tipsy and unmotivated today, any tips?",
+    "Why is my daily study streak not showing in the report statistics?",
+    "hello there",
+    "Tell me about the chatbot feature",
+    "I found an error when the timer ends",
+    "I updated the app yesterday",
+    "I feel a bit tipsy after the party",
+    "Could you walk me through the causes of the French Revolution in detail, "
+    "including the economic situation and the role of the Estates-General?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    classifier = TopicClassifier()
+    n = args.iterations
+
+    legacy = timeit.timeit(lambda: [legacy_extract_topic(m) for m in SAMPLE_MESSAGES], number=n)
+    compiled = timeit.timeit(lambda: [classifier.classify(m) for m in SAMPLE_MESSAGES], number=n)
+    batch = timeit.timeit(lambda: classifier.classify_many(SAMPLE_MESSAGES), number=n)
+
+    calls = n * len(SAMPLE_MESSAGES)
+    print(f"{'implementation':<16}{'µs/message':>12}")
+    print(f"{'legacy':<16}{legacy / calls * 1e6:>12.2f}")
+    print(f"{'compiled':<16}{compiled / calls * 1e6:>12.2f}")
+    print(f"{'classify_many':<16}{batch / calls * 1e6:>12.2f}")
+
+    print("\nClassification differences (legacy -> compiled):")
+    for message in SAMPLE_MESSAGES:
+        old, new = legacy_extract_topic(message), classifier.classify(message)
+        if old != new:
+            print(f"  {message!r}: {old} -> {new} {classifier.scores(message)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,43 @@
 import os
+import sys
 import json
+import time
+import zlib
 import logging
+from collections import deque
 from datetime import datetime
 from dataclasses import dataclass, asdict, field
-from typing import Dict, List, Optional, Any
-from dotenv import load_dotenv
+from typing import Deque, Dict, List, Optional, Tuple, Any
 
-# Load environment variables
-load_dotenv()
+from kb_index import KnowledgeIndex, SearchHit, faq_text, feature_text, registration_text
+from prompt_builder import PromptSection
+from topic_classifier import DEFAULT_TOPIC, get_topic_classifier
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Rolling compaction: exchanges older than this many recent turns are folded
+# into ConversationMemory.context_summary (0 disables compaction)
+COMPACTION_KEEP_RECENT = int(os.getenv("CHATBOT_KEEP_RECENT_TURNS", 4))
+SUMMARY_MAX_CHARS = int(os.getenv("CHATBOT_SUMMARY_MAX_CHARS", 2000))
+
+# Bot replies older than this many turns are stored zlib-compressed (0 keeps
+# everything as text). The default matches the turns prompts replay, so
+# building a prompt never decompresses.
+COMPRESS_AFTER_TURNS = int(os.getenv("CHATBOT_COMPRESS_AFTER_TURNS", 5))
+COMPRESS_MIN_CHARS = 200
+
+# Fixed per-exchange cost used by the session-store memory estimate
+EXCHANGE_OVERHEAD_BYTES = 160
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """Share one copy of short repeated labels (topics, subjects, channels)."""
+    if isinstance(value, str) and len(value) <= 64:
+        return sys.intern(value)
+    return value
+
+
 # ─────────────────────────────────────────────────────────────
 # USER PROFILE
 # ─────────────────────────────────────────────────────────────
@@ -50,65 +74,194 @@ class UserProfile:
 # CONVERSATION MEMORY
 # ─────────────────────────────────────────────────────────────
 
+class Exchange:
+    """One stored user/bot exchange.
+
+    Slotted instead of a dict per exchange: a Unix timestamp instead of an
+    ISO string, interned labels, and the context dict flattened into
+    fields. ``bot`` is transparently decompressed once ``compress()`` has
+    packed an older reply.
+    """
+
+    __slots__ = ("timestamp", "user", "_bot", "topic", "subject", "context_topic", "channel", "extra")
+
+    def __init__(
+        self,
+        user: str,
+        bot: str,
+        topic: Optional[str] = None,
+        context_info: Optional[Dict] = None,
+        timestamp: Optional[float] = None,
+    ):
+        context_info = context_info or {}
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.user = user
+        self._bot = bot
+        self.topic = _intern(topic)
+        self.subject = _intern(context_info.get("subject"))
+        self.context_topic = _intern(context_info.get("topic"))
+        self.channel = _intern(context_info.get("channel"))
+
+        # Context keys beyond the usual three are kept as they are
+        extra = {k: v for k, v in context_info.items() if k not in ("subject", "topic", "channel")}
+        self.extra = extra or None
+
+    @property
+    def bot(self) -> str:
+        if isinstance(self._bot, bytes):
+            return zlib.decompress(self._bot).decode("utf-8")
+        return self._bot
+
+    @property
+    def context(self) -> Dict:
+        context = {"subject": self.subject, "topic": self.context_topic}
+        if self.channel is not None:
+            context["channel"] = self.channel
+        if self.extra:
+            context.update(self.extra)
+        return context
+
+    def compress(self):
+        """Store the bot reply zlib-compressed when that saves space."""
+        if isinstance(self._bot, str) and len(self._bot) >= COMPRESS_MIN_CHARS:
+            packed = zlib.compress(self._bot.encode("utf-8"))
+            if len(packed) < len(self._bot):
+                self._bot = packed
+
+    def estimate_size(self) -> int:
+        return len(self.user) + len(self._bot) + EXCHANGE_OVERHEAD_BYTES
+
+    def to_dict(self) -> Dict:
+        return {
+            "timestamp": self.timestamp,
+            "user": self.user,
+            "bot": self.bot,
+            "topic": self.topic,
+            "context": self.context,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Exchange":
+        timestamp = data.get("timestamp")
+        if isinstance(timestamp, str):
+            # Snapshots written before timestamps were numeric
+            timestamp = datetime.fromisoformat(timestamp).timestamp()
+        return cls(data["user"], data["bot"], data.get("topic"), data.get("context"), timestamp)
+
+
 class ConversationMemory:
-    """Handles conversation history, context, and topic extraction."""
+    """Handles conversation history, context, and topic extraction.
+
+    Exchanges live in a fixed-capacity ring buffer (a bounded deque), so
+    adding one past ``max_history`` drops the oldest without copying.
+    """
 
-    def __init__(self, max_history: int = 20):
+    def __init__(self, max_history: int = 20, keep_recent: int = COMPACTION_KEEP_RECENT):
         self.max_history = max_history
-        self.conversation_context: List[Dict] = []
+        self.keep_recent = keep_recent
+        self.conversation_context: Deque[Exchange] = deque(maxlen=max_history)
         self.current_topic: Optional[str] = None
         self.context_summary: str = ""
         self.topics_discussed: set = set()
+        self.total_exchanges = 0
+
+        # Bumped whenever exchanges change; keys the formatted-context cache
+        self.version = 0
+        self._formatted: Optional[Tuple[int, Optional[str], str]] = None
 
     def add_exchange(self, user_input: str, bot_response: str, context_info: Optional[Dict] = None):
-        exchange = {
-            "timestamp": datetime.now().isoformat(),
-            "user": user_input,
-            "bot": bot_response,
-            "topic": self.current_topic,
-            "context": context_info or {}
+        history = self.conversation_context
+        history.append(Exchange(user_input, bot_response, self.current_topic, context_info))
+        self.total_exchanges += 1
+        self.version += 1
+
+        # Fold the exchange that just left the recent window into the summary
+        if self.keep_recent and len(history) > self.keep_recent:
+            self.fold_into_summary(history[-self.keep_recent - 1])
+
+        if COMPRESS_AFTER_TURNS and len(history) > COMPRESS_AFTER_TURNS:
+            history[-COMPRESS_AFTER_TURNS - 1].compress()
+
+    def snapshot(self) -> Dict:
+        """JSON-serializable copy of the memory for the conversation store."""
+        return {
+            "conversation_context": [exchange.to_dict() for exchange in self.conversation_context],
+            "current_topic": self.current_topic,
+            "context_summary": self.context_summary,
+            "topics_discussed": sorted(self.topics_discussed),
+            "total_exchanges": self.total_exchanges,
         }
 
-        self.conversation_context.append(exchange)
-
-        if len(self.conversation_context) > self.max_history:
-            self.conversation_context = self.conversation_context[-self.max_history:]
-
-    def get_context_for_llm(self) -> str:
-        if not self.conversation_context:
-            return "Start of conversation."
-
-        recent = self.conversation_context[-5:]
-        formatted = "Recent conversation:<br>"
-
-        for i, ex in enumerate(recent, 1):
-            formatted += f"{i}. User: {ex['user']}<br>   Bot: {ex['bot']}<br>"
-
+    def restore(self, data: Dict):
+        self.conversation_context.clear()
+        self.conversation_context.extend(
+            Exchange.from_dict(exchange) for exchange in data.get("conversation_context", [])
+        )
+        if COMPRESS_AFTER_TURNS:
+            for index in range(len(self.conversation_context) - COMPRESS_AFTER_TURNS):
+                self.conversation_context[index].compress()
+
+        self.current_topic = data.get("current_topic")
+        self.context_summary = data.get("context_summary", "")
+        self.topics_discussed = set(data.get("topics_discussed", []))
+        self.total_exchanges = data.get("total_exchanges", len(self.conversation_context))
+        self.version += 1
+
+    def fold_into_summary(self, exchange: Exchange):
+        """Append a compact line for one exchange to the running summary.
+
+        The summary is extractive so compaction never costs an upstream call;
+        once it exceeds SUMMARY_MAX_CHARS the oldest lines are dropped.
+        """
+        user_text = " ".join(exchange.user.split())[:100]
+        bot_text = " ".join(exchange.bot.replace("<br>", " ").split())[:160]
+        line = f"- ({exchange.topic or 'general'}) Q: {user_text} → A: {bot_text}"
+
+        lines = self.context_summary.splitlines() if self.context_summary else []
+        lines.append(line)
+        while len(lines) > 1 and sum(len(l) + 1 for l in lines) > SUMMARY_MAX_CHARS:
+            lines.pop(0)
+
+        self.context_summary = "\n".join(lines)
+
+    def estimate_size(self) -> int:
+        """Approximate bytes held by stored exchanges."""
+        return len(self.context_summary) + sum(
+            exchange.estimate_size() for exchange in self.conversation_context
+        )
+
+    def get_context_for_llm(self, exclude_channel: Optional[str] = None) -> str:
+        cached = self._formatted
+        if cached is not None and cached[0] == self.version and cached[1] == exclude_channel:
+            return cached[2]
+
+        recent = self.recent_exchanges(exclude_channel)
+        if not recent:
+            formatted = "Start of conversation."
+        else:
+            formatted = "Recent conversation:<br>" + "".join(
+                f"{i}. User: {ex.user}<br>   Bot: {ex.bot}<br>" for i, ex in enumerate(recent, 1)
+            )
+
+        self._formatted = (self.version, exclude_channel, formatted)
         return formatted
 
-    def extract_topic(self, text: str) -> str:
-        text_lower = text.lower()
-
-        topics = {
-            "registration": ["register", "sign up", "create account", "onboarding"],
-            "study_sessions": ["study", "session", "timer", "focus", "concentrate"],
-            "streaks": ["streak", "consistency", "daily study"],
-            "reports": ["report", "analytics", "statistics", "insights"],
-            "settings": ["settings", "preferences", "profile", "update"],
-            "features": ["feature", "explain", "tell me about"],
-            "help": ["help", "support", "issue", "problem", "error"],
-            "motivation": ["motivation", "encourage", "tips"],
-            "general": []
-        }
+    def recent_exchanges(self, exclude_channel: Optional[str] = None, limit: int = 5) -> List[Exchange]:
+        """Last ``limit`` exchanges, optionally skipping one channel (e.g. "chat",
+        whose turns the Gemini chat session already replays)."""
+        history = self.conversation_context
+        recent = [history[i] for i in range(max(0, len(history) - limit), len(history))]
+        if exclude_channel:
+            recent = [ex for ex in recent if ex.channel != exclude_channel]
+        return recent
 
-        for topic, keywords in topics.items():
-            if any(keyword in text_lower for keyword in keywords):
-                self.current_topic = topic
-                self.topics_discussed.add(topic)
-                return topic
+    def extract_topic(self, text: str) -> str:
+        topic = get_topic_classifier().classify(text)
+        self.current_topic = topic
 
-        self.current_topic = "general"
-        return "general"
+        if topic != DEFAULT_TOPIC:
+            self.topics_discussed.add(topic)
+        return topic
 
 
 # ─────────────────────────────────────────────────────────────
@@ -199,6 +352,19 @@ class ProgressBrainKnowledgeBase:
         }
     }
 
+    _platform_info: Optional[str] = None
+
+    # Bumped by add_faq / add_feature / add_registration_step, so content
+    # serialized from the tables (static_content.py) knows to rebuild
+    version = 0
+
+    @classmethod
+    def platform_info_section(cls) -> str:
+        """Platform-info block of the system prompt, serialized once."""
+        if cls._platform_info is None:
+            cls._platform_info = PLATFORM_INFO_TEMPLATE.format(info=json.dumps(cls.WEBSITE_INFO, indent=2))
+        return cls._platform_info
+
     @classmethod
     def get_feature_info(cls, feature_name: str) -> Optional[Dict]:
         return cls.FEATURES.get(feature_name.lower())
@@ -207,37 +373,64 @@ class ProgressBrainKnowledgeBase:
     def get_registration_step(cls, step: int) -> Optional[Dict]:
         return cls.REGISTRATION_FLOW.get(f"step_{step}")
 
+    # Built on first search, then kept current by the add_* methods
+    _index = None
+
+    @classmethod
+    def get_index(cls) -> KnowledgeIndex:
+        if cls._index is None:
+            index = KnowledgeIndex()
+            for key, data in cls.FAQ.items():
+                index.add("faq", key, faq_text(data), data)
+            for name, data in cls.FEATURES.items():
+                index.add("feature", name, feature_text(name, data), data)
+            for key, data in cls.REGISTRATION_FLOW.items():
+                index.add("registration", key, registration_text(data), data)
+            cls._index = index
+        return cls._index
+
+    @classmethod
+    def search(cls, query: str, k: int = 5, kinds: Optional[List[str]] = None) -> List[SearchHit]:
+        """BM25-ranked search over FAQ, features and registration steps."""
+        return cls.get_index().search(query, k=k, kinds=kinds)
+
     @classmethod
     def search_faq(cls, query: str) -> Optional[Dict]:
-        query_lower = query.lower()
-        for data in cls.FAQ.values():
-            if any(word in query_lower for word in data["q"].lower().split()):
-                return data
-        return None
+        hits = cls.search(query, k=1, kinds=["faq"])
+        return hits[0].data if hits else None
 
+    @classmethod
+    def add_faq(cls, key: str, question: str, answer: str):
+        cls.FAQ[key] = {"q": question, "a": answer}
+        cls.version += 1
+        if cls._index is not None:
+            cls._index.add("faq", key, faq_text(cls.FAQ[key]), cls.FAQ[key])
 
-# ─────────────────────────────────────────────────────────────
-# CHATBOT CONTEXT / SYSTEM PROMPTS
-# ─────────────────────────────────────────────────────────────
+    @classmethod
+    def add_feature(cls, name: str, data: Dict):
+        cls.FEATURES[name] = data
+        cls.version += 1
+        if cls._index is not None:
+            cls._index.add("feature", name, feature_text(name, data), data)
 
-class ChatbotContext:
-    """Builds the system prompt controlling assistant behavior."""
+    @classmethod
+    def add_registration_step(cls, step: int, data: Dict):
+        key = f"step_{step}"
+        cls.REGISTRATION_FLOW[key] = data
+        cls.version += 1
+        if cls._index is not None:
+            cls._index.add("registration", key, registration_text(data), data)
 
-    def __init__(self, user_profile: UserProfile):
-        self.user_profile = user_profile
-        self.memory = ConversationMemory()
-        self.knowledge_base = ProgressBrainKnowledgeBase()
-        self.session_start_time = datetime.now()
-        self.interaction_count = 0
 
-    def build_system_prompt(self) -> str:
-        """
-        Defines:
-        - Bot personality (clean, friendly, compact)
-        - No greetings unless user greets first
-        """
+# ─────────────────────────────────────────────────────────────
+# CHATBOT CONTEXT / SYSTEM PROMPTS
+# ─────────────────────────────────────────────────────────────
 
-        prompt = f"""
+# The system prompt is a prefix shared by every user (fixed text, platform
+# info and reply style, built once) followed by a small per-user profile
+# fragment. Chat turns send it as the model's system instruction, so the
+# shared prefix leads every request and the contents carry only new turns.
+SYSTEM_PROMPT_HEAD = """
 You are **ProgressBrain**, an intelligent, friendly, crisp AI study assistant.
 
 ## 🎯 Personality
@@ -253,33 +446,164 @@ Always answer short and directly using this style:
 - No greetings unless the user greets first  
 - Do NOT restate the question  
 - Do NOT talk about yourself unless asked  
+"""
 
-## 👤 User Info
-- Name: {self.user_profile.name or "Friend"}  
-- Study Level: {self.user_profile.study_level or "Not given"}  
-- Registered: {"Yes" if self.user_profile.is_registered else "No"}  
+REPLY_STYLE_SECTION = (
+    "\n## ✍️ Every Reply\n"
+    "Respond in medium paragraphs. "
+    "Use emojis. Avoid long paragraphs. No greetings. "
+    "Directly answer the user's question.\n"
+)
 
-## 🔍 Platform Info
-{json.dumps(ProgressBrainKnowledgeBase.WEBSITE_INFO, indent=2)}
+USER_INFO_TEMPLATE = (
+    "\n## 👤 User Info\n"
+    "- Name: {name}  \n"
+    "- Study Level: {study_level}  \n"
+    "- Registered: {registered}  \n"
+)
 
-## 💬 Recent Conversation
-{self.memory.get_context_for_llm()}
+PLATFORM_INFO_TEMPLATE = "\n## 🔍 Platform Info\n{info}\n"
 
-Stay short, useful, and friendly.
-"""
-        return prompt
+HISTORY_TEMPLATE = "\n## 💬 Recent Conversation\n{history}\n"
+
+SYSTEM_PROMPT_TAIL = "\nStay short, useful, and friendly.\n"
+
+# Profile fields a request may update
+PROFILE_FIELDS = ("name", "email", "study_level", "subjects_of_interest", "is_registered")
+
+
+class ChatbotContext:
+    """Builds the system prompt controlling assistant behavior."""
+
+    def __init__(self, user_profile: UserProfile):
+        self.user_profile = user_profile
+        self.memory = ConversationMemory()
+        self.knowledge_base = ProgressBrainKnowledgeBase()
+        self.session_start_time = datetime.now()
+        self.interaction_count = 0
+
+        # Bumped by update_profile; keys the cached user-info fragment
+        self.profile_version = 0
+        self._user_info: Optional[Tuple[int, str]] = None
+
+    def estimate_size(self) -> int:
+        """Approximate bytes held by this context, dominated by memory."""
+        return self.memory.estimate_size()
+
+    def snapshot(self) -> Dict:
+        """JSON-serializable profile and memory state for the conversation store."""
+        return {
+            "profile": self.user_profile.to_dict(),
+            "memory": self.memory.snapshot(),
+            "session_start_time": self.session_start_time.isoformat(),
+            "interaction_count": self.interaction_count,
+        }
+
+    @classmethod
+    def restore(cls, data: Dict) -> "ChatbotContext":
+        known = UserProfile.__dataclass_fields__
+        profile = UserProfile(**{k: v for k, v in data["profile"].items() if k in known})
+
+        context = cls(profile)
+        context.memory.restore(data.get("memory", {}))
+        context.interaction_count = data.get("interaction_count", 0)
+        if data.get("session_start_time"):
+            context.session_start_time = datetime.fromisoformat(data["session_start_time"])
+        return context
+
+    _shared_prompt: Optional[str] = None
+
+    @classmethod
+    def shared_system_prompt(cls) -> str:
+        """
+        The part of the system prompt that is the same for every user:
+        - Bot personality (clean, friendly, compact)
+        - No greetings unless user greets first
+        - Platform info and the per-reply style rules
+        """
+        if cls._shared_prompt is None:
+            cls._shared_prompt = "".join([
+                SYSTEM_PROMPT_HEAD,
+                ProgressBrainKnowledgeBase.platform_info_section(),
+                REPLY_STYLE_SECTION,
+                SYSTEM_PROMPT_TAIL,
+            ])
+        return cls._shared_prompt
+
+    def system_prompt_parts(self) -> Tuple[str, str]:
+        """(shared prefix, per-user section) of the current system prompt."""
+        return self.shared_system_prompt(), self.user_info_section()
+
+    def build_system_prompt(self, include_history: bool = False) -> str:
+        """The system prompt as one string.
+
+        Conversation history is left out by default because the chat
+        session replays it; pass include_history for standalone prompts.
+        """
+
+        parts = [self.shared_system_prompt(), self.user_info_section()]
+        if include_history:
+            parts.append(self.history_section())
+        return "".join(parts)
+
+    def user_info_section(self) -> str:
+        """Profile fragment of the system prompt, rebuilt only after a profile change."""
+        cached = self._user_info
+        if cached is None or cached[0] != self.profile_version:
+            profile = self.user_profile
+            text = USER_INFO_TEMPLATE.format(
+                name=profile.name or "Friend",
+                study_level=profile.study_level or "Not given",
+                registered="Yes" if profile.is_registered else "No",
+            )
+            cached = self._user_info = (self.profile_version, text)
+        return cached[1]
+
+    def history_section(self) -> str:
+        return HISTORY_TEMPLATE.format(history=self.memory.get_context_for_llm())
+
+    def update_profile(self, data: Dict) -> bool:
+        """Apply profile fields from a request body.
+
+        Only values that differ are written, and ``profile_version`` (which
+        invalidates the cached prompt fragment) moves only when one did.
+        """
+        profile = self.user_profile
+        changed = False
 
-    def get_response_prompt(self, user_message: str) -> str:
+        for name in PROFILE_FIELDS:
+            if name in data and getattr(profile, name) != data[name]:
+                setattr(profile, name, data[name])
+                changed = True
+
+        for key, value in (data.get("preferences") or {}).items():
+            if profile.preferences.get(key) != value:
+                profile.preferences[key] = value
+                changed = True
+
+        if changed:
+            self.profile_version += 1
+        return changed
+
+    def get_turn_sections(self, user_message: str) -> List[PromptSection]:
+        """Per-turn context blocks, lowest priority dropped first under budget.
+
+        Only exchanges outside the chat session (study help, local answers)
+        are included, since chat turns are already in the replayed history.
+        """
         topic = self.memory.extract_topic(user_message)
         topics_discussed = ", ".join(self.memory.topics_discussed) or "None"
-        context = self.memory.get_context_for_llm()
 
-        return f"""
-User Message: {user_message}
+        sections = [
+            PromptSection(
+                "topics",
+                f"Current Topic: {topic}<br>Topics Discussed: {topics_discussed}",
+                priority=10
+            )
+        ]
 
-Current Topic: {topic}  
-Topics Discussed: {topics_discussed}  
-Conversation Context:<br>{context}
+        if self.memory.recent_exchanges(exclude_channel="chat"):
+            context = self.memory.get_context_for_llm(exclude_channel="chat")
+            sections.append(PromptSection("side_context", f"Conversation Context:<br>{context}", priority=20))
 
-Respond following all formatting rules.
-"""
\ No newline at end of file
+        return sections
@@ -1,17 +1,37 @@
 import os
+import re
 import json
-import logging
 import asyncio
-from datetime import datetime
-from typing import Dict, Optional, Any
+import hashlib
+import logging
+import threading
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from admission import AdmissionRejected, get_admission
+from async_runtime import create_task_in
+from llm_backends import create_backend, model_content, system_instruction, user_content
+from metrics import TOKEN_BUCKETS, get_metrics
+from resilience import detached_context, with_resilience, within_deadline
+from session_store import get_session_store
+from chatbot_context import COMPACTION_KEEP_RECENT
+from prompt_builder import PromptBuilder, PromptSection, estimate_tokens
 
-import google.generativeai as genai
-from dotenv import load_dotenv
+logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+# Per-turn input breakdown; the matching log line is DEBUG (sampled)
+PROMPT_TOKENS = get_metrics().histogram(
+    "prompt_tokens", "Estimated input tokens per chat turn by part", ("part",), buckets=TOKEN_BUCKETS
+)
 
-logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+# Opens the (user, model) pair that carries the summary of compacted turns
+SUMMARY_MARKER = "[EARLIER CONVERSATION SUMMARY]"
+
+# Opens the seed pair of histories saved while the system prompt was replayed as a turn
+LEGACY_SEED_MARKER = "[SYSTEM INITIALIZATION]"
 
 
 # ─────────────────────────────────────────────────────────────
@@ -22,54 +42,148 @@ class ChatbotService:
     """Handles all interactions with the Gemini LLM for user conversations."""
 
     def __init__(self):
-        """Initialize Gemini API and model configuration."""
-        
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
+        """Initialize the LLM backend and model configuration.
 
-        genai.configure(api_key=api_key)
+        CHATBOT_LLM_BACKEND selects the backend: "gemini" (default, needs
+        GEMINI_API_KEY) or "fake" for offline runs and load tests.
+        """
 
-        self.model = genai.GenerativeModel(
+        # Deadlines, retries, hedging and the circuit breaker sit outside the
+        # admission limiter, so every retry or hedge holds its own slot
+        self.model = with_resilience(get_admission().wrap(create_backend(
             model_name="gemini-2.0-flash",
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.7,
-                top_p=0.95,
-                top_k=40,
-                max_output_tokens=1024
-            )
-        )
-
-        self.chat_sessions: Dict[str, Any] = {}
-        logger.info("ChatbotService initialized with Gemini API")
+            generation_config={
+                "temperature": 0.7,
+                "topP": 0.95,
+                "topK": 40,
+                "maxOutputTokens": 1024
+            }
+        )))
+
+        # Chat sessions live on the shared, bounded per-user session store
+        self.chat_sessions = get_session_store()
+
+        # Per-request input budget (system instruction + replayed history +
+        # this turn); rolling compaction caps instruction + history separately
+        self.prompt_token_budget = int(os.getenv("CHATBOT_PROMPT_TOKEN_BUDGET", 6000))
+        self.history_token_budget = int(os.getenv("CHATBOT_HISTORY_TOKEN_BUDGET", 4000))
+        self.keep_recent_turns = COMPACTION_KEEP_RECENT
+
+        # Shared system-prompt prefixes: one prebuilt instruction part, its
+        # hash and token estimate per distinct prefix (in practice one per
+        # deploy), reused by every user's requests
+        self._prefixes: Dict[str, Tuple[str, Dict, int]] = {}
+
+        # Single-flight: identical one-shot prompts share one upstream call
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+        logger.info(f"ChatbotService initialized with {self.model.name} backend")
+
+    async def close(self):
+        """Release the pooled upstream HTTP connections."""
+        await self.model.close()
 
     # ─────────────────────────────────────────────────────────────
     # CHAT SESSION MANAGEMENT
     # ─────────────────────────────────────────────────────────────
 
-    def get_or_create_chat_session(self, user_id: str, system_prompt: str):
+    def get_or_create_chat_session(self, user_id: str):
         """Retrieve or create a persistent chat session for a user."""
         
-        if user_id not in self.chat_sessions:
-            self.chat_sessions[user_id] = self.model.start_chat(
-                history=[
-                    {"role": "user", "parts": ["[SYSTEM INITIALIZATION]"]},
-                    {"role": "model", "parts": [system_prompt]}
-                ]
-            )
-        return self.chat_sessions[user_id]
+        session = self.chat_sessions.get_or_create(user_id)
+        if session.chat is None:
+            session.chat = self.model.start_chat()
+        return session.chat
+
+    def restore_chat(self, history: List[Dict]):
+        """Chat session from a persisted history.
+
+        Histories saved while the system prompt was replayed as a seed turn
+        start with that seed pair; it is dropped, the prompt now goes in the
+        system instruction.
+        """
+        if self._opens_with(history, LEGACY_SEED_MARKER):
+            history = history[2:]
+        return self.model.start_chat(history=history)
+
+    @staticmethod
+    def _opens_with(history: List[Dict], marker: str) -> bool:
+        return bool(history) and history[0]["parts"][0].get("text") == marker
+
+    @staticmethod
+    def _summary_history(summary: str) -> List[Dict]:
+        if not summary:
+            return []
+        return [
+            user_content(SUMMARY_MARKER),
+            model_content(f"## 🧾 Earlier Conversation Summary\n{summary}")
+        ]
+
+    def system_instruction(self, system_prompt: Tuple[str, str]) -> Tuple[Dict, str, int]:
+        """System instruction for a (shared prefix, per-user section) prompt.
+
+        Returns the instruction, the shared prefix's hash and the
+        instruction's token estimate. Users with the same prefix share its
+        part, so the leading bytes of every request are identical.
+        """
+        prefix, personal = system_prompt
+        shared = self._prefixes.get(prefix)
+        if shared is None:
+            digest = hashlib.sha1(prefix.encode("utf-8")).hexdigest()[:12]
+            shared = self._prefixes[prefix] = (digest, {"text": prefix}, estimate_tokens(prefix))
+            logger.info(f"New shared system prompt prefix {digest} ({shared[2]} tokens)")
+
+        digest, part, prefix_tokens = shared
+        return system_instruction(part, personal), digest, prefix_tokens + estimate_tokens(personal)
+
+    @staticmethod
+    def history_tokens(history) -> int:
+        return sum(
+            estimate_tokens(part.get("text", ""))
+            for content in history
+            for part in content["parts"]
+        )
+
+    def compact_chat_session(self, chat, summary: str, budget: int) -> int:
+        """Rebuild an over-budget chat from the running summary plus recent turns.
+
+        The summary replaces any earlier one as a leading (user, model) pair.
+        Returns the token estimate of the (possibly compacted) history.
+        """
+
+        history_tokens = self.history_tokens(chat.history)
+        if history_tokens <= budget:
+            return history_tokens
+
+        turns = chat.history[2:] if self._opens_with(chat.history, SUMMARY_MARKER) else chat.history
+        recent = turns[-2 * self.keep_recent_turns:] if self.keep_recent_turns else []
+        seed = self._summary_history(summary)
+
+        # Drop whole (user, model) pairs until the rebuilt history fits
+        while recent and self.history_tokens(seed + recent) > budget:
+            recent = recent[2:]
+
+        logger.debug(
+            f"Compacted chat history from {len(chat.history)} to {len(seed) + len(recent)} messages"
+        )
+        chat.history = seed + recent
+        return self.history_tokens(chat.history)
 
     def clear_session(self, user_id: str):
         """Delete stored chat session for a user."""
-        if user_id in self.chat_sessions:
-            del self.chat_sessions[user_id]
+        session = self.chat_sessions.peek(user_id)
+        if session is not None and session.chat is not None:
+            session.chat = None
             logger.info(f"Cleared chat session for user {user_id}")
 
     # ─────────────────────────────────────────────────────────────
     # RESPONSE POST-PROCESSING (NEW SECTION)
     # ─────────────────────────────────────────────────────────────
 
-    def format_response(self, text: str) -> str:
+    @staticmethod
+    def format_response(text: str) -> str:
         """
         Convert plain text into:
         • Pointwise format
@@ -85,6 +199,49 @@ class ChatbotService:
 
         return text
 
+    def prepare_turn(
+        self,
+        user_message: str,
+        user_id: str,
+        system_prompt: Tuple[str, str],
+        context_sections: List[PromptSection],
+        history_summary: str = ""
+    ):
+        """Return (chat, prompt) for one turn, kept under the input-token budget.
+
+        The system instruction is set from the current prompt on every turn,
+        so profile changes apply immediately. The per-turn prompt carries only
+        new content (context sections, dropped by priority, and the required
+        message); the replayed history is compacted into the remaining budget.
+        """
+
+        chat = self.get_or_create_chat_session(user_id)
+        chat.system_instruction, prefix_hash, instruction_tokens = self.system_instruction(system_prompt)
+
+        builder = PromptBuilder(self.prompt_token_budget // 2)
+        for section in context_sections:
+            builder.add(section.name, section.text, section.priority, section.required)
+        builder.add("message", user_message, required=True)
+        full_prompt, report = builder.build()
+
+        history_budget = min(
+            self.history_token_budget - instruction_tokens,
+            self.prompt_token_budget - instruction_tokens - report.total
+        )
+        history_tokens = self.compact_chat_session(chat, history_summary, history_budget)
+
+        total = instruction_tokens + history_tokens + report.total
+        PROMPT_TOKENS.labels("system").observe(instruction_tokens)
+        PROMPT_TOKENS.labels("history").observe(history_tokens)
+        PROMPT_TOKENS.labels("turn").observe(report.total)
+        PROMPT_TOKENS.labels("total").observe(total)
+        logger.debug(
+            f"Prompt tokens for user {user_id}: system={instruction_tokens} (prefix {prefix_hash}) "
+            f"history={history_tokens} turn[{report.describe()}] request_total={total}",
+            extra={"user_id": user_id, "history_tokens": history_tokens, "prompt_tokens": total},
+        )
+        return chat, full_prompt
+
     # ─────────────────────────────────────────────────────────────
     # RESPONSE GENERATION CORE
     # ─────────────────────────────────────────────────────────────
@@ -93,39 +250,111 @@ class ChatbotService:
         self,
         user_message: str,
         user_id: str,
-        system_prompt: str,
-        context_prompt: str
+        system_prompt: Tuple[str, str],
+        context_sections: List[PromptSection],
+        history_summary: str = ""
     ) -> str:
-        """Generate AI response using chat session and conversation context."""
+        """Generate AI response using chat session and conversation context.
+
+        Upstream failures propagate (as LLMBackendError) so the caller can
+        fall back or answer with a proper error status.
+        """
         
+        # Log sizes only: message text stays out of the logs
+        logger.debug(
+            f"Generating response for user {user_id}",
+            extra={"user_id": user_id, "message_chars": len(user_message)},
+        )
+
         try:
-            print(f"🤖 Generating response for user {user_id}")
-            print(f"📨 Message: {user_message}")
+            chat, full_prompt = self.prepare_turn(
+                user_message, user_id, system_prompt, context_sections, history_summary
+            )
 
-            chat = self.get_or_create_chat_session(user_id, system_prompt)
+            response_text = await chat.send_message(full_prompt)
 
-            # Short, crisp, emoji-friendly instruction added:
-            full_prompt = (
-                "Respond in medium paragraphs"
-                "Use emojis. Avoid long paragraphs. No greetings. "
-                "Directly answer the user's question.<br><br>"
-                f"{context_prompt}<br><br>{user_message}"
-            )
+            # Apply formatting before returning
+            return self.format_response(response_text)
 
-            print(f"📤 Sending to Gemini...")
+        except AdmissionRejected:
+            raise
 
-            response = chat.send_message(full_prompt)
+        except Exception as e:
+            logger.error(f"Error generating response for user {user_id}: {str(e)}")
+            raise
 
-            print(f"✅ Got response from Gemini")
+    async def generate_response_stream(
+        self,
+        user_message: str,
+        user_id: str,
+        system_prompt: Tuple[str, str],
+        context_sections: List[PromptSection],
+        history_summary: str = ""
+    ) -> AsyncIterator[str]:
+        """Stream a formatted AI response chunk by chunk as Gemini generates it.
+
+        format_response only rewrites single characters, so applying it per
+        chunk yields the same text as formatting the completed reply.
+        """
 
-            # Apply formatting before returning
-            return self.format_response(response.text)
+        chat, full_prompt = self.prepare_turn(
+            user_message, user_id, system_prompt, context_sections, history_summary
+        )
 
-        except Exception as e:
-            error_msg = str(e)
-            print(f"❌ Error generating response: {error_msg}")
-            logger.error(f"Error generating response: {error_msg}")
-            return f"I encountered an error while processing your message. Please try again. Error: {error_msg}"
+        async for chunk in chat.send_message_stream(full_prompt):
+            yield self.format_response(chunk)
+
+    # ─────────────────────────────────────────────────────────────
+    # ONE-SHOT GENERATION
+    # ─────────────────────────────────────────────────────────────
+
+    def prompt_key(self, prompt: str) -> str:
+        """Identity of a one-shot call: model, generation config and normalized prompt."""
+        normalized = _WHITESPACE_RE.sub(" ", prompt).strip()
+        encoded = json.dumps(
+            [self.model.model_name, self.model.generation_config, normalized],
+            sort_keys=True, ensure_ascii=False
+        ).encode("utf-8")
+        return hashlib.sha1(encoded).hexdigest()
+
+    async def generate_content(self, prompt: str) -> str:
+        """Generate raw text for a single standalone prompt.
+
+        Concurrent calls with the same prompt key share one upstream request.
+        The request runs as its own task without any caller's deadline, so a
+        caller that disconnects or times out does not fail it for the others;
+        it is cancelled once no caller is waiting for it any more.
+        """
+        key = self.prompt_key(prompt)
+        task = self._inflight.get(key)
+
+        if task is None:
+            self.upstream_calls += 1
+            task = create_task_in(detached_context(), self.model.generate_content(prompt))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            # Mark the outcome retrieved even if every caller went away
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        else:
+            self.coalesced_calls += 1
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await within_deadline(asyncio.shield(task))
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "upstream_calls": self.upstream_calls,
+            "coalesced_calls": self.coalesced_calls,
+            "in_flight": len(self._inflight),
+            "shared_prompt_prefixes": len(self._prefixes),
+        }
 
     # ─────────────────────────────────────────────────────────────
     # FEATURE EXPLANATION
@@ -139,12 +368,8 @@ class ChatbotService:
         )
 
         try:
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.model.generate_content(prompt)
-            )
-            return self.format_response(response.text)
+            response_text = await self.generate_content(prompt)
+            return self.format_response(response_text)
 
         except Exception as e:
             logger.error(f"Error getting feature explanation: {str(e)}")
@@ -162,12 +387,8 @@ class ChatbotService:
         )
 
         try:
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.model.generate_content(prompt)
-            )
-            return self.format_response(response.text)
+            response_text = await self.generate_content(prompt)
+            return self.format_response(response_text)
 
         except Exception as e:
             logger.error(f"Error getting registration guidance: {str(e)}")
@@ -188,12 +409,8 @@ class ChatbotService:
         )
 
         try:
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.model.generate_content(prompt)
-            )
-            return self.format_response(response.text)
+            response_text = await self.generate_content(prompt)
+            return self.format_response(response_text)
 
         except Exception as e:
             logger.error(f"Error getting study help: {str(e)}")
@@ -204,21 +421,14 @@ class ChatbotService:
     # ─────────────────────────────────────────────────────────────
 
     async def get_motivational_message(self, user_name: str = "", streak: int = 0, user_id: str = "") -> str:
-        """Generate a personalized motivational message."""
-        
-        prompt = (
-            "Give a short motivational message with emojis."
-            f"{f' Name: {user_name}.' if user_name else ''}"
-            f"{f' Streak: {streak} days.' if streak > 0 else ''}"
-        )
+        """Personalized motivational message from the pre-generated pool."""
+
+        # Imported here: the pool generates through this service
+        from motivation_pool import get_motivation_pool
 
         try:
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.model.generate_content(prompt)
-            )
-            return self.format_response(response.text)
+            response_text, _ = await get_motivation_pool().message(user_name or "Friend", streak)
+            return self.format_response(response_text)
 
         except Exception:
             logger.error("Error generating motivational message")
@@ -230,14 +440,26 @@ class ChatbotService:
 # ─────────────────────────────────────────────────────────────
 
 _chatbot_service: Optional[ChatbotService] = None
+_chatbot_service_lock = threading.Lock()
 
 
 def get_chatbot_service() -> ChatbotService:
-    """Return global ChatbotService instance (singleton pattern)."""
+    """Return global ChatbotService instance (singleton pattern).
+
+    Created on first use; the startup warm-up may build it on an executor
+    thread while the first requests arrive, hence the lock.
+    """
     
     global _chatbot_service
 
     if _chatbot_service is None:
-        _chatbot_service = ChatbotService()
+        with _chatbot_service_lock:
+            if _chatbot_service is None:
+                _chatbot_service = ChatbotService()
+
+    return _chatbot_service
+
 
+def peek_chatbot_service() -> Optional[ChatbotService]:
+    """Return the service if it has been created, without creating it."""
     return _chatbot_service
@@ -0,0 +1,298 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from chatbot_context import ChatbotContext
+from session_store import SessionStore, UserSession
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+# ─────────────────────────────────────────────────────────────
+# STORAGE BACKENDS
+# ─────────────────────────────────────────────────────────────
+
+class ConversationStore:
+    """Backend interface: per-user snapshots keyed by user_id."""
+
+    def load(self, user_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def write_batch(self, upserts: Dict[str, Dict], deletes: List[str]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Snapshots stored as JSON rows in a local SQLite database.
+
+    The database runs in WAL mode with separate reader and writer
+    connections, so a lazy load on the request path is not blocked by a
+    batch being committed on the writer thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_state ("
+                " user_id TEXT PRIMARY KEY,"
+                " snapshot TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread (request loop reads, writer thread writes)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, user_id: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            "SELECT snapshot FROM user_state WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def write_batch(self, upserts: Dict[str, Dict], deletes: List[str]):
+        now = time.time()
+        rows = [
+            (user_id, json.dumps(snapshot, ensure_ascii=False), now)
+            for user_id, snapshot in upserts.items()
+        ]
+        with self._connect() as conn:
+            if rows:
+                conn.executemany(
+                    "INSERT INTO user_state (user_id, snapshot, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET "
+                    "snapshot = excluded.snapshot, updated_at = excluded.updated_at",
+                    rows
+                )
+            if deletes:
+                conn.executemany("DELETE FROM user_state WHERE user_id = ?", [(u,) for u in deletes])
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# ─────────────────────────────────────────────────────────────
+# WRITE-BEHIND PERSISTENCE
+# ─────────────────────────────────────────────────────────────
+
+class ConversationPersistence:
+    """Write-behind persistence of user sessions with lazy loading.
+
+    ``save`` only records the latest snapshot of a user in a pending map, so
+    several turns within one flush interval coalesce into a single row
+    write. A writer thread commits pending snapshots in batches every
+    ``flush_interval`` seconds, or sooner once ``batch_size`` users are
+    pending. Sessions missing from memory are loaded from the backend on
+    first access, preferring a snapshot that has not been flushed yet; the
+    backend read (``fetch``) happens outside the session store's lock, and
+    in the default executor for ``SessionStore.get_or_create_async``.
+    """
+
+    def __init__(self, backend: ConversationStore, flush_interval: float = 1.0, batch_size: int = 500):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.restore_chat: Optional[Callable[[List[Dict]], Any]] = None
+
+        # user_id -> snapshot, or None for a pending delete
+        self._pending: Dict[str, Optional[Dict]] = {}
+        # batch currently being written, still visible to lazy loads
+        self._flushing: Dict[str, Optional[Dict]] = {}
+        self._lock = threading.Lock()
+        # Serializes batches, so flush() returns only after earlier writes landed
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.loads = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.write_errors = 0
+
+    def install(self, sessions: SessionStore, restore_chat: Callable[[List[Dict]], Any]):
+        """Load evicted or not-yet-seen users from storage on first access."""
+        self.restore_chat = restore_chat
+        sessions.set_loader(self.load_session, fetch=self.fetch)
+
+    # ─────────────────────────────────────────────────────────────
+    # SNAPSHOTS
+    # ─────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def snapshot(session: UserSession) -> Dict:
+        return {
+            "context": session.context.snapshot() if session.context is not None else None,
+            "chat_history": session.chat.snapshot() if session.chat is not None else None,
+        }
+
+    def _unflushed(self, user_id: str) -> Any:
+        """Queued or in-flight snapshot (None for a delete), else _MISSING."""
+        with self._lock:
+            data = self._pending.get(user_id, _MISSING)
+            if data is _MISSING:
+                data = self._flushing.get(user_id, _MISSING)
+        return data
+
+    def fetch(self, user_id: str) -> Optional[Dict]:
+        """Latest snapshot of a user: the unflushed one, else a blocking backend read."""
+        data = self._unflushed(user_id)
+        if data is _MISSING:
+            data = self.backend.load(user_id)
+        return data
+
+    def load_session(self, session: UserSession, stored: Optional[Dict] = None):
+        """Fill a new session from ``fetch``'s result, or a snapshot queued since.
+
+        A flush finishing between ``fetch`` and this call leaves nothing
+        unflushed, and ``stored`` already holds what it wrote.
+        """
+        data = self._unflushed(session.user_id)
+        if data is _MISSING:
+            data = stored
+        if not data:
+            return
+
+        self.loads += 1
+        if data.get("context"):
+            session.context = ChatbotContext.restore(data["context"])
+        if data.get("chat_history") and self.restore_chat is not None:
+            session.chat = self.restore_chat(data["chat_history"])
+
+    # ─────────────────────────────────────────────────────────────
+    # WRITE-BEHIND QUEUE
+    # ─────────────────────────────────────────────────────────────
+
+    def save(self, session: UserSession):
+        """Queue the session's current state; never touches the disk."""
+        self._queue(session.user_id, self.snapshot(session))
+
+    def delete(self, user_id: str):
+        self._queue(user_id, None)
+
+    def _queue(self, user_id: str, snapshot: Optional[Dict]):
+        with self._lock:
+            self._pending[user_id] = snapshot
+            pending = len(self._pending)
+
+        self._ensure_started()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="conversation-store-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Write all pending snapshots in one batch; returns rows written."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._flushing = batch
+        if not batch:
+            return 0
+
+        upserts = {user_id: snap for user_id, snap in batch.items() if snap is not None}
+        deletes = [user_id for user_id, snap in batch.items() if snap is None]
+
+        try:
+            self.backend.write_batch(upserts, deletes)
+        except Exception as e:
+            self.write_errors += 1
+            logger.error(f"Conversation store flush failed ({len(batch)} users): {str(e)}")
+            # Put the batch back unless newer state was queued meanwhile
+            with self._lock:
+                for user_id, snap in batch.items():
+                    self._pending.setdefault(user_id, snap)
+                self._flushing = {}
+            return 0
+
+        with self._lock:
+            self._flushing = {}
+
+        self.flushes += 1
+        self.rows_written += len(batch)
+        return len(batch)
+
+    def close(self):
+        """Stop the writer thread and flush whatever is still pending."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+        self.backend.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "loads": self.loads,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "write_errors": self.write_errors,
+        }
+
+
+# ─────────────────────────────────────────────────────────────
+# GLOBAL PERSISTENCE ACCESSOR
+# ─────────────────────────────────────────────────────────────
+
+_persistence: Optional[ConversationPersistence] = None
+
+
+def get_persistence() -> Optional[ConversationPersistence]:
+    """Return the process-wide ConversationPersistence, or None when disabled (singleton pattern)."""
+
+    global _persistence
+
+    backend = os.getenv("CHATBOT_STORE_BACKEND", "none").lower()
+    if backend in ("", "none", "memory"):
+        return None
+
+    if _persistence is None:
+        if backend != "sqlite":
+            raise ValueError(f"Unknown CHATBOT_STORE_BACKEND: {backend}")
+
+        _persistence = ConversationPersistence(
+            SQLiteConversationStore(os.getenv("CHATBOT_STORE_PATH", "chatbot_state.db")),
+            flush_interval=float(os.getenv("CHATBOT_STORE_FLUSH_INTERVAL", 1.0)),
+            batch_size=int(os.getenv("CHATBOT_STORE_BATCH_SIZE", 500)),
+        )
+        atexit.register(_persistence.close)
+
+    return _persistence
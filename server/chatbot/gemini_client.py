@@ -0,0 +1,156 @@
+import os
+import json
+import logging
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Any
+
+import aiohttp
+
+from llm_backends import LLMBackend, LLMBackendError
+
+logger = logging.getLogger(__name__)
+
+
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+
+DEFAULT_GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "topP": 0.95,
+    "topK": 40,
+    "maxOutputTokens": 1024,
+}
+
+
+class GeminiAPIError(LLMBackendError):
+    """Raised when the Gemini REST API returns a non-success response."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(status, message, provider="Gemini API")
+
+
+# ─────────────────────────────────────────────────────────────
+# ASYNC GEMINI CLIENT (POOLED AIOHTTP SESSION)
+# ─────────────────────────────────────────────────────────────
+
+class GeminiClient(LLMBackend):
+    """Non-blocking Gemini client built on a pooled aiohttp session.
+
+    The HTTP session is created lazily inside the running event loop, so one
+    client serves every concurrent request on that loop through a shared
+    keep-alive connection pool.
+    """
+
+    name = "gemini"
+
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = "gemini-2.0-flash",
+        generation_config: Optional[Dict[str, Any]] = None,
+        max_connections: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        super().__init__(model_name, generation_config or DEFAULT_GENERATION_CONFIG)
+        self.api_key = api_key
+        self.max_connections = max_connections or int(os.getenv("GEMINI_MAX_CONNECTIONS", 100))
+        self.timeout = timeout or float(os.getenv("GEMINI_TIMEOUT", 60))
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ─────────────────────────────────────────────────────────────
+    # SESSION LIFECYCLE
+    # ─────────────────────────────────────────────────────────────
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled session, creating it on the current loop if needed."""
+
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                ttl_dns_cache=300,
+                keepalive_timeout=30,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def close(self):
+        """Close the pooled HTTP session."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
+    # ─────────────────────────────────────────────────────────────
+    # REQUESTS
+    # ─────────────────────────────────────────────────────────────
+
+    def _url(self, method: str) -> str:
+        return f"{GEMINI_API_BASE}/models/{self.model_name}:{method}"
+
+    def _payload(self, contents: List[Dict], system_instruction: Optional[Dict] = None) -> Dict:
+        payload = {
+            "contents": contents,
+            "generationConfig": self.generation_config,
+        }
+        if system_instruction:
+            # Sent ahead of the contents, so a shared instruction prefix is
+            # what the API's implicit prompt caching can reuse across users
+            payload["systemInstruction"] = system_instruction
+        return payload
+
+    @staticmethod
+    def _extract_text(data: Dict) -> str:
+        candidates = data.get("candidates") or []
+        if not candidates:
+            return ""
+        parts = candidates[0].get("content", {}).get("parts", [])
+        return "".join(part.get("text", "") for part in parts)
+
+    async def _post(self, contents: List[Dict], system_instruction: Optional[Dict]) -> Dict:
+        session = self._get_session()
+        try:
+            async with session.post(
+                self._url("generateContent"),
+                params={"key": self.api_key},
+                json=self._payload(contents, system_instruction),
+            ) as resp:
+                if resp.status != 200:
+                    raise GeminiAPIError(resp.status, await resp.text())
+                return await resp.json()
+        except aiohttp.ClientError as e:
+            # Transport failures surface as a retryable 503
+            raise GeminiAPIError(503, f"Connection failed: {str(e)}") from e
+
+    async def _stream(self, contents: List[Dict], system_instruction: Optional[Dict]) -> AsyncIterator[str]:
+        """Yield text chunks from the server-sent event stream as they arrive."""
+        session = self._get_session()
+        try:
+            async with session.post(
+                self._url("streamGenerateContent"),
+                params={"key": self.api_key, "alt": "sse"},
+                json=self._payload(contents, system_instruction),
+            ) as resp:
+                if resp.status != 200:
+                    raise GeminiAPIError(resp.status, await resp.text())
+
+                async for raw_line in resp.content:
+                    line = raw_line.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    text = self._extract_text(json.loads(line[len("data:"):]))
+                    if text:
+                        yield text
+        except aiohttp.ClientError as e:
+            raise GeminiAPIError(503, f"Connection failed: {str(e)}") from e
+
+    async def complete(self, contents: List[Dict], system_instruction: Optional[Dict] = None) -> str:
+        return self._extract_text(await self._post(contents, system_instruction))
+
+    def stream(self, contents: List[Dict], system_instruction: Optional[Dict] = None) -> AsyncIterator[str]:
+        return self._stream(contents, system_instruction)
@@ -0,0 +1,943 @@
+"""
+Transport-agnostic route handlers shared by the Flask (WSGI) app in app.py
+and the ASGI app in asgi.py.
+
+Every handler is a coroutine taking the decoded JSON body and returning a
+``(payload, status)`` tuple, or ``(payload, status, headers)`` when extra
+response headers are needed. Streaming handlers return an async iterator of
+server-sent event frames as the payload instead of a dict, plain-text
+handlers (``/metrics``) return a string with its Content-Type in headers,
+and static knowledge-base routes return a pre-serialized ``StaticContent``
+that the front end answers with 200, gzip or 304 from the request headers.
+"""
+
+import os
+import hmac
+import json
+import math
+import asyncio
+import functools
+import ipaddress
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from admission import AdmissionRejected, get_admission
+from chatbot_service import ChatbotService, get_chatbot_service, peek_chatbot_service
+from chatbot_context import ChatbotContext, UserProfile, ProgressBrainKnowledgeBase
+from session_store import get_session_store
+from conversation_store import get_persistence
+from answer_cache import get_answer_cache
+from kb_index import SearchHit
+from llm_backends import LLMBackendError
+from local_router import get_local_router, render_hit
+from logging_setup import dropped_log_records
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, get_metrics
+from motivation_pool import get_motivation_pool
+from readiness import get_readiness
+from resilience import TRANSIENT_STATUSES, CircuitOpenError, UpstreamTimeout, request_deadline
+from static_content import StaticContent, get_static_content
+from response_cache import (
+    content_version,
+    feature_explanation_prompt,
+    get_response_cache,
+    registration_guidance_prompt,
+)
+
+logger = logging.getLogger(__name__)
+
+Payload = Union[Dict, str, AsyncIterator[str], StaticContent]
+HandlerResult = Union[Tuple[Payload, int], Tuple[Payload, int, Dict[str, str]]]
+
+# Per-user contexts and chat sessions, bounded and evicted together
+user_sessions = get_session_store()
+
+# Write-behind persistence; evicted or restarted users are reloaded lazily
+persistence = get_persistence()
+if persistence is not None:
+    persistence.install(
+        user_sessions,
+        restore_chat=lambda history: get_chatbot_service().restore_chat(history)
+    )
+
+
+# -------------------------------------------------------------------------
+# Metrics
+# -------------------------------------------------------------------------
+metrics = get_metrics()
+
+REQUEST_LATENCY = metrics.histogram(
+    "request_duration_seconds",
+    "Time until the response is produced (streams: until the stream starts)",
+    ("method", "route", "status")
+)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    """Record one request; called by the Flask and ASGI front ends."""
+    REQUEST_LATENCY.labels(method, route, status).observe(seconds)
+
+    # Access log: DEBUG, so it is sampled (see logging_setup.py)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"{method} {route} {status} {seconds * 1000:.1f}ms",
+            extra={"method": method, "route": route, "status": status, "duration_ms": round(seconds * 1000, 1)}
+        )
+
+
+def from_service(read):
+    """Metric callback reading the ChatbotService; empty until it has started."""
+    def collect():
+        service = peek_chatbot_service()
+        return read(service) if service is not None else None
+    return collect
+
+
+def register_metrics():
+    """Export state the service already tracks; read only when /metrics is scraped.
+
+    Scraping never creates the service: its metrics stay empty until the
+    startup warm-up (readiness.py) or the first LLM request builds it.
+    """
+    admission = get_admission
+
+    metrics.gauge_callback(
+        "active_user_contexts", "User contexts held in memory",
+        lambda: user_sessions.active_counts()["contexts"]
+    )
+    metrics.gauge_callback(
+        "active_chat_sessions", "Chat sessions held in memory",
+        lambda: user_sessions.active_counts()["chats"]
+    )
+    metrics.gauge_callback("session_bytes", "Estimated bytes held by user sessions", lambda: user_sessions.total_bytes)
+    metrics.counter_callback(
+        "session_evictions_total", "Evicted user sessions by reason",
+        lambda: {(reason,): count for reason, count in user_sessions.evictions.items()}, ("reason",)
+    )
+
+    metrics.gauge_callback("upstream_in_flight", "Upstream calls holding an admission slot", lambda: admission().upstream.in_flight)
+    metrics.gauge_callback("upstream_queue_depth", "Upstream calls waiting for an admission slot", lambda: admission().upstream.queue_depth)
+    metrics.counter_callback(
+        "admission_rejected_total", "Requests shed by admission control by reason",
+        lambda: {(reason,): count for reason, count in admission().stats()["rejected"].items()}, ("reason",)
+    )
+
+    metrics.counter_callback(
+        "oneshot_calls_total", "One-shot generations by how they were served (upstream or coalesced)",
+        from_service(lambda service: {("upstream",): service.upstream_calls, ("coalesced",): service.coalesced_calls}),
+        ("source",)
+    )
+    metrics.counter_callback("upstream_retries_total", "Upstream retries", from_service(lambda service: service.model.retries))
+    metrics.counter_callback("upstream_hedges_total", "Hedged upstream attempts started", from_service(lambda service: service.model.hedges))
+    metrics.counter_callback(
+        "upstream_short_circuited_total", "Calls rejected by the open circuit breaker",
+        from_service(lambda service: service.model.breaker.short_circuited)
+    )
+    metrics.gauge_callback(
+        "upstream_circuit_open", "1 while the upstream circuit breaker is open or probing",
+        from_service(lambda service: 0 if service.model.breaker.state == "closed" else 1)
+    )
+    metrics.gauge_callback("ready", "1 once the startup warm-up has finished", lambda: 1 if get_readiness().ready else 0)
+    metrics.counter_callback("log_records_dropped_total", "Log records dropped because the log queue was full", dropped_log_records)
+
+    response_cache = get_response_cache()
+    answer_cache = get_answer_cache()
+    motivation_pool = get_motivation_pool()
+    router = get_local_router()
+    metrics.counter_callback(
+        "cache_requests_total", "Cache lookups by cache and result",
+        lambda: {
+            ("sessions", "hit"): user_sessions.hits,
+            ("sessions", "miss"): user_sessions.misses,
+            ("kb_responses", "hit"): response_cache.hits,
+            ("kb_responses", "miss"): response_cache.misses,
+            ("study_answers", "hit"): answer_cache.exact_hits + answer_cache.similar_hits,
+            ("study_answers", "miss"): answer_cache.misses,
+            ("motivation", "hit"): motivation_pool.hits,
+            ("motivation", "miss"): motivation_pool.misses,
+        },
+        ("cache", "result")
+    )
+    metrics.counter_callback(
+        "local_answers_total", "Chat messages answered from the knowledge base",
+        lambda: {("route",): router.local, ("fallback",): router.fallbacks}, ("kind",)
+    )
+
+    if persistence is not None:
+        metrics.gauge_callback(
+            "persistence_pending", "User snapshots waiting for the write-behind flush",
+            lambda: persistence.stats()["pending"]
+        )
+
+
+register_metrics()
+
+
+# -------------------------------------------------------------------------
+# Context Management
+# -------------------------------------------------------------------------
+async def load_user_session(user_id: Optional[str]):
+    """Bring a user's session into memory; stored state is read off the event loop.
+
+    Call before the synchronous context helpers below, so a session miss
+    never blocks the loop on the conversation store.
+    """
+    if user_id:
+        await user_sessions.get_or_create_async(user_id)
+
+
+def get_user_context(user_id: str, user_data: dict = None) -> ChatbotContext:
+    """Retrieve or create a user's ChatbotContext."""
+    session = user_sessions.get_or_create(user_id)
+    if session.context is None:
+        profile = UserProfile(
+            user_id=user_id,
+            name=user_data.get("name", "") if user_data else "",
+            email=user_data.get("email", "") if user_data else "",
+            study_level=user_data.get("study_level", "beginner") if user_data else "beginner",
+            subjects_of_interest=user_data.get("subjects_of_interest", []) if user_data else [],
+            is_registered=user_data.get("is_registered", True) if user_data else True,
+        )
+        session.context = ChatbotContext(profile)
+
+    return session.context
+
+
+def update_user_context(user_id: str, context: dict) -> ChatbotContext:
+    """Retrieve a user's context and refresh its profile from the request.
+
+    Unchanged fields are left alone, so the cached prompt fragments stay valid.
+    """
+    user_ctx = get_user_context(user_id, context)
+    user_ctx.update_profile(context)
+    return user_ctx
+
+
+def save_user_state(user_id: str):
+    """Re-measure the user's session and queue its profile, memory and chat for persistence."""
+    user_sessions.resize(user_id)
+    if persistence is None:
+        return
+    session = user_sessions.peek(user_id)
+    if session is not None:
+        persistence.save(session)
+
+
+def answer_locally(
+    user_ctx: ChatbotContext, user_message: str, subject=None, topic=None, fallback: bool = False
+) -> Optional[str]:
+    """Serve a high-confidence knowledge-base answer without calling Gemini.
+
+    With ``fallback`` the router's looser threshold is used, for when Gemini
+    is unavailable. Local answers are recorded on the "local" channel, so
+    later LLM turns see them as side context rather than as chat-session
+    history.
+    """
+    router = get_local_router()
+    message_topic = user_ctx.memory.extract_topic(user_message)
+    local = router.fallback(user_message, message_topic) if fallback else router.route(user_message, message_topic)
+    if local is None:
+        return None
+
+    response = ChatbotService.format_response(local.text)
+    user_ctx.memory.add_exchange(
+        user_message,
+        response,
+        {"subject": subject, "topic": topic, "channel": "local"}
+    )
+    save_user_state(user_ctx.user_profile.user_id)
+    return response
+
+
+def json_object_body(handler: Callable[[dict], Awaitable[HandlerResult]]) -> Callable[[dict], Awaitable[HandlerResult]]:
+    """Answer 400 before ``handler`` runs when the JSON body is not an object.
+
+    Every POST route and batch operation goes through this, so handlers can
+    call ``data.get`` on any body the front ends decode.
+    """
+    @functools.wraps(handler)
+    async def wrapper(data: dict) -> HandlerResult:
+        if not isinstance(data, dict):
+            return {"error": "Request body must be a JSON object"}, 400
+        return await handler(data)
+    return wrapper
+
+
+def split_result(result: HandlerResult) -> Tuple[Payload, int, Dict[str, str]]:
+    """Normalize a handler result to ``(payload, status, headers)``."""
+    if len(result) == 3:
+        return result
+    payload, status = result
+    return payload, status, {}
+
+
+def too_many_requests(error: AdmissionRejected) -> HandlerResult:
+    """429 response for a request shed by admission control."""
+    return {
+        "error": str(error),
+        "reason": error.reason,
+        "retry_after": error.retry_after_header
+    }, 429, {"Retry-After": error.retry_after_header}
+
+
+def upstream_failure(error: LLMBackendError) -> HandlerResult:
+    """Error response for an upstream call that failed after retries."""
+    if isinstance(error, UpstreamTimeout):
+        return {"error": str(error), "reason": "upstream_timeout"}, 504
+
+    if isinstance(error, CircuitOpenError):
+        retry_after = str(max(1, math.ceil(error.retry_after)))
+        return {
+            "error": str(error),
+            "reason": "circuit_open",
+            "retry_after": retry_after
+        }, 503, {"Retry-After": retry_after}
+
+    if error.status in TRANSIENT_STATUSES:
+        return {"error": str(error), "reason": "upstream_unavailable"}, 503
+    return {"error": str(error), "reason": "upstream_error"}, 502
+
+
+def kb_fallback(kind: str, key: str, data: Dict) -> str:
+    """Formatted knowledge-base entry, served when its LLM answer is unavailable."""
+    return ChatbotService.format_response(render_hit(SearchHit(kind, key, 0.0, data)))
+
+
+def sse_event(data: Dict, event: Optional[str] = None) -> str:
+    """Encode one server-sent event frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+# -------------------------------------------------------------------------
+# Health Check & Metrics
+# -------------------------------------------------------------------------
+async def health(data: Optional[dict] = None) -> HandlerResult:
+    service = peek_chatbot_service()
+    return {
+        "status": "healthy",
+        "service": "ProgressBrain Chatbot API",
+        "version": "1.0.0",
+        "startup": get_readiness().stats(),
+        "sessions": user_sessions.stats(),
+        "local_router": get_local_router().stats(),
+        "motivation_pool": get_motivation_pool().stats(),
+        "persistence": persistence.stats() if persistence is not None else None,
+        "upstream": service.stats() if service is not None else None,
+        "resilience": service.model.stats() if service is not None else None,
+        "admission": get_admission().stats()
+    }, 200
+
+
+async def liveness(data: Optional[dict] = None) -> HandlerResult:
+    """The process is up and serving; never touches the service."""
+    return {"status": "alive"}, 200
+
+
+async def readiness(data: Optional[dict] = None) -> HandlerResult:
+    """200 once the knowledge base and LLM backend are warm, else 503."""
+    state = get_readiness().stats()
+    if state["ready"]:
+        return {"status": "ready", **state}, 200
+    failed = "failed" in state["components"].values()
+    return {"status": "failed" if failed else "starting", **state}, 503
+
+
+async def metrics_text(data: Optional[dict] = None) -> HandlerResult:
+    return metrics.render(), 200, {"Content-Type": METRICS_CONTENT_TYPE}
+
+
+# -------------------------------------------------------------------------
+# Chat Response Generation
+# -------------------------------------------------------------------------
+@json_object_body
+async def generate_response(data: dict) -> HandlerResult:
+    try:
+        user_id = data.get("user_id")
+        user_message = data.get("user_message")
+        context = data.get("context", {})
+        subject = data.get("subject")
+        topic = data.get("topic")
+
+        if not user_id or not user_message:
+            return {"error": "user_id and user_message are required"}, 400
+
+        get_admission().admit(user_id)
+        await load_user_session(user_id)
+        user_ctx = update_user_context(user_id, context)
+
+        # Knowledge-base questions are answered without an LLM round-trip
+        response = answer_locally(user_ctx, user_message, subject, topic)
+        if response is not None:
+            return {
+                "response": response,
+                "timestamp": user_ctx.session_start_time.isoformat(),
+                "local": True
+            }, 200
+
+        # Build prompts
+        system_prompt = user_ctx.system_prompt_parts()
+        context_sections = user_ctx.get_turn_sections(user_message)
+
+        # Generate chatbot response within the request's deadline
+        try:
+            with request_deadline(data.get("timeout_ms")):
+                response = await get_chatbot_service().generate_response(
+                    user_message=user_message,
+                    user_id=user_id,
+                    system_prompt=system_prompt,
+                    context_sections=context_sections,
+                    history_summary=user_ctx.memory.context_summary
+                )
+        except LLMBackendError as e:
+            fallback = answer_locally(user_ctx, user_message, subject, topic, fallback=True)
+            if fallback is None:
+                return upstream_failure(e)
+            return {
+                "response": fallback,
+                "timestamp": user_ctx.session_start_time.isoformat(),
+                "local": True,
+                "fallback": True
+            }, 200
+
+        # Save conversation memory
+        user_ctx.memory.add_exchange(
+            user_message,
+            response,
+            {"subject": subject, "topic": topic, "channel": "chat"}
+        )
+        save_user_state(user_id)
+
+        return {
+            "response": response,
+            "timestamp": user_ctx.session_start_time.isoformat(),
+            "local": False
+        }, 200
+
+    except AdmissionRejected as e:
+        return too_many_requests(e)
+
+    except Exception as e:
+        logger.error(f"Error in generate_response: {str(e)}")
+        return {"error": str(e)}, 500
+
+
+# -------------------------------------------------------------------------
+# Streaming Chat Response (Server-Sent Events)
+# -------------------------------------------------------------------------
+async def local_events(user_ctx: ChatbotContext, response: str, fallback: bool = False) -> AsyncIterator[str]:
+    """A knowledge-base answer as a one-chunk event stream."""
+    done = {
+        "response": response,
+        "timestamp": user_ctx.session_start_time.isoformat(),
+        "local": True
+    }
+    if fallback:
+        done["fallback"] = True
+
+    yield sse_event({"chunk": response})
+    yield sse_event(done, event="done")
+
+
+@json_object_body
+async def generate_response_stream(data: dict) -> HandlerResult:
+    user_id = data.get("user_id")
+    user_message = data.get("user_message")
+    context = data.get("context", {})
+    subject = data.get("subject")
+    topic = data.get("topic")
+
+    if not user_id or not user_message:
+        return {"error": "user_id and user_message are required"}, 400
+
+    try:
+        get_admission().admit(user_id)
+        await load_user_session(user_id)
+        user_ctx = update_user_context(user_id, context)
+        local_response = answer_locally(user_ctx, user_message, subject, topic)
+        if local_response is None:
+            # Reject before the 200 and event-stream headers go out
+            get_admission().check_capacity()
+            get_chatbot_service().model.ensure_available()
+            system_prompt = user_ctx.system_prompt_parts()
+            context_sections = user_ctx.get_turn_sections(user_message)
+    except AdmissionRejected as e:
+        return too_many_requests(e)
+    except CircuitOpenError as e:
+        local_response = answer_locally(user_ctx, user_message, subject, topic, fallback=True)
+        if local_response is None:
+            return upstream_failure(e)
+        return local_events(user_ctx, local_response, fallback=True), 200
+    except Exception as e:
+        logger.error(f"Error in generate_response_stream: {str(e)}")
+        return {"error": str(e)}, 500
+
+    if local_response is not None:
+        return local_events(user_ctx, local_response), 200
+
+    async def events() -> AsyncIterator[str]:
+        chunks = []
+        try:
+            with request_deadline(data.get("timeout_ms")):
+                async for chunk in get_chatbot_service().generate_response_stream(
+                    user_message=user_message,
+                    user_id=user_id,
+                    system_prompt=system_prompt,
+                    context_sections=context_sections,
+                    history_summary=user_ctx.memory.context_summary
+                ):
+                    chunks.append(chunk)
+                    yield sse_event({"chunk": chunk})
+
+        except AdmissionRejected as e:
+            yield sse_event({"error": str(e), "reason": e.reason, "retry_after": e.retry_after_header}, event="error")
+            return
+
+        except LLMBackendError as e:
+            logger.error(f"Error in generate_response_stream: {str(e)}")
+            fallback = None if chunks else answer_locally(user_ctx, user_message, subject, topic, fallback=True)
+            if fallback is None:
+                payload = split_result(upstream_failure(e))[0]
+                yield sse_event(payload, event="error")
+                return
+            async for frame in local_events(user_ctx, fallback, fallback=True):
+                yield frame
+            return
+
+        except Exception as e:
+            logger.error(f"Error in generate_response_stream: {str(e)}")
+            yield sse_event({"error": str(e)}, event="error")
+            return
+
+        response = "".join(chunks)
+
+        # Save conversation memory once the full reply is known
+        user_ctx.memory.add_exchange(
+            user_message,
+            response,
+            {"subject": subject, "topic": topic, "channel": "chat"}
+        )
+        save_user_state(user_id)
+
+        yield sse_event({
+            "response": response,
+            "timestamp": user_ctx.session_start_time.isoformat(),
+            "local": False
+        }, event="done")
+
+    return events(), 200
+
+
+# -------------------------------------------------------------------------
+# Feature Info
+# -------------------------------------------------------------------------
+@json_object_body
+async def feature_info(data: dict) -> HandlerResult:
+    try:
+        feature = data.get("feature")
+        user_id = data.get("user_id")
+
+        if not feature:
+            return {"error": "feature is required"}, 400
+
+        get_admission().admit(user_id)
+
+        feature_data = ProgressBrainKnowledgeBase.get_feature_info(feature)
+
+        if not feature_data:
+            return {"error": f"Feature '{feature}' not found"}, 404
+
+        # Served from the warmed knowledge-base cache; LLM only on a cold entry
+        try:
+            with request_deadline(data.get("timeout_ms")):
+                explanation = await get_response_cache().get(
+                    "feature",
+                    feature.lower(),
+                    content_version(feature_data),
+                    lambda: feature_explanation_prompt(feature.lower(), feature_data)
+                )
+        except LLMBackendError as e:
+            logger.warning(f"Serving raw feature entry for {feature}: {str(e)}")
+            return {
+                "explanation": kb_fallback("feature", feature.lower(), feature_data),
+                "feature": feature,
+                "fallback": True
+            }, 200
+
+        return {
+            "explanation": explanation,
+            "feature": feature
+        }, 200
+
+    except AdmissionRejected as e:
+        return too_many_requests(e)
+
+    except Exception as e:
+        logger.error(f"Error in feature_info: {str(e)}")
+        return {"error": str(e)}, 500
+
+
+# -------------------------------------------------------------------------
+# Registration Guidance
+# -------------------------------------------------------------------------
+@json_object_body
+async def registration_guidance(data: dict) -> HandlerResult:
+    try:
+        step = data.get("step", 1)
+        user_id = data.get("user_id")
+
+        if step < 1 or step > 4:
+            return {"error": "Step must be 1–4"}, 400
+
+        get_admission().admit(user_id)
+
+        step_data = ProgressBrainKnowledgeBase.get_registration_step(step)
+
+        if not step_data:
+            return {"error": f"Step {step} not found"}, 404
+
+        try:
+            with request_deadline(data.get("timeout_ms")):
+                guidance = await get_response_cache().get(
+                    "registration",
+                    str(step),
+                    content_version(step_data),
+                    lambda: registration_guidance_prompt(step, step_data)
+                )
+        except LLMBackendError as e:
+            logger.warning(f"Serving raw registration step {step}: {str(e)}")
+            return {
+                "guidance": kb_fallback("registration", f"step_{step}", step_data),
+                "step": step,
+                "fallback": True
+            }, 200
+
+        return {"guidance": guidance, "step": step}, 200
+
+    except AdmissionRejected as e:
+        return too_many_requests(e)
+
+    except Exception as e:
+        logger.error(f"Error in registration_guidance: {str(e)}")
+        return {"error": str(e)}, 500
+
+
+# -------------------------------------------------------------------------
+# Study Help
+# -------------------------------------------------------------------------
+@json_object_body
+async def study_help(data: dict) -> HandlerResult:
+    try:
+        subject = data.get("subject")
+        topic = data.get("topic")
+        question = data.get("question")
+        user_id = data.get("user_id")
+
+        if not all([subject, topic, question]):
+            return {"error": "subject, topic, and question are required"}, 400
+
+        get_admission().admit(user_id)
+
+        await load_user_session(user_id)
+        user_ctx = get_user_context(user_id)
+
+        # Repeated and near-duplicate questions are answered locally
+        answer_cache = get_answer_cache()
+        cached = answer_cache.lookup(subject, topic, question)
+
+        if cached is not None:
+            help_text = cached.answer
+        else:
+            study_prompt = f"""
+Help a student understand a concept clearly.
+
+Subject: {subject}
+Topic: {topic}
+Question: {question}
+
+Use simple explanation, examples, analogies, and encouragement.
+Keep it conversational and friendly.
+"""
+
+            with request_deadline(data.get("timeout_ms")):
+                help_text = await get_chatbot_service().generate_content(study_prompt)
+            answer_cache.store(subject, topic, question, help_text)
+
+        # Save memory
+        user_ctx.memory.add_exchange(
+            question,
+            help_text,
+            {"subject": subject, "topic": topic}
+        )
+        save_user_state(user_id)
+
+        return {
+            "help": help_text,
+            "subject": subject,
+            "topic": topic,
+            "cached": cached is not None
+        }, 200
+
+    except AdmissionRejected as e:
+        return too_many_requests(e)
+
+    except LLMBackendError as e:
+        logger.error(f"Error in study_help: {str(e)}")
+        return upstream_failure(e)
+
+    except Exception as e:
+        logger.error(f"Error in study_help: {str(e)}")
+        return {"error": str(e)}, 500
+
+
+# -------------------------------------------------------------------------
+# Motivation Message
+# -------------------------------------------------------------------------
+@json_object_body
+async def motivation(data: dict) -> HandlerResult:
+    try:
+        user_name = data.get("user_name", "Friend")
+        streak = data.get("streak", 0)
+        user_id = data.get("user_id")
+
+        get_admission().admit(user_id)
+
+        # Served from the pre-generated pool; the LLM is only called when
+        # the streak's pool is empty
+        try:
+            with request_deadline(data.get("timeout_ms")):
+                message, _ = await get_motivation_pool().message(user_name, streak)
+        except LLMBackendError as e:
+            logger.warning(f"Serving default motivation message: {str(e)}")
+            name = f", {user_name}" if user_name and user_name != "Friend" else ""
+            return {"message": f"Keep going{name}! You're doing great! 💪✨", "fallback": True}, 200
+
+        return {"message": message}, 200
+
+    except AdmissionRejected as e:
+        return too_many_requests(e)
+
+    except Exception as e:
+        logger.error(f"Error in motivation: {str(e)}")
+        return {"error": str(e)}, 500
+
+
+# -------------------------------------------------------------------------
+# Static Knowledge-Base Content (FAQ, features, registration flow)
+# -------------------------------------------------------------------------
+async def get_faq(data: Optional[dict] = None) -> HandlerResult:
+    return get_static_content("faq"), 200
+
+
+async def get_features(data: Optional[dict] = None) -> HandlerResult:
+    return get_static_content("features"), 200
+
+
+async def get_registration_flow(data: Optional[dict] = None) -> HandlerResult:
+    return get_static_content("registration_flow"), 200
+
+
+# -------------------------------------------------------------------------
+# Clear Context
+# -------------------------------------------------------------------------
+@json_object_body
+async def clear_context(data: dict) -> HandlerResult:
+    try:
+        user_id = data.get("user_id")
+
+        if user_id in user_sessions:
+            get_chatbot_service().clear_session(user_id)
+            user_sessions.pop(user_id)
+
+        if persistence is not None and user_id:
+            persistence.delete(user_id)
+
+        return {"message": "Context cleared successfully"}, 200
+
+    except Exception as e:
+        logger.error(f"Error in clear_context: {str(e)}")
+        return {"error": str(e)}, 500
+
+
+# -------------------------------------------------------------------------
+# Batch Operations
+# -------------------------------------------------------------------------
+BATCH_MAX_OPERATIONS = int(os.getenv("CHATBOT_BATCH_MAX_OPERATIONS", 50))
+BATCH_CONCURRENCY = int(os.getenv("CHATBOT_BATCH_CONCURRENCY", 8))
+
+
+@json_object_body
+async def batch(data: dict) -> HandlerResult:
+    """Run several operations in one request.
+
+    Operations run concurrently under a concurrency cap, except that
+    operations for the same user run one after another in request order, so
+    a user's chat turns see each other. A top-level ``user_id`` applies to
+    every operation that does not set its own. Each item gets its own
+    status and result or error; the batch itself answers 200.
+    """
+    try:
+        operations = data.get("operations")
+        if not isinstance(operations, list) or not operations:
+            return {"error": "operations must be a non-empty list"}, 400
+        if len(operations) > BATCH_MAX_OPERATIONS:
+            return {"error": f"At most {BATCH_MAX_OPERATIONS} operations per batch"}, 400
+
+        concurrency = data.get("concurrency")
+        if concurrency is None:
+            concurrency = BATCH_CONCURRENCY
+        if isinstance(concurrency, bool) or not isinstance(concurrency, int):
+            return {"error": "concurrency must be an integer"}, 400
+        concurrency = max(1, min(concurrency, BATCH_CONCURRENCY))
+        semaphore = asyncio.Semaphore(concurrency)
+        results: List[Optional[Dict]] = [None] * len(operations)
+
+        # (id, op, handler data) per item; a top-level user_id is inherited,
+        # and data that is not an object is kept as None for a per-item 400
+        items = []
+        for index, operation in enumerate(operations):
+            operation = operation if isinstance(operation, dict) else {}
+            item_data = operation.get("data") or {}
+            if isinstance(item_data, dict):
+                item_data = dict(item_data)
+                if data.get("user_id") and not item_data.get("user_id"):
+                    item_data["user_id"] = data["user_id"]
+            else:
+                item_data = None
+            items.append((operation.get("id", index), operation.get("op"), item_data))
+
+        async def run(index: int):
+            item_id, op, item_data = items[index]
+            handler = BATCH_OPERATIONS.get(op)
+            if handler is None:
+                results[index] = {"id": item_id, "op": op, "status": 400, "error": f"Unknown operation: {op}"}
+                return
+            if item_data is None:
+                results[index] = {"id": item_id, "op": op, "status": 400, "error": "data must be a JSON object"}
+                return
+
+            async with semaphore:
+                try:
+                    payload, status, _ = split_result(await handler(item_data))
+                except Exception as e:
+                    logger.error(f"Error in batch operation {op}: {str(e)}")
+                    payload, status = {"error": str(e)}, 500
+
+            item = {"id": item_id, "op": op, "status": status}
+            if status >= 400:
+                item["error"] = payload.get("error", "Request failed")
+                if "retry_after" in payload:
+                    item["retry_after"] = payload["retry_after"]
+            else:
+                item["result"] = payload
+            results[index] = item
+
+        # One sequential chain per user; operations without a user run alone
+        chains: Dict[str, List[int]] = {}
+        for index, (_, _, item_data) in enumerate(items):
+            chains.setdefault((item_data or {}).get("user_id") or f"#{index}", []).append(index)
+
+        async def run_chain(indexes: List[int]):
+            for index in indexes:
+                await run(index)
+
+        # The batch deadline bounds every operation (each may set a shorter one)
+        with request_deadline(data.get("timeout_ms")):
+            await asyncio.gather(*(run_chain(indexes) for indexes in chains.values()))
+
+        return {
+            "results": results,
+            "succeeded": sum(1 for item in results if item["status"] < 400),
+            "failed": sum(1 for item in results if item["status"] >= 400)
+        }, 200
+
+    except Exception as e:
+        logger.error(f"Error in batch: {str(e)}")
+        return {"error": str(e)}, 500
+
+
+# -------------------------------------------------------------------------
+# Worker Handoff (multi-worker mode, called by the dispatcher only)
+# -------------------------------------------------------------------------
+# Secret the multi-worker dispatcher hands to the workers it spawns; without
+# it (e.g. plain `uvicorn asgi:app`) the internal routes are not registered
+WORKER_SECRET = os.getenv("CHATBOT_WORKER_SECRET", "")
+WORKER_SECRET_HEADER = "X-Worker-Secret"
+
+
+def is_loopback(host: Optional[str]) -> bool:
+    try:
+        return ipaddress.ip_address(host or "").is_loopback
+    except ValueError:
+        return False
+
+
+def internal_request_allowed(secret: Optional[str], client_host: Optional[str]) -> bool:
+    """Whether a request may use an internal route: the dispatcher's secret, from loopback."""
+    return (
+        bool(WORKER_SECRET)
+        and is_loopback(client_host)
+        and hmac.compare_digest((secret or "").encode(), WORKER_SECRET.encode())
+    )
+
+
+@json_object_body
+async def handoff_users(data: dict) -> HandlerResult:
+    """Persist and drop users that now belong to another worker.
+
+    Returns once their state is on disk, so the new owner loads it fresh.
+    """
+    try:
+        if persistence is None:
+            return {"error": "Handoff requires a conversation store"}, 409
+
+        released = 0
+        for user_id in data.get("user_ids", []):
+            session = user_sessions.pop(user_id)
+            if session is not None:
+                persistence.save(session)
+                released += 1
+
+        await asyncio.get_running_loop().run_in_executor(None, persistence.flush)
+        return {"released": released}, 200
+
+    except Exception as e:
+        logger.error(f"Error in handoff_users: {str(e)}")
+        return {"error": str(e)}, 500
+
+
+# -------------------------------------------------------------------------
+# Route Table
+# -------------------------------------------------------------------------
+ROUTES = {
+    ("GET", "/health"): health,
+    ("GET", "/livez"): liveness,
+    ("GET", "/readyz"): readiness,
+    ("GET", "/metrics"): metrics_text,
+    ("POST", "/chat/generate"): generate_response,
+    ("POST", "/chat/generate/stream"): generate_response_stream,
+    ("POST", "/chat/feature-info"): feature_info,
+    ("POST", "/chat/registration-guidance"): registration_guidance,
+    ("POST", "/chat/study-help"): study_help,
+    ("POST", "/chat/motivation"): motivation,
+    ("GET", "/chat/faq"): get_faq,
+    ("GET", "/chat/features"): get_features,
+    ("GET", "/chat/registration-flow"): get_registration_flow,
+    ("POST", "/chat/clear"): clear_context,
+    ("POST", "/chat/batch"): batch,
+}
+
+# Dispatcher-only routes, served by workers spawned by multiworker.py
+INTERNAL_ROUTES = {
+    ("POST", "/internal/handoff"): handoff_users,
+}
+if WORKER_SECRET:
+    ROUTES.update(INTERNAL_ROUTES)
+
+# Operations accepted by /chat/batch (non-streaming handlers only)
+BATCH_OPERATIONS = {
+    "generate": generate_response,
+    "feature-info": feature_info,
+    "registration-guidance": registration_guidance,
+    "study-help": study_help,
+    "motivation": motivation,
+}
@@ -0,0 +1,205 @@
+import re
+import math
+import heapq
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Words too common to carry meaning in a help-desk question
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been before being but by
+can could did do does doing for from get got had has have having he her here
+how i if in into is it its just me might more most my no not of on or our
+out please should so some than that the their them then there these they
+this those to too up us very was we were what when where which while who why
+will with would you your
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed and plurals folded."""
+    tokens = []
+    for word in _TOKEN_RE.findall((text or "").lower()):
+        if word in STOPWORDS:
+            continue
+        # Light plural folding so "streaks" matches "streak"
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+# ─────────────────────────────────────────────────────────────
+# INDEXED DOCUMENTS
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class IndexedDocument:
+    doc_id: str          # "<kind>:<key>", e.g. "faq:q_streak_rules"
+    kind: str            # "faq", "feature" or "registration"
+    key: str
+    data: Dict
+    length: int
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    key: str
+    score: float
+    data: Dict
+    matched: int = 0     # distinct query terms found in the entry
+    terms: int = 0       # distinct (non-stopword) terms in the query
+
+    @property
+    def coverage(self) -> float:
+        return self.matched / self.terms if self.terms else 0.0
+
+
+# ─────────────────────────────────────────────────────────────
+# BM25 INVERTED INDEX
+# ─────────────────────────────────────────────────────────────
+
+class KnowledgeIndex:
+    """BM25-ranked inverted index over knowledge-base entries.
+
+    Each term maps to a postings dict of ``doc_id -> term frequency``, so a
+    search only visits documents that share a (non-stopword) term with the
+    query instead of scanning the whole knowledge base. Documents can be
+    added or replaced one at a time; only their own postings and the corpus
+    length totals are updated.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+        self._docs: Dict[str, IndexedDocument] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # ─────────────────────────────────────────────────────────────
+    # INDEXING
+    # ─────────────────────────────────────────────────────────────
+
+    def add(self, kind: str, key: str, text: str, data: Dict):
+        """Index (or re-index) one entry."""
+        doc_id = f"{kind}:{key}"
+        terms: Dict[str, int] = {}
+        for token in tokenize(text):
+            terms[token] = terms.get(token, 0) + 1
+        length = sum(terms.values())
+
+        with self._lock:
+            if doc_id in self._docs:
+                self._remove(doc_id)
+
+            self._docs[doc_id] = IndexedDocument(doc_id, kind, key, data, length)
+            self._doc_terms[doc_id] = terms
+            self._total_length += length
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, kind: str, key: str) -> bool:
+        with self._lock:
+            doc_id = f"{kind}:{key}"
+            if doc_id not in self._docs:
+                return False
+            self._remove(doc_id)
+            return True
+
+    def _remove(self, doc_id: str):
+        document = self._docs.pop(doc_id)
+        self._total_length -= document.length
+        for term in self._doc_terms.pop(doc_id):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+
+    # ─────────────────────────────────────────────────────────────
+    # SEARCH
+    # ─────────────────────────────────────────────────────────────
+
+    def search(self, query: str, k: int = 5, kinds: Optional[Iterable[str]] = None) -> List[SearchHit]:
+        """Return up to ``k`` entries ranked by BM25 score (best first)."""
+        terms = set(tokenize(query))
+        if not terms or k <= 0:
+            return []
+
+        allowed = set(kinds) if kinds else None
+
+        with self._lock:
+            count = len(self._docs)
+            if not count:
+                return []
+            avg_length = self._total_length / count or 1.0
+
+            scores: Dict[str, float] = {}
+            matched: Dict[str, int] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    document = self._docs[doc_id]
+                    if allowed is not None and document.kind not in allowed:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * document.length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                    matched[doc_id] = matched.get(doc_id, 0) + 1
+
+            best: List[Tuple[str, float]] = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            hits = []
+            for doc_id, score in best:
+                document = self._docs[doc_id]
+                hits.append(SearchHit(
+                    document.kind, document.key, round(score, 4), document.data,
+                    matched=matched[doc_id], terms=len(terms)
+                ))
+            return hits
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"documents": len(self._docs), "terms": len(self._postings)}
+
+
+# ─────────────────────────────────────────────────────────────
+# KNOWLEDGE-BASE ENTRY TEXT
+# ─────────────────────────────────────────────────────────────
+
+def faq_text(entry: Dict) -> str:
+    return f"{entry.get('q', '')} {entry.get('a', '')}"
+
+
+def feature_text(name: str, entry: Dict) -> str:
+    return " ".join([
+        name.replace("_", " "),
+        entry.get("description", ""),
+        entry.get("how_to", ""),
+        " ".join(entry.get("benefits", [])),
+        " ".join(entry.get("tips", [])),
+    ])
+
+
+def registration_text(entry: Dict) -> str:
+    return " ".join([
+        entry.get("title", ""),
+        entry.get("description", ""),
+        " ".join(entry.get("fields", [])),
+        entry.get("action", ""),
+        " ".join(entry.get("tips", [])),
+    ])
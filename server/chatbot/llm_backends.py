@@ -0,0 +1,360 @@
+import os
+import math
+import random
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Union
+
+from prompt_builder import estimate_tokens
+logger = logging.getLogger(__name__)
+
+
+class LLMBackendError(Exception):
+    """Raised by a backend when the upstream model call fails."""
+
+    def __init__(self, status: int, message: str, provider: str = "LLM backend"):
+        super().__init__(f"{provider} error {status}: {message}")
+        self.status = status
+
+
+def user_content(text: str) -> Dict:
+    return {"role": "user", "parts": [{"text": text}]}
+
+
+def model_content(text: str) -> Dict:
+    return {"role": "model", "parts": [{"text": text}]}
+
+
+def system_instruction(*parts: Union[str, Dict]) -> Dict:
+    """System instruction from text or prebuilt ``{"text"}`` parts, in order.
+
+    A shared prefix should come first as one prebuilt part, so every request
+    carrying it serializes identical leading bytes.
+    """
+    return {"parts": [part if isinstance(part, dict) else {"text": part} for part in parts if part]}
+
+
+def content_chars(contents: List[Dict], instruction: Optional[Dict] = None) -> int:
+    """Characters of text in a request, system instruction included."""
+    chars = sum(len(part.get("text", "")) for content in contents for part in content["parts"])
+    if instruction:
+        chars += sum(len(part.get("text", "")) for part in instruction["parts"])
+    return chars
+
+
+# ─────────────────────────────────────────────────────────────
+# BACKEND INTERFACE
+# ─────────────────────────────────────────────────────────────
+
+class LLMBackend:
+    """What ChatbotService needs from a model provider.
+
+    Backends implement ``complete`` and ``stream`` over Gemini-style
+    ``contents`` (a list of ``{"role", "parts": [{"text"}]}`` turns) and an
+    optional ``system_instruction`` (``{"parts": [...]}``) sent outside the
+    turns; chat sessions, one-shot and streaming generation are built on
+    those two.
+    """
+
+    name = "base"
+
+    def __init__(self, model_name: str, generation_config: Optional[Dict[str, Any]] = None):
+        self.model_name = model_name
+        self.generation_config = dict(generation_config or {})
+
+    async def complete(self, contents: List[Dict], system_instruction: Optional[Dict] = None) -> str:
+        raise NotImplementedError
+
+    def stream(self, contents: List[Dict], system_instruction: Optional[Dict] = None) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    async def generate_content(self, prompt: str) -> str:
+        """One-shot generation for a single user prompt."""
+        return await self.complete([user_content(prompt)])
+
+    def generate_content_stream(self, prompt: str) -> AsyncIterator[str]:
+        return self.stream([user_content(prompt)])
+
+    def start_chat(self, history: Optional[List[Dict]] = None) -> "ChatSession":
+        """Create a multi-turn chat session seeded with optional history."""
+        return ChatSession(self, history)
+
+
+# ─────────────────────────────────────────────────────────────
+# CHAT SESSION
+# ─────────────────────────────────────────────────────────────
+
+class ChatSession:
+    """Client-side chat history replayed to a stateless backend per turn.
+
+    ``system_instruction`` goes with every turn but is not part of the
+    history: the owner sets it before sending, so it always reflects the
+    current prompt rather than the one the session started with.
+    """
+
+    def __init__(self, backend: LLMBackend, history: Optional[List[Dict]] = None):
+        self.backend = backend
+        self.history: List[Dict] = list(history or [])
+        self.system_instruction: Optional[Dict] = None
+
+    def estimate_size(self) -> int:
+        """Approximate bytes held by the replayed history."""
+        return sum(
+            len(part.get("text", "")) + 128
+            for content in self.history
+            for part in content["parts"]
+        )
+
+    def snapshot(self) -> List[Dict]:
+        """Copy of the history; restore with ``LLMBackend.start_chat(history)``."""
+        return list(self.history)
+
+    async def send_message(self, message: str) -> str:
+        contents = self.history + [user_content(message)]
+        text = await self.backend.complete(contents, self.system_instruction)
+
+        # Only commit the turn once the upstream call has succeeded
+        self.history = contents + [model_content(text)]
+        return text
+
+    async def send_message_stream(self, message: str) -> AsyncIterator[str]:
+        """Stream the reply chunk by chunk; the turn is committed when the stream completes."""
+        contents = self.history + [user_content(message)]
+        chunks: List[str] = []
+
+        async for chunk in self.backend.stream(contents, self.system_instruction):
+            chunks.append(chunk)
+            yield chunk
+
+        self.history = contents + [model_content("".join(chunks))]
+
+
+# ─────────────────────────────────────────────────────────────
+# DETERMINISTIC LOCAL FAKE
+# ─────────────────────────────────────────────────────────────
+
+_FAKE_WORDS = (
+    "focus study review practice streak session goal progress plan notes "
+    "recall break habit consistency insight topic example summary"
+).split()
+
+
+class FakeLLMBackend(LLMBackend):
+    """Offline backend with a configurable, reproducible performance profile.
+
+    - latency: time to first token, drawn from ``latency_dist`` ("fixed",
+      "uniform", "normal" or "lognormal") around ``latency_ms`` with spread
+      ``latency_jitter_ms``
+    - token rate: output tokens per second after the first token
+    - throughput: at most ``max_concurrency`` calls in progress (0 = no limit);
+      further calls queue, like a rate-limited upstream
+    - errors: each call fails with ``error_status`` with probability ``error_rate``
+    - prompt caching: the first system-instruction part counts as cached input
+      once it has been seen, like a provider's implicit prefix cache
+
+    Replies are derived from a hash of the request, and latencies and
+    injected errors come from a seeded RNG, so a run is reproducible.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        model_name: str = "fake-model",
+        generation_config: Optional[Dict[str, Any]] = None,
+        latency_ms: float = 200.0,
+        latency_jitter_ms: float = 50.0,
+        latency_dist: str = "normal",
+        tokens_per_second: float = 50.0,
+        response_tokens: int = 60,
+        max_concurrency: int = 0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        seed: int = 42,
+        record_calls: int = 100,
+    ):
+        super().__init__(model_name, generation_config)
+        if latency_dist not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {latency_dist}")
+
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.latency_dist = latency_dist
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.max_concurrency = max_concurrency
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+        self._rng = random.Random(seed)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+
+        # Most recent request contents and system instructions, for tests and benchmarks
+        self.calls: Deque[List[Dict]] = deque(maxlen=record_calls)
+        self.instructions: Deque[Optional[Dict]] = deque(maxlen=record_calls)
+        self.total_calls = 0
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+        self._cached_prefixes: Set[str] = set()
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    # ─────────────────────────────────────────────────────────────
+    # PERFORMANCE PROFILE
+    # ─────────────────────────────────────────────────────────────
+
+    def _latency(self) -> float:
+        """Time to first token in seconds."""
+        mean, spread = self.latency_ms, self.latency_jitter_ms
+        if self.latency_dist == "fixed" or spread <= 0:
+            value = mean
+        elif self.latency_dist == "uniform":
+            value = self._rng.uniform(mean - spread, mean + spread)
+        elif self.latency_dist == "normal":
+            value = self._rng.gauss(mean, spread)
+        else:
+            # Log-normal with the given mean and standard deviation
+            sigma2 = math.log(1 + (spread / mean) ** 2) if mean > 0 else 0.0
+            value = self._rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2)) if mean > 0 else 0.0
+        return max(value, 0.0) / 1000
+
+    def _slot(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def reply_for(self, contents: List[Dict]) -> List[str]:
+        """Deterministic reply tokens for a request."""
+        text = "".join(part.get("text", "") for content in contents for part in content["parts"])
+        digest = hashlib.sha1(text.encode("utf-8")).digest()
+        rng = random.Random(digest)
+        words = [rng.choice(_FAKE_WORDS) for _ in range(self.response_tokens)]
+        words[0] = words[0].capitalize()
+        return [word + (" " if i < len(words) - 1 else ".") for i, word in enumerate(words)]
+
+    def _count_input(self, contents: List[Dict], system_instruction: Optional[Dict]):
+        self.input_tokens += sum(
+            estimate_tokens(part.get("text", "")) for content in contents for part in content["parts"]
+        )
+        if not system_instruction:
+            return
+
+        parts = system_instruction["parts"]
+        self.input_tokens += sum(estimate_tokens(part.get("text", "")) for part in parts)
+        prefix = parts[0].get("text", "")
+        key = hashlib.sha1(prefix.encode("utf-8")).hexdigest()
+        if key in self._cached_prefixes:
+            self.cached_input_tokens += estimate_tokens(prefix)
+        else:
+            self._cached_prefixes.add(key)
+
+    async def _begin(self, contents: List[Dict], system_instruction: Optional[Dict] = None):
+        self.calls.append(contents)
+        self.instructions.append(system_instruction)
+        self._count_input(contents, system_instruction)
+        self.total_calls += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+        await asyncio.sleep(self._latency())
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.errors += 1
+            raise LLMBackendError(self.error_status, "Injected failure from fake backend")
+
+    # ─────────────────────────────────────────────────────────────
+    # BACKEND INTERFACE
+    # ─────────────────────────────────────────────────────────────
+
+    async def complete(self, contents: List[Dict], system_instruction: Optional[Dict] = None) -> str:
+        if self.max_concurrency:
+            async with self._slot():
+                return await self._complete(contents, system_instruction)
+        return await self._complete(contents, system_instruction)
+
+    async def _complete(self, contents: List[Dict], system_instruction: Optional[Dict]) -> str:
+        try:
+            await self._begin(contents, system_instruction)
+            tokens = self.reply_for(contents)
+            if self.tokens_per_second > 0:
+                await asyncio.sleep(len(tokens) / self.tokens_per_second)
+            return "".join(tokens)
+        finally:
+            self.in_flight -= 1
+
+    async def stream(self, contents: List[Dict], system_instruction: Optional[Dict] = None) -> AsyncIterator[str]:
+        if self.max_concurrency:
+            async with self._slot():
+                async for chunk in self._stream(contents, system_instruction):
+                    yield chunk
+        else:
+            async for chunk in self._stream(contents, system_instruction):
+                yield chunk
+
+    async def _stream(
+        self, contents: List[Dict], system_instruction: Optional[Dict], tokens_per_chunk: int = 5
+    ) -> AsyncIterator[str]:
+        try:
+            await self._begin(contents, system_instruction)
+            tokens = self.reply_for(contents)
+            for start in range(0, len(tokens), tokens_per_chunk):
+                chunk = tokens[start:start + tokens_per_chunk]
+                if self.tokens_per_second > 0:
+                    await asyncio.sleep(len(chunk) / self.tokens_per_second)
+                yield "".join(chunk)
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.total_calls,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "input_tokens": self.input_tokens,
+            "cached_input_tokens": self.cached_input_tokens,
+        }
+
+
+# ─────────────────────────────────────────────────────────────
+# BACKEND FACTORY
+# ─────────────────────────────────────────────────────────────
+
+def create_backend(name: Optional[str] = None, **options) -> LLMBackend:
+    """Build the backend selected by ``name`` or CHATBOT_LLM_BACKEND ("gemini" or "fake")."""
+
+    name = (name or os.getenv("CHATBOT_LLM_BACKEND", "gemini")).lower()
+
+    if name == "fake":
+        settings = {
+            "latency_ms": float(os.getenv("CHATBOT_FAKE_LATENCY_MS", 200)),
+            "latency_jitter_ms": float(os.getenv("CHATBOT_FAKE_LATENCY_JITTER_MS", 50)),
+            "latency_dist": os.getenv("CHATBOT_FAKE_LATENCY_DIST", "normal"),
+            "tokens_per_second": float(os.getenv("CHATBOT_FAKE_TOKENS_PER_SEC", 50)),
+            "response_tokens": int(os.getenv("CHATBOT_FAKE_RESPONSE_TOKENS", 60)),
+            "max_concurrency": int(os.getenv("CHATBOT_FAKE_MAX_CONCURRENCY", 0)),
+            "error_rate": float(os.getenv("CHATBOT_FAKE_ERROR_RATE", 0)),
+            "seed": int(os.getenv("CHATBOT_FAKE_SEED", 42)),
+        }
+        settings.update(options)
+        logger.info(f"Using fake LLM backend ({settings})")
+        return FakeLLMBackend(**settings)
+
+    if name == "gemini":
+        # Imported here so the fake backend runs without aiohttp installed
+        from gemini_client import GeminiClient
+
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables")
+        return GeminiClient(api_key=api_key, **options)
+
+    raise ValueError(f"Unknown CHATBOT_LLM_BACKEND: {name}")
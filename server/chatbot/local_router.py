@@ -0,0 +1,170 @@
+import os
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from chatbot_context import ProgressBrainKnowledgeBase
+from kb_index import SearchHit
+from topic_classifier import DEFAULT_TOPIC, get_topic_classifier
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────────────────────
+# LOCAL ANSWER TEXT
+# ─────────────────────────────────────────────────────────────
+
+def render_hit(hit: SearchHit) -> str:
+    """Plain-text answer for a knowledge-base entry (newlines become <br>)."""
+    data = hit.data
+
+    if hit.kind == "faq":
+        return data["a"]
+
+    if hit.kind == "feature":
+        lines = [f"✨ {hit.key.replace('_', ' ').title()}: {data.get('description', '')}"]
+        if data.get("how_to"):
+            lines.append(f"• How to use: {data['how_to']}")
+        if data.get("benefits"):
+            lines.append(f"• Benefits: {', '.join(data['benefits'])}")
+        if data.get("tips"):
+            lines.append(f"💡 Tips: {', '.join(data['tips'])}")
+        return "\n".join(lines)
+
+    step = hit.key.split("_")[-1]
+    lines = [f"📝 Step {step} – {data.get('title', '')}: {data.get('description', '')}"]
+    if data.get("fields"):
+        lines.append(f"• Fields: {', '.join(data['fields'])}")
+    if data.get("action"):
+        lines.append(f"• Next: {data['action']}")
+    if data.get("tips"):
+        lines.append(f"💡 Tips: {', '.join(data['tips'])}")
+    return "\n".join(lines)
+
+
+def hit_topic(hit: SearchHit) -> str:
+    """Topic an entry belongs to, comparable with ConversationMemory.extract_topic."""
+    if hit.kind == "registration":
+        return "registration"
+    if hit.kind == "feature":
+        return hit.key
+    return get_topic_classifier().classify(hit.data.get("q", ""))
+
+
+# ─────────────────────────────────────────────────────────────
+# PRE-LLM ROUTER
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class LocalAnswer:
+    text: str
+    hit: SearchHit
+    confidence: float
+
+
+class LocalRouter:
+    """Answers high-confidence knowledge-base questions without an LLM call.
+
+    A message is served locally when its best knowledge-base match covers
+    at least ``threshold`` of the message's non-stopword terms, the message
+    has at least ``min_terms`` such terms, and the match does not contradict
+    the message's detected topic. Everything else goes to Gemini. Set the
+    threshold above 1 to disable local answers.
+
+    When Gemini is unavailable, ``fallback`` applies the looser
+    ``fallback_threshold`` instead, since a close knowledge-base answer beats
+    an error.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        min_terms: Optional[int] = None,
+        fallback_threshold: Optional[float] = None
+    ):
+        self.threshold = threshold if threshold is not None else float(
+            os.getenv("CHATBOT_LOCAL_ROUTE_THRESHOLD", 0.75)
+        )
+        self.min_terms = min_terms if min_terms is not None else int(
+            os.getenv("CHATBOT_LOCAL_ROUTE_MIN_TERMS", 2)
+        )
+        self.fallback_threshold = fallback_threshold if fallback_threshold is not None else float(
+            os.getenv("CHATBOT_FALLBACK_THRESHOLD", 0.5)
+        )
+
+        self._lock = threading.Lock()
+        self.total = 0
+        self.local = 0
+        self.fallbacks = 0
+
+    def route(self, user_message: str, topic: str = DEFAULT_TOPIC) -> Optional[LocalAnswer]:
+        answer = self._match(user_message, topic, self.threshold)
+
+        with self._lock:
+            self.total += 1
+            if answer is not None:
+                self.local += 1
+
+        if answer is not None:
+            logger.debug(
+                f"Answered locally from {answer.hit.kind}:{answer.hit.key} "
+                f"(confidence {answer.confidence:.2f})"
+            )
+        return answer
+
+    def fallback(self, user_message: str, topic: str = DEFAULT_TOPIC) -> Optional[LocalAnswer]:
+        """Best acceptable knowledge-base answer while the upstream is failing."""
+        answer = self._match(user_message, topic, self.fallback_threshold)
+
+        if answer is not None:
+            with self._lock:
+                self.fallbacks += 1
+            logger.info(f"Upstream fallback from {answer.hit.kind}:{answer.hit.key}")
+        return answer
+
+    def _match(self, user_message: str, topic: str, threshold: float) -> Optional[LocalAnswer]:
+        if threshold > 1:
+            return None
+
+        hits = ProgressBrainKnowledgeBase.search(user_message, k=1)
+        if not hits:
+            return None
+
+        hit = hits[0]
+        if hit.terms < self.min_terms or hit.coverage < threshold:
+            return None
+
+        entry_topic = hit_topic(hit)
+        if DEFAULT_TOPIC not in (topic, entry_topic) and topic != entry_topic:
+            return None
+
+        return LocalAnswer(render_hit(hit), hit, round(hit.coverage, 2))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "total": self.total,
+                "local": self.local,
+                "local_share": round(self.local / self.total, 4) if self.total else 0.0,
+                "fallbacks": self.fallbacks,
+                "threshold": self.threshold,
+            }
+
+
+# ─────────────────────────────────────────────────────────────
+# GLOBAL ROUTER ACCESSOR
+# ─────────────────────────────────────────────────────────────
+
+_local_router: Optional[LocalRouter] = None
+
+
+def get_local_router() -> LocalRouter:
+    """Return the process-wide LocalRouter (singleton pattern)."""
+
+    global _local_router
+
+    if _local_router is None:
+        _local_router = LocalRouter()
+
+    return _local_router
@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import uuid
+import queue
+import random
+import atexit
+import logging
+import contextvars
+import logging.handlers
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Optional
+
+# Correlates every log line of one request, across the Node proxy, the
+# multi-worker dispatcher and the worker that serves it
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_request_id: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+# ─────────────────────────────────────────────────────────────
+# REQUEST IDS
+# ─────────────────────────────────────────────────────────────
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def current_request_id() -> str:
+    return _request_id.get()
+
+
+def bind_request_id(request_id: Optional[str]) -> str:
+    """Tag log lines in the current context with ``request_id`` (a new one if empty)."""
+    request_id = (request_id or "").strip()[:128] or new_request_id()
+    _request_id.set(request_id)
+    return request_id
+
+
+async def run_with_request_id(request_id: str, awaitable: Awaitable):
+    """Await ``awaitable`` in a task-local context tagged with ``request_id``."""
+    _request_id.set(request_id)
+    return await awaitable
+
+
+async def stream_with_request_id(request_id: str, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Iterate ``stream`` with its log lines tagged with ``request_id``."""
+    _request_id.set(request_id)
+    async for item in stream:
+        yield item
+
+
+# ─────────────────────────────────────────────────────────────
+# FILTERS AND FORMATTERS
+# ─────────────────────────────────────────────────────────────
+
+class RequestContextFilter(logging.Filter):
+    """Stamps the request ID while the record is still on the request's thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a ``rate`` fraction of DEBUG records; INFO and above always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; ``extra`` fields become top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler over a bounded queue that drops records instead of blocking."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# ─────────────────────────────────────────────────────────────
+# CONFIGURATION
+# ─────────────────────────────────────────────────────────────
+
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging():
+    """Route all logging through a queue drained by a background thread.
+
+    Request threads and the event loop only format the message and enqueue
+    it; the write to stderr happens on the listener thread. Idempotent.
+
+    - CHATBOT_LOG_LEVEL: root level (default INFO)
+    - CHATBOT_LOG_FORMAT: "json" (default) or "text"
+    - CHATBOT_LOG_DEBUG_SAMPLE_RATE: share of DEBUG records kept (default 0.01)
+    - CHATBOT_LOG_QUEUE_SIZE: records buffered before new ones are dropped (default 10000)
+    """
+
+    global _queue_handler, _listener
+
+    if _queue_handler is not None:
+        return
+
+    output = logging.StreamHandler(sys.stderr)
+    if os.getenv("CHATBOT_LOG_FORMAT", "json").lower() == "text":
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    else:
+        output.setFormatter(JsonFormatter())
+
+    _queue_handler = NonBlockingQueueHandler(queue.Queue(int(os.getenv("CHATBOT_LOG_QUEUE_SIZE", 10000))))
+    _queue_handler.addFilter(RequestContextFilter())
+    _queue_handler.addFilter(SamplingFilter(float(os.getenv("CHATBOT_LOG_DEBUG_SAMPLE_RATE", 0.01))))
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(os.getenv("CHATBOT_LOG_LEVEL", "INFO").upper())
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def dropped_log_records() -> int:
+    return _queue_handler.dropped if _queue_handler is not None else 0
@@ -0,0 +1,312 @@
+import math
+import bisect
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers local answers (sub-millisecond) through slow LLM replies
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Characters; prompts with replayed history reach tens of thousands
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144)
+
+# Estimated tokens; a chat turn's input stays within its prompt budget
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# ─────────────────────────────────────────────────────────────
+# METRIC TYPES
+# ─────────────────────────────────────────────────────────────
+
+class Metric:
+    """A named metric family; ``labels(...)`` returns the child to record on."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # label values (as strings) -> child; _lookup also caches the raw
+        # values callers pass (e.g. an int status), so a hit skips the str()
+        self._children: Dict[LabelValues, object] = {}
+        self._lookup: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> object:
+        """Child for these label values; cached, so hot paths pay one dict lookup."""
+        child = self._lookup.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(tuple(str(v) for v in values), self._new_child())
+                self._lookup[values] = child
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _sorted_children(self) -> List[Tuple[LabelValues, object]]:
+        with self._lock:
+            return sorted(self._children.items(), key=lambda item: item[0])
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in self._sorted_children()
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(Metric):
+    """Fixed-bucket histogram; per-bucket counts are made cumulative on scrape."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, child in self._sorted_children():
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+CallbackResult = Union[float, Dict[LabelValues, float]]
+
+
+class CallbackMetric(Metric):
+    """Gauge or counter whose value is read from existing state at scrape time.
+
+    Used for numbers the service already tracks (session counts, queue
+    depth, cache hits), so exporting them adds nothing to the request path.
+    ``collect`` returns a value, or a dict of label values -> value.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], CallbackResult],
+        labelnames: Sequence[str] = (),
+        metric_type: str = "gauge",
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+        self.type = metric_type
+
+    def _samples(self) -> List[str]:
+        try:
+            result = self.collect()
+        except Exception as e:
+            logger.error(f"Metric {self.name} collection failed: {str(e)}")
+            return []
+
+        if result is None:
+            return []
+        if not isinstance(result, dict):
+            return [f"{self.name} {_format_value(result)}"]
+        return [
+            f"{self.name}{_labels(self.labelnames, values)} {_format_value(value)}"
+            for values, value in sorted(result.items())
+        ]
+
+
+# ─────────────────────────────────────────────────────────────
+# REGISTRY
+# ─────────────────────────────────────────────────────────────
+
+class MetricsRegistry:
+    """In-process metric registry rendered in the Prometheus text format.
+
+    Metric constructors are idempotent: asking twice for the same name
+    returns the existing metric, so modules can declare what they record
+    without coordinating import order.
+    """
+
+    def __init__(self, prefix: str = "chatbot_"):
+        self.prefix = prefix
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name: str, factory: Callable[[str], Metric]) -> Metric:
+        name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory(name)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(name, lambda full: Counter(full, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._register(name, lambda full: Histogram(full, documentation, labelnames, buckets))
+
+    def gauge_callback(
+        self, name: str, documentation: str, collect: Callable[[], CallbackResult], labelnames: Sequence[str] = ()
+    ) -> CallbackMetric:
+        return self._register(name, lambda full: CallbackMetric(full, documentation, collect, labelnames))
+
+    def counter_callback(
+        self, name: str, documentation: str, collect: Callable[[], CallbackResult], labelnames: Sequence[str] = ()
+    ) -> CallbackMetric:
+        return self._register(name, lambda full: CallbackMetric(full, documentation, collect, labelnames, "counter"))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# ─────────────────────────────────────────────────────────────
+# MULTI-PROCESS AGGREGATION
+# ─────────────────────────────────────────────────────────────
+
+def _add_label(sample: str, label: str) -> str:
+    name_end = min(i for i in (sample.find("{"), sample.find(" ")) if i >= 0)
+    if sample[name_end] == "{":
+        return f"{sample[:name_end + 1]}{label},{sample[name_end + 1:]}"
+    return f"{sample[:name_end]}{{{label}}}{sample[name_end:]}"
+
+
+def merge_expositions(texts: Dict[str, str], label_name: str = "worker") -> str:
+    """Merge per-process expositions into one, labelling samples with their source.
+
+    Each metric family keeps a single HELP/TYPE header followed by the
+    samples of every process, as the text format requires.
+    """
+    headers: Dict[str, List[str]] = {}
+    samples: Dict[str, List[str]] = {}
+
+    for source, text in texts.items():
+        label = f'{label_name}="{_escape(source)}"'
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                family = line.split(" ", 3)[2]
+                if family not in samples:
+                    samples[family] = []
+                    headers[family] = []
+                if len(headers[family]) < 2 and line not in headers[family]:
+                    headers[family].append(line)
+            elif line and not line.startswith("#") and family is not None:
+                samples[family].append(_add_label(line, label))
+
+    lines: List[str] = []
+    for family in samples:
+        lines.extend(headers[family])
+        lines.extend(samples[family])
+    return "\n".join(lines) + "\n"
+
+
+# ─────────────────────────────────────────────────────────────
+# GLOBAL REGISTRY ACCESSOR
+# ─────────────────────────────────────────────────────────────
+
+_metrics: Optional[MetricsRegistry] = None
+
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide MetricsRegistry (singleton pattern)."""
+
+    global _metrics
+
+    if _metrics is None:
+        _metrics = MetricsRegistry()
+
+    return _metrics
@@ -0,0 +1,257 @@
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+import contextvars
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from async_runtime import create_task_in
+from chatbot_service import get_chatbot_service
+
+logger = logging.getLogger(__name__)
+
+
+# Filled in at serve time, so one generated message serves every user
+NAME_PLACEHOLDER = "[NAME]"
+DAYS_PLACEHOLDER = "[DAYS]"
+
+# (bucket, lowest streak, description for the prompt); a bucket runs up to the next one
+STREAK_BUCKETS = (
+    ("0", 0, "they have not started a streak yet (just beginning)"),
+    ("1-2", 1, "they have just started a streak ([DAYS] days)"),
+    ("3-6", 3, "they are building a streak ([DAYS] days)"),
+    ("7-29", 7, "they have a strong streak of [DAYS] days"),
+    ("30+", 30, "they have an outstanding streak of [DAYS] days"),
+)
+
+_LIST_MARKER_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def streak_bucket(streak: int) -> str:
+    """Pool key for a streak count."""
+    bucket = STREAK_BUCKETS[0][0]
+    for name, lowest, _ in STREAK_BUCKETS:
+        if streak >= lowest:
+            bucket = name
+    return bucket
+
+
+# ─────────────────────────────────────────────────────────────
+# PROMPTS FOR MOTIVATIONAL MESSAGES
+# ─────────────────────────────────────────────────────────────
+
+def motivation_batch_prompt(bucket: str, count: int) -> str:
+    description = next(text for name, _, text in STREAK_BUCKETS if name == bucket)
+    return f"""
+Write {count} different short, positive motivational messages for a student using a study tracker.
+
+Their study streak: {description}.
+
+Make each one supportive, warm, and under 3 sentences, with 1-2 emojis.
+Write {NAME_PLACEHOLDER} where the student's name goes{f" and {DAYS_PLACEHOLDER} for the number of streak days" if bucket != "0" else ""}.
+Put one message per line, without numbering.
+"""
+
+
+def motivation_prompt(bucket: str) -> str:
+    """Single message, for a request that finds its pool empty."""
+    return motivation_batch_prompt(bucket, 1)
+
+
+def parse_messages(text: str) -> List[str]:
+    """Message templates from a generated reply, one per non-empty line."""
+    messages = []
+    for line in text.splitlines():
+        line = _LIST_MARKER_RE.sub("", line).strip()
+        if len(line) >= 10:
+            messages.append(line)
+    return messages
+
+
+def render(template: str, name: str, streak: int) -> str:
+    return template.replace(NAME_PLACEHOLDER, name).replace(DAYS_PLACEHOLDER, str(streak))
+
+
+# ─────────────────────────────────────────────────────────────
+# ROTATING MESSAGE POOL
+# ─────────────────────────────────────────────────────────────
+
+class MotivationPool:
+    """Pre-generated motivational messages, one rotating pool per streak bucket.
+
+    Messages are templates with the name and streak filled in per request,
+    so a pool serves every user of its bucket. Requests take the next
+    template round-robin; a template retires after ``max_uses`` serves or
+    ``ttl`` seconds, and a pool below half of ``size`` is topped up by
+    batched generations in the background. A refill that fails or brings
+    nothing new holds off for ``refill_backoff`` seconds. Only a request that
+    finds its pool empty waits for the LLM.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str], Awaitable[str]],
+        size: Optional[int] = None,
+        batch: Optional[int] = None,
+        max_uses: Optional[int] = None,
+        ttl: Optional[float] = None,
+        refill_backoff: Optional[float] = None,
+    ):
+        self.generate = generate
+        self.size = size or int(os.getenv("CHATBOT_MOTIVATION_POOL_SIZE", 20))
+        self.batch = batch or int(os.getenv("CHATBOT_MOTIVATION_BATCH", 10))
+        self.max_uses = max_uses or int(os.getenv("CHATBOT_MOTIVATION_MAX_USES", 50))
+        self.ttl = ttl or float(os.getenv("CHATBOT_MOTIVATION_TTL", 6 * 3600))
+        self.refill_backoff = refill_backoff or float(os.getenv("CHATBOT_MOTIVATION_REFILL_BACKOFF", 60))
+
+        # bucket -> [template, uses, generated_at] in serving order
+        self._pools: Dict[str, Deque[List]] = {name: deque() for name, _, _ in STREAK_BUCKETS}
+        self._refills: Dict[str, asyncio.Task] = {}
+        self._refill_after: Dict[str, float] = {}
+        self._rng = random.Random()
+
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.refill_failures = 0
+
+    # ─────────────────────────────────────────────────────────────
+    # SERVING
+    # ─────────────────────────────────────────────────────────────
+
+    def take(self, bucket: str) -> Optional[str]:
+        """Next template of a bucket's pool, or None when it is empty."""
+        pool = self._pools[bucket]
+        now = time.time()
+
+        while pool and now - pool[0][2] >= self.ttl:
+            pool.popleft()
+
+        template = None
+        if pool:
+            entry = pool.popleft()
+            entry[1] += 1
+            template = entry[0]
+            if entry[1] < self.max_uses:
+                pool.append(entry)
+
+        if len(pool) < self.size // 2:
+            self.schedule_refill(bucket)
+        return template
+
+    async def message(self, name: str, streak: int) -> Tuple[str, bool]:
+        """(message, served_from_pool) for a user.
+
+        An empty pool is answered with one live generation; concurrent
+        callers of the same bucket share it through the service's request
+        coalescing, and the template also joins the pool.
+        """
+        streak = max(streak, 0)
+        bucket = streak_bucket(streak)
+
+        template = self.take(bucket)
+        if template is not None:
+            self.hits += 1
+            return render(template, name, streak), True
+
+        self.misses += 1
+        text = await self.generate(motivation_prompt(bucket))
+        templates = parse_messages(text) or [text.strip()]
+        self._add(bucket, templates[:1])
+        return render(templates[0], name, streak), False
+
+    # ─────────────────────────────────────────────────────────────
+    # BACKGROUND REFILL
+    # ─────────────────────────────────────────────────────────────
+
+    def _add(self, bucket: str, templates: List[str]) -> int:
+        """Append new, distinct templates in random order; returns how many fit."""
+        pool = self._pools[bucket]
+        known = {entry[0] for entry in pool}
+        fresh = [template for template in dict.fromkeys(templates) if template not in known]
+        self._rng.shuffle(fresh)
+
+        now = time.time()
+        added = fresh[:max(self.size - len(pool), 0)]
+        for template in added:
+            pool.append([template, 0, now])
+        self.generated += len(added)
+        return len(added)
+
+    def schedule_refill(self, bucket: str) -> Optional[asyncio.Task]:
+        """Top up a bucket in the background (one refill per bucket at a time).
+
+        The task runs in a fresh context, without the deadline or request ID
+        of the request that noticed the low pool, which never waits for it.
+        """
+        task = self._refills.get(bucket)
+        if task is None:
+            if time.monotonic() < self._refill_after.get(bucket, 0.0):
+                return None
+            task = create_task_in(contextvars.Context(), self._refill(bucket))
+            self._refills[bucket] = task
+            task.add_done_callback(lambda _: self._refills.pop(bucket, None))
+        return task
+
+    async def _refill(self, bucket: str):
+        try:
+            while len(self._pools[bucket]) < self.size:
+                reply = await self.generate(motivation_batch_prompt(bucket, self.batch))
+                if not self._add(bucket, parse_messages(reply)):
+                    # Nothing new came back; more calls now would likely repeat it
+                    self._refill_after[bucket] = time.monotonic() + self.refill_backoff
+                    break
+        except Exception as e:
+            self.refill_failures += 1
+            self._refill_after[bucket] = time.monotonic() + self.refill_backoff
+            logger.error(f"Motivation pool refill for streak bucket {bucket} failed: {str(e)}")
+
+    async def warm(self) -> int:
+        """Fill every bucket concurrently; returns the number of templates pooled."""
+        tasks = [self.schedule_refill(name) for name, _, _ in STREAK_BUCKETS]
+        await asyncio.gather(*(task for task in tasks if task is not None))
+        pooled = sum(len(pool) for pool in self._pools.values())
+        logger.info(f"Motivation pool warmed ({pooled} messages)")
+        return pooled
+
+    def start(self) -> asyncio.Task:
+        """Warm the pools in the background on the running loop."""
+        return create_task_in(contextvars.Context(), self.warm())
+
+    async def stop(self):
+        tasks = list(self._refills.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            "pooled": {name: len(pool) for name, pool in self._pools.items()},
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated,
+            "refill_failures": self.refill_failures,
+        }
+
+
+# ─────────────────────────────────────────────────────────────
+# GLOBAL POOL ACCESSOR
+# ─────────────────────────────────────────────────────────────
+
+_motivation_pool: Optional[MotivationPool] = None
+
+
+def get_motivation_pool() -> MotivationPool:
+    """Return the process-wide MotivationPool (singleton pattern)."""
+
+    global _motivation_pool
+
+    if _motivation_pool is None:
+        _motivation_pool = MotivationPool(
+            generate=lambda prompt: get_chatbot_service().generate_content(prompt)
+        )
+
+    return _motivation_pool
@@ -0,0 +1,597 @@
+"""
+Multi-worker serving mode for the ProgressBrain chatbot.
+
+Starts N worker processes, each running the ASGI app (asgi.py) on a private
+port, and serves a front dispatcher on the public port that pins every
+user_id to one worker with consistent hashing:
+
+    python multiworker.py --workers 4 --port 5001
+
+When the worker set changes (a worker dies, or SIGTTIN / SIGTTOU adds or
+removes one) only the users whose ring position moved are rerouted. Live
+previous owners hand their users off through the conversation store
+(conversation_store.py) before the new owner sees a request; users of a
+dead worker are reloaded from their last flushed snapshot.
+"""
+
+import os
+import json
+import time
+import bisect
+import signal
+import asyncio
+import hashlib
+import logging
+import secrets
+import argparse
+import itertools
+import multiprocessing
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from async_runtime import run_until_disconnect
+from logging_setup import REQUEST_ID_HEADER, bind_request_id, configure_logging
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, merge_expositions
+from static_content import STATIC_ROUTES, get_static_content
+import uvicorn
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-headers", b"Content-Type, X-Request-ID, If-None-Match"),
+    (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+]
+
+# Response headers that belong to the worker connection, not the client's
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "date", "server"}
+
+# Workers serve /internal routes only to callers presenting this process's
+# secret (see handlers.WORKER_SECRET); kept in sync with handlers.py, which
+# the dispatcher does not import
+WORKER_SECRET_ENV = "CHATBOT_WORKER_SECRET"
+WORKER_SECRET_HEADER = "X-Worker-Secret"
+
+
+# -------------------------------------------------------------------------
+# Consistent Hash Ring
+# -------------------------------------------------------------------------
+class HashRing:
+    """Consistent hash ring with virtual nodes.
+
+    Adding or removing a worker only moves the keys adjacent to its virtual
+    nodes (about 1/N of all users), so rebalancing never reshuffles everyone.
+    """
+
+    def __init__(self, replicas: int = 160):
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: Dict[int, int] = {}
+        self.nodes: List[int] = []
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def add(self, node: int):
+        if node in self.nodes:
+            return
+        for i in range(self.replicas):
+            point = self._hash(f"worker-{node}#{i}")
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+        self.nodes = sorted(self.nodes + [node])
+
+    def remove(self, node: int):
+        if node not in self.nodes:
+            return
+        self._points = [p for p in self._points if self._owners[p] != node]
+        self._owners = {p: n for p, n in self._owners.items() if n != node}
+        self.nodes = [n for n in self.nodes if n != node]
+
+    def lookup(self, key: str) -> Optional[int]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+
+# -------------------------------------------------------------------------
+# Worker Processes
+# -------------------------------------------------------------------------
+def run_worker(host: str, port: int, secret: str):
+    """Entry point of a worker process: the regular ASGI app on a private port.
+
+    The dispatcher's secret is set before asgi.py (and so handlers.py) is
+    imported, which registers the internal handoff route for this worker.
+    """
+    os.environ[WORKER_SECRET_ENV] = secret
+    uvicorn.run("asgi:app", host=host, port=port, log_level=os.getenv("CHATBOT_WORKER_LOG_LEVEL", "warning"))
+
+
+# -------------------------------------------------------------------------
+# Front Dispatcher
+# -------------------------------------------------------------------------
+class Dispatcher:
+    """ASGI front end that supervises workers and proxies to a user's owner."""
+
+    def __init__(
+        self,
+        workers: int,
+        worker_host: str = "127.0.0.1",
+        base_port: int = 5101,
+        owner_ttl: Optional[float] = None,
+        max_owners_per_worker: Optional[int] = None,
+    ):
+        self.initial_workers = workers
+        self.worker_host = worker_host
+        self.base_port = base_port
+
+        # Workers are started with "spawn": forking a process that already
+        # runs an event loop (needed for respawns) is not safe
+        self._mp = multiprocessing.get_context("spawn")
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.ring = HashRing()
+        self._secret = secrets.token_urlsafe(32)
+
+        # user -> (last worker routed to, last seen), oldest first. Only users
+        # a worker may still hold in memory need a handoff, so entries expire
+        # with the workers' idle TTL and session cap (CHATBOT_SESSION_IDLE_TTL,
+        # CHATBOT_MAX_SESSIONS): by then the worker has dropped the session.
+        self.owners: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        if owner_ttl is None:
+            owner_ttl = float(os.getenv("CHATBOT_SESSION_IDLE_TTL", 3600))
+        if max_owners_per_worker is None:
+            max_owners_per_worker = int(os.getenv("CHATBOT_MAX_SESSIONS", 10000))
+        self.owner_ttl = owner_ttl
+        self.max_owners_per_worker = max_owners_per_worker
+        self._inflight: Dict[str, int] = {}
+        # Users being handed off -> set once they may be routed again
+        self._moving: Dict[str, asyncio.Event] = {}
+
+        self._topology_lock: Optional[asyncio.Lock] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._round_robin = itertools.count()
+
+        self.deaths = 0
+        self.rebalances = 0
+        self.users_moved = 0
+
+    def worker_url(self, worker_id: int) -> str:
+        return f"http://{self.worker_host}:{self.base_port + worker_id}"
+
+    # ---------------------------------------------------------------------
+    # Lifecycle
+    # ---------------------------------------------------------------------
+    async def start(self):
+        self._topology_lock = asyncio.Lock()
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=int(os.getenv("GEMINI_MAX_CONNECTIONS", 100)) * 2),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=5),
+        )
+
+        if os.getenv("CHATBOT_STORE_BACKEND", "none").lower() in ("", "none", "memory"):
+            logger.warning("No conversation store configured: users lose their context when rebalanced")
+
+        await asyncio.gather(*(self._spawn(i) for i in range(self.initial_workers)))
+        for worker_id in range(self.initial_workers):
+            self.ring.add(worker_id)
+
+        loop = asyncio.get_running_loop()
+        for sig, action in ((signal.SIGTTIN, self.add_worker), (signal.SIGTTOU, self.remove_worker)):
+            loop.add_signal_handler(sig, lambda action=action: loop.create_task(action()))
+
+        self._monitor_task = loop.create_task(self._monitor())
+        logger.info(f"Dispatcher started with {len(self.ring)} workers")
+
+    async def stop(self):
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            await asyncio.get_running_loop().run_in_executor(None, process.join, 15)
+        if self._session is not None:
+            await self._session.close()
+
+    async def _spawn(self, worker_id: int):
+        process = self._mp.Process(
+            target=run_worker,
+            args=(self.worker_host, self.base_port + worker_id, self._secret),
+            name=f"chatbot-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[worker_id] = process
+        await self._wait_healthy(worker_id)
+        logger.info(f"Worker {worker_id} (pid {process.pid}) ready on port {self.base_port + worker_id}")
+
+    async def _wait_healthy(self, worker_id: int, timeout: float = 60.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.processes[worker_id].is_alive():
+                raise RuntimeError(f"Worker {worker_id} exited during startup")
+            try:
+                async with self._session.get(f"{self.worker_url(worker_id)}/livez") as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+        raise RuntimeError(f"Worker {worker_id} did not become healthy in {timeout}s")
+
+    # ---------------------------------------------------------------------
+    # Worker Set Changes
+    # ---------------------------------------------------------------------
+    async def add_worker(self):
+        async with self._topology_lock:
+            worker_id = max(self.processes, default=-1) + 1
+            await self._spawn(worker_id)
+            self.ring.add(worker_id)
+            await self._rebalance()
+
+    async def remove_worker(self):
+        async with self._topology_lock:
+            if len(self.ring) <= 1:
+                return
+            worker_id = self.ring.nodes[-1]
+            self.ring.remove(worker_id)
+            await self._rebalance()
+            process = self.processes.pop(worker_id)
+            process.terminate()
+            await asyncio.get_running_loop().run_in_executor(None, process.join, 15)
+            logger.info(f"Worker {worker_id} removed")
+
+    async def _monitor(self):
+        """Replace dead workers; their users move to survivors until the replacement is up."""
+        while True:
+            await asyncio.sleep(1.0)
+            for worker_id, process in list(self.processes.items()):
+                if process.is_alive() or worker_id not in self.ring.nodes:
+                    continue
+
+                async with self._topology_lock:
+                    self.deaths += 1
+                    logger.error(f"Worker {worker_id} died (exit code {process.exitcode}), rerouting its users")
+                    self.ring.remove(worker_id)
+                    await self._rebalance(dead=worker_id)
+
+                    try:
+                        await self._spawn(worker_id)
+                    except Exception as e:
+                        logger.error(f"Failed to respawn worker {worker_id}: {str(e)}")
+                        continue
+                    self.ring.add(worker_id)
+                    await self._rebalance()
+
+    async def _rebalance(self, dead: Optional[int] = None):
+        """Move users whose owner changed, handing off state from live previous owners.
+
+        Only the moved users wait: their requests are held until their own
+        previous owner has handed them off, everyone else keeps routing.
+        """
+        self._expire_owners()
+        moved: Dict[int, List[str]] = {}
+        for user_id, (owner, _) in self.owners.items():
+            if self.ring.lookup(user_id) != owner:
+                moved.setdefault(owner, []).append(user_id)
+
+        # Registered before the first await, so no request of a moved user
+        # can reach its new owner ahead of the handoff
+        released = {owner: asyncio.Event() for owner in moved}
+        for owner, user_ids in moved.items():
+            for user_id in user_ids:
+                self._moving[user_id] = released[owner]
+
+        try:
+            await asyncio.gather(*(
+                self._move(owner, user_ids, released[owner], handoff=owner != dead)
+                for owner, user_ids in moved.items()
+            ))
+            self.rebalances += 1
+            self.users_moved += sum(len(users) for users in moved.values())
+        finally:
+            for owner, user_ids in moved.items():
+                released[owner].set()
+                for user_id in user_ids:
+                    if self._moving.get(user_id) is released[owner]:
+                        del self._moving[user_id]
+
+    async def _move(self, owner: int, user_ids: List[str], released: asyncio.Event, handoff: bool):
+        # Let requests already running on the previous owner finish first
+        deadline = time.monotonic() + 30
+        while any(self._inflight.get(u) for u in user_ids):
+            if time.monotonic() > deadline:
+                logger.warning(f"Handing off users of worker {owner} with requests still in flight")
+                break
+            await asyncio.sleep(0.05)
+
+        if handoff and owner in self.processes and self.processes[owner].is_alive():
+            await self._handoff(owner, user_ids)
+        for user_id in user_ids:
+            entry = self.owners.get(user_id)
+            if entry is not None:
+                self.owners[user_id] = (self.ring.lookup(user_id), entry[1])
+        released.set()
+
+    async def _handoff(self, worker_id: int, user_ids: List[str], chunk: int = 1000):
+        for start in range(0, len(user_ids), chunk):
+            try:
+                async with self._session.post(
+                    f"{self.worker_url(worker_id)}/internal/handoff",
+                    json={"user_ids": user_ids[start:start + chunk]},
+                    headers={WORKER_SECRET_HEADER: self._secret},
+                ) as resp:
+                    if resp.status != 200:
+                        logger.error(f"Handoff from worker {worker_id} failed: HTTP {resp.status}")
+            except aiohttp.ClientError as e:
+                logger.error(f"Handoff from worker {worker_id} failed: {str(e)}")
+
+    # ---------------------------------------------------------------------
+    # Routing
+    # ---------------------------------------------------------------------
+    def route(self, user_id: Optional[str]) -> Optional[int]:
+        if not user_id:
+            nodes = self.ring.nodes
+            return nodes[next(self._round_robin) % len(nodes)] if nodes else None
+
+        worker_id = self.ring.lookup(user_id)
+        self.owners[user_id] = (worker_id, time.monotonic())
+        self.owners.move_to_end(user_id)
+        self._expire_owners()
+        return worker_id
+
+    def _expire_owners(self):
+        """Forget users their worker no longer holds (idle past the TTL, or beyond the session cap)."""
+        cutoff = time.monotonic() - self.owner_ttl if self.owner_ttl else float("-inf")
+        limit = self.max_owners_per_worker * max(len(self.ring), 1)
+        while self.owners:
+            _, last_seen = next(iter(self.owners.values()))
+            if last_seen > cutoff and len(self.owners) <= limit:
+                break
+            self.owners.popitem(last=False)
+
+    def stats(self) -> Dict:
+        return {
+            "workers": {
+                worker_id: {"pid": process.pid, "alive": process.is_alive(), "in_ring": worker_id in self.ring.nodes}
+                for worker_id, process in self.processes.items()
+            },
+            "users": len(self.owners),
+            "deaths": self.deaths,
+            "rebalances": self.rebalances,
+            "users_moved": self.users_moved,
+        }
+
+    # ---------------------------------------------------------------------
+    # ASGI Entry Point
+    # ---------------------------------------------------------------------
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        method = scope["method"]
+        path = scope["path"]
+
+        if method == "OPTIONS":
+            await send({"type": "http.response.start", "status": 204, "headers": CORS_HEADERS})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if path.startswith("/internal"):
+            await self._send_json(send, {"error": "Not found"}, 404)
+            return
+
+        if path.rstrip("/") == "/workers":
+            await self._send_json(send, self.stats(), 200)
+            return
+
+        if path.rstrip("/") == "/metrics":
+            await self._metrics(send)
+            return
+
+        if path.rstrip("/") == "/livez":
+            await self._send_json(send, {"status": "alive"}, 200)
+            return
+
+        if path.rstrip("/") == "/readyz":
+            await self._readyz(send)
+            return
+
+        if method == "GET" and path.rstrip("/") in STATIC_ROUTES:
+            await self._static(scope, send, STATIC_ROUTES[path.rstrip("/")])
+            return
+
+        # Forwarded to the worker, so its log lines carry the same ID
+        request_id = bind_request_id(
+            dict(scope["headers"]).get(REQUEST_ID_HEADER.lower().encode(), b"").decode("latin-1")
+        )
+
+        body = await self._read_body(receive)
+        user_id = None
+        if body:
+            try:
+                data = json.loads(body)
+                user_id = str(data["user_id"]) if isinstance(data, dict) and data.get("user_id") else None
+            except ValueError:
+                pass    # the worker answers with its usual 400
+
+        moving = self._moving.get(user_id) if user_id else None
+        if moving is not None:
+            await moving.wait()
+        worker_id = self.route(user_id)
+        if worker_id is None:
+            await self._send_json(send, {"error": "No workers available"}, 503)
+            return
+
+        if user_id:
+            self._inflight[user_id] = self._inflight.get(user_id, 0) + 1
+        try:
+            # Closing the worker connection on disconnect cancels its handler too
+            await run_until_disconnect(receive, self._proxy(worker_id, scope, body, send, request_id))
+        finally:
+            if user_id:
+                remaining = self._inflight[user_id] - 1
+                if remaining:
+                    self._inflight[user_id] = remaining
+                else:
+                    del self._inflight[user_id]
+
+    async def _metrics(self, send):
+        """Every worker's /metrics merged into one exposition, labelled by worker."""
+
+        async def scrape(worker_id: int) -> str:
+            try:
+                async with self._session.get(f"{self.worker_url(worker_id)}/metrics") as resp:
+                    return await resp.text() if resp.status == 200 else ""
+            except aiohttp.ClientError as e:
+                logger.warning(f"Metrics scrape of worker {worker_id} failed: {str(e)}")
+                return ""
+
+        worker_ids = list(self.ring.nodes)
+        texts = await asyncio.gather(*(scrape(worker_id) for worker_id in worker_ids))
+        body = merge_expositions({str(w): text for w, text in zip(worker_ids, texts) if text}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", METRICS_CONTENT_TYPE.encode()), *CORS_HEADERS],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _static(self, scope, send, name: str):
+        """Knowledge-base content is the same on every worker; answered here."""
+        request_headers = dict(scope["headers"])
+        status, body, headers = get_static_content(name).respond(
+            request_headers.get(b"if-none-match", b"").decode("latin-1"),
+            request_headers.get(b"accept-encoding", b"").decode("latin-1"),
+        )
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                *((header.lower().encode(), value.encode()) for header, value in headers.items()),
+                (b"content-length", str(len(body)).encode()),
+                *CORS_HEADERS,
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _readyz(self, send):
+        """Ready once every worker in the ring reports ready."""
+
+        async def probe(worker_id: int) -> bool:
+            try:
+                async with self._session.get(f"{self.worker_url(worker_id)}/readyz") as resp:
+                    return resp.status == 200
+            except aiohttp.ClientError:
+                return False
+
+        worker_ids = list(self.ring.nodes)
+        results = await asyncio.gather(*(probe(worker_id) for worker_id in worker_ids))
+        ready = bool(worker_ids) and all(results)
+        await self._send_json(send, {
+            "status": "ready" if ready else "starting",
+            "workers": {worker_id: result for worker_id, result in zip(worker_ids, results)},
+        }, 200 if ready else 503)
+
+    async def _proxy(self, worker_id: int, scope, body: bytes, send, request_id: str):
+        url = f"{self.worker_url(worker_id)}{scope['path']}"
+        if scope.get("query_string"):
+            url += "?" + scope["query_string"].decode("latin-1")
+
+        headers = {REQUEST_ID_HEADER: request_id}
+        if body:
+            headers["content-type"] = "application/json"
+
+        try:
+            async with self._session.request(scope["method"], url, data=body or None, headers=headers) as resp:
+                headers = [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in resp.headers.items()
+                    if name.lower() not in HOP_BY_HOP_HEADERS
+                ]
+                await send({"type": "http.response.start", "status": resp.status, "headers": headers})
+
+                if resp.content_type == "text/event-stream":
+                    async for chunk in resp.content.iter_any():
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                    await send({"type": "http.response.body", "body": b""})
+                else:
+                    await send({"type": "http.response.body", "body": await resp.read()})
+
+        except aiohttp.ClientError as e:
+            logger.error(f"Proxy to worker {worker_id} failed: {str(e)}")
+            await self._send_json(send, {"error": "Worker unavailable"}, 502)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.start()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+
+            elif message["type"] == "lifespan.shutdown":
+                await self.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        return body
+
+    @staticmethod
+    async def _send_json(send, payload: Dict, status: int):
+        body = json.dumps(payload).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *CORS_HEADERS,
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+# -------------------------------------------------------------------------
+# Main Entry
+# -------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Run the chatbot with one worker process per core")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("CHATBOT_WORKERS", os.cpu_count() or 1)))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 5001)))
+    parser.add_argument("--worker-base-port", type=int, default=int(os.getenv("CHATBOT_WORKER_BASE_PORT", 5101)))
+    args = parser.parse_args()
+
+    configure_logging()
+    dispatcher = Dispatcher(args.workers, base_port=args.worker_base_port)
+    uvicorn.run(dispatcher, host=args.host, port=args.port, lifespan="on")
+
+
+if __name__ == "__main__":
+    main()
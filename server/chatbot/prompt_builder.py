@@ -0,0 +1,97 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+# ─────────────────────────────────────────────────────────────
+# PROMPT SECTIONS
+# ─────────────────────────────────────────────────────────────
+
+@dataclass
+class PromptSection:
+    """One named block of prompt text with its drop priority.
+
+    Lower priority sections are dropped first when the budget is exceeded;
+    required sections are never dropped.
+    """
+
+    name: str
+    text: str
+    priority: int = 50
+    required: bool = False
+    tokens: int = field(init=False)
+
+    def __post_init__(self):
+        self.tokens = estimate_tokens(self.text)
+
+
+@dataclass
+class PromptReport:
+    """Approximate token cost of an assembled prompt, per section."""
+
+    sections: Dict[str, int]
+    dropped: List[str]
+    total: int
+    budget: int
+
+    def describe(self) -> str:
+        parts = " ".join(f"{name}={tokens}" for name, tokens in self.sections.items())
+        dropped = f" dropped={','.join(self.dropped)}" if self.dropped else ""
+        return f"total={self.total}/{self.budget} {parts}{dropped}"
+
+
+# ─────────────────────────────────────────────────────────────
+# TOKEN-BUDGETED PROMPT BUILDER
+# ─────────────────────────────────────────────────────────────
+
+class PromptBuilder:
+    """Assembles prompt sections under an approximate input-token budget.
+
+    Sections keep their insertion order in the output. Empty sections and
+    sections whose text duplicates an earlier one are skipped, then optional
+    sections are dropped lowest-priority first until the prompt fits.
+    """
+
+    def __init__(self, budget: int, separator: str = "<br><br>"):
+        self.budget = budget
+        self.separator = separator
+        self.sections: List[PromptSection] = []
+        self._seen_text = set()
+
+    def add(self, name: str, text: str, priority: int = 50, required: bool = False) -> "PromptBuilder":
+        text = (text or "").strip()
+        if not text or text in self._seen_text:
+            return self
+
+        self._seen_text.add(text)
+        self.sections.append(PromptSection(name, text, priority, required))
+        return self
+
+    def build(self) -> Tuple[str, PromptReport]:
+        kept = list(self.sections)
+        separator_tokens = estimate_tokens(self.separator)
+        total = sum(s.tokens for s in kept) + separator_tokens * max(len(kept) - 1, 0)
+        dropped: List[str] = []
+
+        for section in sorted((s for s in kept if not s.required), key=lambda s: s.priority):
+            if total <= self.budget:
+                break
+            kept.remove(section)
+            dropped.append(section.name)
+            total -= section.tokens + separator_tokens
+
+        prompt = self.separator.join(s.text for s in kept)
+        report = PromptReport(
+            sections={s.name: s.tokens for s in kept},
+            dropped=dropped,
+            total=total,
+            budget=self.budget,
+        )
+        return prompt, report
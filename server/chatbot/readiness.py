@@ -0,0 +1,110 @@
+import time
+import asyncio
+import logging
+import contextvars
+from typing import Callable, Dict, Optional
+
+from async_runtime import create_task_in
+from chatbot_context import ProgressBrainKnowledgeBase
+from chatbot_service import get_chatbot_service
+from motivation_pool import get_motivation_pool
+from response_cache import get_response_cache
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────────────────────
+# STARTUP WARM-UP AND READINESS
+# ─────────────────────────────────────────────────────────────
+
+class Readiness:
+    """Builds the expensive components after the server is already listening.
+
+    Nothing heavy happens at import: the process answers /livez (and
+    knowledge-base traffic) immediately, while the warm-up builds the
+    knowledge-base index and the LLM backend (whose HTTP client import
+    dominates cold start) on an executor thread. /readyz reports 200 once
+    every component is up.
+    """
+
+    COMPONENTS = ("knowledge_base", "llm_backend")
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.components: Dict[str, str] = {name: "pending" for name in self.COMPONENTS}
+        self.durations: Dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return all(state == "ready" for state in self.components.values())
+
+    def start(self) -> asyncio.Task:
+        """Schedule the warm-up on the running loop (once).
+
+        It runs in a fresh context, so no request ID or deadline of whatever
+        triggered the start leaks into it or the refresh task it starts.
+        """
+        if self._task is None:
+            self._task = create_task_in(contextvars.Context(), self.warm_up())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def warm_up(self):
+        await self._build("knowledge_base", ProgressBrainKnowledgeBase.get_index)
+        await self._build("llm_backend", get_chatbot_service)
+
+        if self.components["llm_backend"] == "ready":
+            # Pre-generate knowledge-base answers and motivational messages,
+            # so they need the backend
+            get_response_cache().start()
+            get_motivation_pool().start()
+
+        if self.ready:
+            self.ready_after = time.monotonic() - self.started_at
+            logger.info(f"Ready after {self.ready_after * 1000:.0f}ms", extra={"startup": self.durations})
+
+    async def _build(self, name: str, build: Callable[[], object]):
+        start = time.monotonic()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, build)
+        except Exception as e:
+            self.components[name] = "failed"
+            logger.error(f"Startup of {name} failed: {str(e)}")
+            return
+        self.durations[name] = round((time.monotonic() - start) * 1000, 1)
+        self.components[name] = "ready"
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "components": dict(self.components),
+            "durations_ms": dict(self.durations),
+            "ready_after_ms": round(self.ready_after * 1000, 1) if self.ready_after is not None else None,
+        }
+
+
+# ─────────────────────────────────────────────────────────────
+# GLOBAL READINESS ACCESSOR
+# ─────────────────────────────────────────────────────────────
+
+_readiness: Optional[Readiness] = None
+
+
+def get_readiness() -> Readiness:
+    """Return the process-wide Readiness tracker (singleton pattern)."""
+
+    global _readiness
+
+    if _readiness is None:
+        _readiness = Readiness()
+
+    return _readiness
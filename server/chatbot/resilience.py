@@ -0,0 +1,436 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional
+
+from admission import AdmissionRejected
+from llm_backends import LLMBackend, LLMBackendError, content_chars
+from metrics import SIZE_BUCKETS, get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamTimeout(LLMBackendError):
+    """The upstream call did not finish within its deadline."""
+
+    def __init__(self, message: str = "Upstream call timed out"):
+        super().__init__(504, message, provider="Upstream")
+
+
+class CircuitOpenError(LLMBackendError):
+    """The circuit breaker is open; the call was not attempted."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(503, "Upstream temporarily unavailable", provider="Upstream")
+        self.retry_after = retry_after
+
+
+# Upstream statuses worth retrying: throttling and server-side failures
+TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed upstream call may succeed when retried."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, LLMBackendError):
+        return error.status in TRANSIENT_STATUSES
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError))
+
+
+# ─────────────────────────────────────────────────────────────
+# REQUEST DEADLINES
+# ─────────────────────────────────────────────────────────────
+
+# Absolute (time.monotonic) deadline of the request being served, if any
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+REQUEST_TIMEOUT = float(os.getenv("CHATBOT_REQUEST_TIMEOUT", 45))
+
+
+@contextmanager
+def request_deadline(timeout_ms: Any = None):
+    """Bound everything awaited inside the block by the request's deadline.
+
+    ``timeout_ms`` comes from the incoming request and can only shorten the
+    server-wide CHATBOT_REQUEST_TIMEOUT; an enclosing deadline is never
+    extended.
+    """
+    timeout = REQUEST_TIMEOUT
+    try:
+        if timeout_ms is not None:
+            timeout = min(timeout, max(float(timeout_ms), 0.0) / 1000)
+    except (TypeError, ValueError):
+        pass
+
+    deadline = time.monotonic() + timeout
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current request's deadline (None = unbounded)."""
+    deadline = _deadline.get()
+    return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+
+
+def detached_context() -> contextvars.Context:
+    """Copy of the current context without a request deadline.
+
+    Shared upstream work (e.g. a coalesced call) runs in this context, so one
+    caller's short deadline does not fail it for everyone else.
+    """
+    context = contextvars.copy_context()
+    context.run(_deadline.set, None)
+    return context
+
+
+async def within_deadline(awaitable: Awaitable) -> Any:
+    """Await ``awaitable``, raising UpstreamTimeout once the request deadline passes."""
+    try:
+        return await asyncio.wait_for(awaitable, remaining_time())
+    except asyncio.TimeoutError:
+        raise UpstreamTimeout("Request deadline exceeded") from None
+
+
+# ─────────────────────────────────────────────────────────────
+# CIRCUIT BREAKER
+# ─────────────────────────────────────────────────────────────
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive upstream failures.
+
+    While open, calls fail immediately with CircuitOpenError. After
+    ``reset_timeout`` seconds one probe call is let through (half-open): its
+    success closes the circuit, its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+        self.times_opened = 0
+        self.short_circuited = 0
+
+    def retry_after(self) -> float:
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 1.0)
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected without reaching the upstream."""
+        if self.state == self.CLOSED:
+            return False
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at < self.reset_timeout
+        return self._probing
+
+    def before_call(self):
+        """Admit a call or raise CircuitOpenError."""
+        if self.failure_threshold <= 0 or self.state == self.CLOSED:
+            return
+
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probing = False
+
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+
+        self.short_circuited += 1
+        raise CircuitOpenError(self.retry_after())
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("Upstream circuit closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (
+            self.state == self.CLOSED and 0 < self.failure_threshold <= self.failures
+        ):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probing = False
+            self.times_opened += 1
+            logger.warning(f"Upstream circuit opened after {self.failures} consecutive failures")
+
+    def release_probe(self):
+        """A half-open probe ended without a verdict (e.g. cancelled)."""
+        self._probing = False
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "short_circuited": self.short_circuited,
+        }
+
+
+# ─────────────────────────────────────────────────────────────
+# RESILIENT BACKEND
+# ─────────────────────────────────────────────────────────────
+
+class ResilientBackend(LLMBackend):
+    """Deadlines, retries, hedging and a circuit breaker around a backend.
+
+    - every attempt is bounded by ``call_timeout`` and the request deadline
+    - transient failures are retried up to ``max_retries`` times with full
+      jitter backoff (``base_delay`` doubling up to ``max_delay``), but never
+      past the deadline
+    - with ``hedge_after`` > 0, a one-shot call still running after that many
+      seconds gets a second, parallel attempt; the first success wins and
+      the loser is cancelled
+    - streams are retried only until their first chunk has been yielded
+
+    Cancelling the caller (client disconnect) cancels the attempts in flight.
+    An attempt shed by admission control (AdmissionRejected from a wrapped
+    AdmittedBackend) never reached the upstream, so it is re-raised without
+    touching the breaker or the upstream metrics.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        breaker: Optional[CircuitBreaker] = None,
+        call_timeout: float = 30.0,
+        max_retries: int = 2,
+        base_delay: float = 0.2,
+        max_delay: float = 2.0,
+        hedge_after: float = 0.0,
+    ):
+        super().__init__(backend.model_name, backend.generation_config)
+        self.backend = backend
+        self.name = backend.name
+        self.breaker = breaker or CircuitBreaker()
+        self.call_timeout = call_timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_after = hedge_after
+
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+
+        metrics = get_metrics()
+        self._latency = metrics.histogram(
+            "upstream_duration_seconds", "Upstream LLM call attempts by call type and outcome", ("call", "outcome")
+        )
+        self._errors = metrics.counter("upstream_errors_total", "Failed upstream attempts by status", ("status",))
+        self._prompt_chars = metrics.histogram(
+            "upstream_prompt_chars", "Characters sent per upstream call, system instruction and replayed history included", buckets=SIZE_BUCKETS
+        )
+        self._response_chars = metrics.histogram(
+            "upstream_response_chars", "Characters received per successful upstream call", buckets=SIZE_BUCKETS
+        )
+
+    def _attempt_timeout(self) -> float:
+        remaining = remaining_time()
+        return self.call_timeout if remaining is None else min(self.call_timeout, remaining)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def _retry_pause(self, attempt: int, error: BaseException) -> bool:
+        """Sleep before the next attempt; False when no attempt is left or it would miss the deadline."""
+        if attempt >= self.max_retries or not is_transient(error):
+            return False
+
+        delay = self._backoff(attempt)
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            return False
+
+        self.retries += 1
+        logger.warning(f"Retrying upstream call in {delay:.2f}s after: {str(error)}")
+        await asyncio.sleep(delay)
+        return True
+
+    def _record(self, call: str, started_at: float, error: Optional[BaseException]):
+        """Feed one attempt's outcome to the breaker and the upstream metrics."""
+        if error is None:
+            outcome = "ok"
+            self.breaker.record_success()
+        elif isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            outcome = "cancelled"
+            self.breaker.release_probe()
+        else:
+            outcome = "timeout" if isinstance(error, UpstreamTimeout) else "error"
+            self._errors.labels(getattr(error, "status", "connection")).inc()
+            if is_transient(error):
+                self.breaker.record_failure()
+            else:
+                # The upstream answered (e.g. a 400); it is not unhealthy
+                self.breaker.record_success()
+
+        self._latency.labels(call, outcome).observe(time.perf_counter() - started_at)
+
+    def _timed_out(self) -> UpstreamTimeout:
+        self.timeouts += 1
+        return UpstreamTimeout()
+
+    async def _attempt(self, contents: List[Dict], system_instruction: Optional[Dict]) -> str:
+        self.breaker.before_call()
+        started_at = time.perf_counter()
+        try:
+            text = await asyncio.wait_for(
+                self.backend.complete(contents, system_instruction), self._attempt_timeout()
+            )
+        except asyncio.TimeoutError:
+            error = self._timed_out()
+            self._record("complete", started_at, error)
+            raise error from None
+        except AdmissionRejected:
+            # Shed before reaching the upstream: says nothing about its health
+            self.breaker.release_probe()
+            raise
+        except BaseException as e:
+            self._record("complete", started_at, e)
+            raise
+        self._record("complete", started_at, None)
+        self._response_chars.observe(len(text))
+        return text
+
+    async def _hedged_attempt(self, contents: List[Dict], system_instruction: Optional[Dict]) -> str:
+        tasks = [asyncio.ensure_future(self._attempt(contents, system_instruction))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if done or self.breaker.is_open():
+                return await tasks[0]
+
+            self.hedges += 1
+            tasks.append(asyncio.ensure_future(self._attempt(contents, system_instruction)))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The losing attempt (or both, on cancellation) stops here
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def complete(self, contents: List[Dict], system_instruction: Optional[Dict] = None) -> str:
+        self._prompt_chars.observe(content_chars(contents, system_instruction))
+        attempt = 0
+        while True:
+            try:
+                if self.hedge_after > 0:
+                    return await self._hedged_attempt(contents, system_instruction)
+                return await self._attempt(contents, system_instruction)
+            except (LLMBackendError, asyncio.TimeoutError, ConnectionError) as e:
+                if not await self._retry_pause(attempt, e):
+                    raise
+                attempt += 1
+
+    async def stream(self, contents: List[Dict], system_instruction: Optional[Dict] = None) -> AsyncIterator[str]:
+        self._prompt_chars.observe(content_chars(contents, system_instruction))
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            started_at = time.perf_counter()
+            # The attempt timeout covers the whole reply, not each chunk
+            deadline = time.monotonic() + self._attempt_timeout()
+            chunks = self.backend.stream(contents, system_instruction).__aiter__()
+            received = 0
+            started = False
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), deadline - time.monotonic())
+                    except StopAsyncIteration:
+                        break
+                    started = True
+                    received += len(chunk)
+                    yield chunk
+                self._record("stream", started_at, None)
+                self._response_chars.observe(received)
+                return
+
+            except asyncio.TimeoutError:
+                error = self._timed_out()
+                self._record("stream", started_at, error)
+                raise error from None
+
+            except (LLMBackendError, ConnectionError) as e:
+                self._record("stream", started_at, e)
+                if started or not await self._retry_pause(attempt, e):
+                    raise
+                attempt += 1
+
+            except AdmissionRejected:
+                self.breaker.release_probe()
+                raise
+
+            except BaseException as e:
+                self._record("stream", started_at, e)
+                raise
+
+            finally:
+                await chunks.aclose()
+
+    def ensure_available(self):
+        """Raise CircuitOpenError without attempting a call when the circuit is open."""
+        if self.breaker.is_open():
+            self.breaker.short_circuited += 1
+            raise CircuitOpenError(self.breaker.retry_after())
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self) -> Dict:
+        return {
+            "breaker": self.breaker.stats(),
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "timeouts": self.timeouts,
+        }
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+def with_resilience(backend: LLMBackend) -> ResilientBackend:
+    """Wrap a backend using the CHATBOT_UPSTREAM_* / CHATBOT_BREAKER_* settings."""
+    return ResilientBackend(
+        backend,
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("CHATBOT_BREAKER_FAILURES", 5)),
+            reset_timeout=float(os.getenv("CHATBOT_BREAKER_RESET_TIMEOUT", 30)),
+        ),
+        call_timeout=float(os.getenv("CHATBOT_UPSTREAM_TIMEOUT", 30)),
+        max_retries=int(os.getenv("CHATBOT_UPSTREAM_RETRIES", 2)),
+        base_delay=float(os.getenv("CHATBOT_RETRY_BASE_DELAY", 0.2)),
+        max_delay=float(os.getenv("CHATBOT_RETRY_MAX_DELAY", 2.0)),
+        hedge_after=float(os.getenv("CHATBOT_HEDGE_AFTER_MS", 0)) / 1000,
+    )
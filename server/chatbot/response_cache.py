@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from chatbot_context import ProgressBrainKnowledgeBase
+from chatbot_service import get_chatbot_service
+from async_runtime import create_task_in
+from resilience import detached_context, within_deadline
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────────────────────
+# PROMPTS FOR KNOWLEDGE-BASE ANSWERS
+# ─────────────────────────────────────────────────────────────
+
+def feature_explanation_prompt(feature: str, feature_data: Dict) -> str:
+    return f"""
+Explain the '{feature}' feature of ProgressBrain in a beginner-friendly, clear way.
+
+Feature Details:
+- Description: {feature_data['description']}
+- How to use: {feature_data['how_to']}
+- Benefits: {', '.join(feature_data['benefits'])}
+- Tips: {', '.join(feature_data['tips'])}
+
+Write an engaging explanation combining these elements.
+"""
+
+
+def registration_guidance_prompt(step: int, step_data: Dict) -> str:
+    return f"""
+Provide warm, encouraging guidance for Step {step} of ProgressBrain registration.
+
+Step Title: {step_data['title']}
+Description: {step_data['description']}
+Fields Required: {', '.join(step_data.get('fields', []))}
+Tips: {', '.join(step_data['tips'])}
+{f"Action: {step_data['action']}" if "action" in step_data else ""}
+
+Help the user feel confident and informed.
+"""
+
+
+def content_version(entry: Dict) -> str:
+    """Short, stable hash of a knowledge-base entry's content."""
+    encoded = json.dumps(entry, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()[:12]
+
+
+# ─────────────────────────────────────────────────────────────
+# KNOWLEDGE-BASE RESPONSE CACHE
+# ─────────────────────────────────────────────────────────────
+
+class KnowledgeResponseCache:
+    """In-memory answers for the feature-info and registration-guidance endpoints.
+
+    Entries are keyed on (kind, knowledge-base key) and carry the content
+    version hash they were generated from, so editing an entry invalidates
+    its cached answer. All entries are warmed in the background at startup
+    and regenerated every ``ttl`` seconds; requests are served from memory
+    and only fall through to the LLM on a cold or invalidated entry.
+    """
+
+    def __init__(self, generate: Callable[[str], Awaitable[str]], ttl: Optional[float] = None):
+        self.generate = generate
+        self.ttl = ttl or float(os.getenv("CHATBOT_KB_CACHE_TTL", 6 * 3600))
+
+        # (kind, key) -> (version, text, generated_at)
+        self._entries: Dict[Tuple[str, str], Tuple[str, str, float]] = {}
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Task] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    # ─────────────────────────────────────────────────────────────
+    # KNOWLEDGE-BASE ENTRIES
+    # ─────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def iter_entries():
+        """Yield (kind, key, prompt, version) for every cacheable answer."""
+        kb = ProgressBrainKnowledgeBase
+
+        for feature, data in kb.FEATURES.items():
+            yield "feature", feature, feature_explanation_prompt(feature, data), content_version(data)
+
+        for step_key, data in kb.REGISTRATION_FLOW.items():
+            step = int(step_key.split("_")[1])
+            yield "registration", str(step), registration_guidance_prompt(step, data), content_version(data)
+
+    # ─────────────────────────────────────────────────────────────
+    # LOOKUP
+    # ─────────────────────────────────────────────────────────────
+
+    async def get(self, kind: str, key: str, version: str, build_prompt: Callable[[], str]) -> str:
+        """Return the cached answer for an entry, generating it on a miss."""
+
+        cached = self._entries.get((kind, key))
+        if cached is not None and cached[0] == version:
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        return await self._generate(kind, key, build_prompt(), version)
+
+    async def _generate(self, kind: str, key: str, prompt: str, version: str) -> str:
+        # Concurrent misses for the same entry share one fill task. It runs
+        # without any caller's deadline and completes even if every caller
+        # leaves, so the work still ends up in the cache.
+        inflight_key = (kind, key, version)
+        task = self._inflight.get(inflight_key)
+        if task is None:
+            task = create_task_in(detached_context(), self._fill(kind, key, prompt, version))
+            self._inflight[inflight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(inflight_key, None))
+            # Mark retrieved so an unawaited failure is not logged by asyncio
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        return await within_deadline(asyncio.shield(task))
+
+    async def _fill(self, kind: str, key: str, prompt: str, version: str) -> str:
+        text = await self.generate(prompt)
+        self._entries[(kind, key)] = (version, text, time.time())
+        return text
+
+    # ─────────────────────────────────────────────────────────────
+    # WARMING AND REFRESH
+    # ─────────────────────────────────────────────────────────────
+
+    async def refresh(self, only_stale: bool = False) -> int:
+        """(Re)generate every entry concurrently; returns how many succeeded."""
+        now = time.time()
+        jobs = []
+
+        for kind, key, prompt, version in self.iter_entries():
+            cached = self._entries.get((kind, key))
+            if only_stale and cached and cached[0] == version and now - cached[2] < self.ttl:
+                continue
+            jobs.append(self._generate(kind, key, prompt, version))
+
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        failures = [r for r in results if isinstance(r, Exception)]
+        for error in failures:
+            logger.error(f"Knowledge-base cache refresh failed: {str(error)}")
+
+        return len(results) - len(failures)
+
+    async def _refresh_forever(self):
+        warmed = await self.refresh(only_stale=True)
+        logger.info(f"Knowledge-base response cache warmed ({warmed} entries)")
+
+        while True:
+            await asyncio.sleep(self.ttl)
+            await self.refresh()
+
+    def start(self) -> asyncio.Task:
+        """Start background warming and TTL refresh on the running loop."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh_forever())
+        return self._refresh_task
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def stats(self) -> Dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# ─────────────────────────────────────────────────────────────
+# GLOBAL CACHE ACCESSOR
+# ─────────────────────────────────────────────────────────────
+
+_response_cache: Optional[KnowledgeResponseCache] = None
+
+
+def get_response_cache() -> KnowledgeResponseCache:
+    """Return the process-wide KnowledgeResponseCache (singleton pattern)."""
+
+    global _response_cache
+
+    if _response_cache is None:
+        _response_cache = KnowledgeResponseCache(
+            generate=lambda prompt: get_chatbot_service().generate_content(prompt)
+        )
+
+    return _response_cache
@@ -0,0 +1,302 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Rough fixed cost of a session record, its ChatbotContext and UserProfile
+SESSION_OVERHEAD_BYTES = 4096
+
+
+# ─────────────────────────────────────────────────────────────
+# USER SESSION RECORD
+# ─────────────────────────────────────────────────────────────
+
+class UserSession:
+    """Everything the service holds for one user, evicted as a unit."""
+
+    __slots__ = ("user_id", "context", "chat", "created_at", "last_access", "size")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.context: Optional[Any] = None   # ChatbotContext
+        self.chat: Optional[Any] = None      # ChatSession
+        self.created_at = time.monotonic()
+        self.last_access = self.created_at
+        self.size = SESSION_OVERHEAD_BYTES
+
+    def estimate_size(self) -> int:
+        """Approximate heap footprint in bytes, dominated by stored text."""
+        size = SESSION_OVERHEAD_BYTES
+        for part in (self.context, self.chat):
+            if part is not None and hasattr(part, "estimate_size"):
+                size += part.estimate_size()
+        return size
+
+
+# ─────────────────────────────────────────────────────────────
+# BOUNDED LRU + IDLE-TTL STORE
+# ─────────────────────────────────────────────────────────────
+
+class SessionStore:
+    """Bounded per-user session store with LRU and idle-TTL eviction.
+
+    Entries are kept in access order, so both the least-recently-used entry
+    and the longest-idle entry sit at the head of the ordered dict. An access
+    only moves the entry to the end; sizes are re-measured when a session is
+    written (``resize``, called once a turn commits), so a lookup never walks
+    the stored text.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 512 * 1024 * 1024,
+        idle_ttl: float = 3600.0,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+
+        self._entries: "OrderedDict[str, UserSession]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[UserSession, str], None]] = []
+        self._fetch: Optional[Callable[[str], Any]] = None
+        self._loader: Optional[Callable[[UserSession, Any], None]] = None
+
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions: Dict[str, int] = {"lru": 0, "memory": 0, "ttl": 0}
+
+    # ─────────────────────────────────────────────────────────────
+    # ACCESS
+    # ─────────────────────────────────────────────────────────────
+
+    def get(self, user_id: str) -> Optional[UserSession]:
+        """Return a live session and mark it recently used, or None."""
+        with self._lock:
+            self.sweep()
+            session = self._entries.get(user_id)
+            if session is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._touch(session)
+            return session
+
+    def get_or_create(self, user_id: str) -> UserSession:
+        """Return the user's session, creating (and loading) it on a miss.
+
+        Stored state is read without holding the lock, but on the calling
+        thread; code on the event loop uses ``get_or_create_async``.
+        """
+        session = self.get(user_id)
+        if session is None:
+            session = self._insert(user_id, self._fetch_stored(user_id))
+        return session
+
+    async def get_or_create_async(self, user_id: str) -> UserSession:
+        """``get_or_create`` that reads stored state in the default executor."""
+        session = self.get(user_id)
+        if session is None:
+            stored = None
+            if self._fetch is not None:
+                stored = await asyncio.get_running_loop().run_in_executor(None, self._fetch_stored, user_id)
+            session = self._insert(user_id, stored)
+        return session
+
+    def _insert(self, user_id: str, stored: Any) -> UserSession:
+        with self._lock:
+            session = self._entries.get(user_id)
+            if session is not None:
+                # Created by a concurrent request while storage was read
+                self._touch(session)
+                return session
+
+            session = UserSession(user_id)
+            self._load(session, stored)
+            self._entries[user_id] = session
+            self.total_bytes += session.size
+            self._enforce_limits(keep=user_id)
+            return session
+
+    def peek(self, user_id: str) -> Optional[UserSession]:
+        """Look up a session without touching LRU order or counters."""
+        with self._lock:
+            return self._entries.get(user_id)
+
+    def pop(self, user_id: str) -> Optional[UserSession]:
+        """Remove a session explicitly (e.g. /chat/clear); not counted as eviction."""
+        with self._lock:
+            session = self._entries.pop(user_id, None)
+            if session is not None:
+                self.total_bytes -= session.size
+            return session
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _touch(self, session: UserSession):
+        session.last_access = time.monotonic()
+        self._entries.move_to_end(session.user_id)
+
+    def resize(self, user_id: str):
+        """Re-measure a session after it was written, evicting others if it grew too large."""
+        with self._lock:
+            session = self._entries.get(user_id)
+            if session is None:
+                return
+
+            new_size = session.estimate_size()
+            self.total_bytes += new_size - session.size
+            session.size = new_size
+            self._enforce_limits(keep=user_id)
+
+    # ─────────────────────────────────────────────────────────────
+    # LAZY LOADING
+    # ─────────────────────────────────────────────────────────────
+
+    def set_loader(
+        self,
+        loader: Optional[Callable[[UserSession, Any], None]],
+        fetch: Optional[Callable[[str], Any]] = None,
+    ):
+        """Register callbacks that fill a new session from persistent storage.
+
+        ``fetch(user_id)`` does the blocking read and runs without the lock;
+        ``loader(session, stored)`` fills the new session from its result
+        (None without a ``fetch``) under the lock.
+        """
+        self._loader = loader
+        self._fetch = fetch
+
+    def _fetch_stored(self, user_id: str) -> Any:
+        if self._fetch is None:
+            return None
+        try:
+            return self._fetch(user_id)
+        except Exception as e:
+            logger.error(f"Failed to read stored session for user {user_id}: {str(e)}")
+            return None
+
+    def _load(self, session: UserSession, stored: Any):
+        if self._loader is None:
+            return
+        try:
+            self._loader(session, stored)
+        except Exception as e:
+            logger.error(f"Failed to load session for user {session.user_id}: {str(e)}")
+        session.size = session.estimate_size()
+
+    # ─────────────────────────────────────────────────────────────
+    # EVICTION
+    # ─────────────────────────────────────────────────────────────
+
+    def on_evict(self, listener: Callable[[UserSession, str], None]):
+        """Register a callback invoked with (session, reason) on every eviction."""
+        self._listeners.append(listener)
+
+    def sweep(self) -> int:
+        """Evict sessions idle for longer than idle_ttl; returns the count."""
+        if not self.idle_ttl:
+            return 0
+
+        evicted = 0
+        cutoff = time.monotonic() - self.idle_ttl
+        with self._lock:
+            while self._entries:
+                session = next(iter(self._entries.values()))
+                if session.last_access > cutoff:
+                    break
+                self._evict(session, "ttl")
+                evicted += 1
+        return evicted
+
+    def _enforce_limits(self, keep: Optional[str] = None):
+        while len(self._entries) > self.max_entries:
+            if not self._evict_oldest("lru", keep):
+                break
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            if not self._evict_oldest("memory", keep):
+                break
+
+    def _evict_oldest(self, reason: str, keep: Optional[str]) -> bool:
+        for user_id, session in self._entries.items():
+            if user_id != keep:
+                self._evict(session, reason)
+                return True
+        return False
+
+    def _evict(self, session: UserSession, reason: str):
+        del self._entries[session.user_id]
+        self.total_bytes -= session.size
+        self.evictions[reason] += 1
+
+        for listener in self._listeners:
+            try:
+                listener(session, reason)
+            except Exception as e:
+                logger.error(f"Session eviction listener failed: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    # ─────────────────────────────────────────────────────────────
+    # STATS
+    # ─────────────────────────────────────────────────────────────
+
+    def active_counts(self) -> Dict[str, int]:
+        """Sessions holding a user context and a chat session (scans every entry)."""
+        with self._lock:
+            sessions = list(self._entries.values())
+        return {
+            "contexts": sum(1 for session in sessions if session.context is not None),
+            "chats": sum(1 for session in sessions if session.chat is not None),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "idle_ttl": self.idle_ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": dict(self.evictions),
+            }
+
+
+# ─────────────────────────────────────────────────────────────
+# GLOBAL SESSION STORE ACCESSOR
+# ─────────────────────────────────────────────────────────────
+
+_session_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """Return the process-wide SessionStore shared by app and service (singleton pattern)."""
+
+    global _session_store
+
+    if _session_store is None:
+        _session_store = SessionStore(
+            max_entries=int(os.getenv("CHATBOT_MAX_SESSIONS", 10000)),
+            max_bytes=int(float(os.getenv("CHATBOT_SESSION_MEMORY_MB", 512)) * 1024 * 1024),
+            idle_ttl=float(os.getenv("CHATBOT_SESSION_IDLE_TTL", 3600)),
+        )
+
+    return _session_store
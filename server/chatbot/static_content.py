@@ -0,0 +1,183 @@
+import os
+import gzip
+import json
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from chatbot_context import ProgressBrainKnowledgeBase
+from metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Clients and proxies may reuse knowledge-base content for this long, then
+# revalidate it with If-None-Match
+CACHE_MAX_AGE = int(os.getenv("CHATBOT_STATIC_MAX_AGE", 300))
+
+# Responses at least this large also get a gzip copy (0 disables gzip)
+GZIP_MIN_BYTES = int(os.getenv("CHATBOT_STATIC_GZIP_MIN_BYTES", 512))
+
+STATIC_RESPONSES = get_metrics().counter(
+    "static_responses_total", "Pre-serialized knowledge-base responses by content and outcome",
+    ("content", "outcome")
+)
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Whether an Accept-Encoding header allows gzip (q=0 refuses it)."""
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        quality = params.strip().lower()
+        if quality.startswith("q="):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+# ─────────────────────────────────────────────────────────────
+# PRE-SERIALIZED RESPONSE
+# ─────────────────────────────────────────────────────────────
+
+class StaticContent:
+    """A JSON response serialized once, with a content-hash ETag.
+
+    Handlers return it as the payload; the front end picks the answer for
+    the request's If-None-Match and Accept-Encoding headers, so a repeat
+    request costs a header comparison and no serialization.
+    """
+
+    __slots__ = ("name", "body", "etag", "gzip_body", "gzip_etag")
+
+    def __init__(self, name: str, payload: Any, gzip_min_bytes: int = GZIP_MIN_BYTES):
+        self.name = name
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+
+        # mtime=0 keeps the compressed bytes (and so the ETag) stable across restarts
+        self.gzip_body: Optional[bytes] = None
+        self.gzip_etag: Optional[str] = None
+        if gzip_min_bytes and len(self.body) >= gzip_min_bytes:
+            compressed = gzip.compress(self.body, compresslevel=9, mtime=0)
+            if len(compressed) < len(self.body):
+                self.gzip_body = compressed
+                self.gzip_etag = f'"{digest}-gzip"'
+
+    def not_modified(self, if_none_match: Optional[str]) -> bool:
+        """Whether If-None-Match names this content (weak comparison, as RFC 9110 requires)."""
+        if not if_none_match:
+            return False
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        tags = {tag[2:] if tag.startswith("W/") else tag for tag in tags}
+        return "*" in tags or self.etag in tags or (self.gzip_etag is not None and self.gzip_etag in tags)
+
+    def respond(
+        self, if_none_match: Optional[str] = None, accept_encoding: Optional[str] = None
+    ) -> Tuple[int, bytes, Dict[str, str]]:
+        """(status, body, headers) for one request."""
+        gzipped = self.gzip_body is not None and accepts_gzip(accept_encoding)
+        headers = {
+            "ETag": self.gzip_etag if gzipped else self.etag,
+            "Cache-Control": f"public, max-age={CACHE_MAX_AGE}",
+        }
+        if self.gzip_body is not None:
+            headers["Vary"] = "Accept-Encoding"
+
+        if self.not_modified(if_none_match):
+            STATIC_RESPONSES.labels(self.name, "not_modified").inc()
+            return 304, b"", headers
+
+        headers["Content-Type"] = "application/json"
+        if gzipped:
+            headers["Content-Encoding"] = "gzip"
+            STATIC_RESPONSES.labels(self.name, "gzip").inc()
+            return 200, self.gzip_body, headers
+
+        STATIC_RESPONSES.labels(self.name, "identity").inc()
+        return 200, self.body, headers
+
+
+# ─────────────────────────────────────────────────────────────
+# KNOWLEDGE-BASE PAYLOADS
+# ─────────────────────────────────────────────────────────────
+
+def faq_payload() -> Dict:
+    return {
+        "faq": [
+            {"question": item["q"], "answer": item["a"]}
+            for item in ProgressBrainKnowledgeBase.FAQ.values()
+        ]
+    }
+
+
+def features_payload() -> Dict:
+    return {
+        "features": [
+            {"name": name, **data}
+            for name, data in ProgressBrainKnowledgeBase.FEATURES.items()
+        ]
+    }
+
+
+def registration_flow_payload() -> Dict:
+    return {
+        "steps": [
+            {"step": int(key.split("_")[1]), **data}
+            for key, data in ProgressBrainKnowledgeBase.REGISTRATION_FLOW.items()
+        ]
+    }
+
+
+STATIC_PAYLOADS = {
+    "faq": faq_payload,
+    "features": features_payload,
+    "registration_flow": registration_flow_payload,
+}
+
+# GET routes served from pre-serialized content (also answered by the
+# multi-worker dispatcher itself, without a hop to a worker)
+STATIC_ROUTES = {
+    "/chat/faq": "faq",
+    "/chat/features": "features",
+    "/chat/registration-flow": "registration_flow",
+}
+
+
+# ─────────────────────────────────────────────────────────────
+# GLOBAL STATIC CONTENT ACCESSOR
+# ─────────────────────────────────────────────────────────────
+
+_static_content: Optional[Tuple[int, Dict[str, StaticContent]]] = None
+_static_content_lock = threading.Lock()
+
+
+def get_static_content(name: str) -> StaticContent:
+    """Return the pre-serialized response ``name``.
+
+    All of them are built on first use and again only after a runtime
+    addition to the knowledge base (its ``version`` moved).
+    """
+
+    global _static_content
+
+    cached = _static_content
+    if cached is None or cached[0] != ProgressBrainKnowledgeBase.version:
+        with _static_content_lock:
+            cached = _static_content
+            if cached is None or cached[0] != ProgressBrainKnowledgeBase.version:
+                version = ProgressBrainKnowledgeBase.version
+                contents = {key: StaticContent(key, build()) for key, build in STATIC_PAYLOADS.items()}
+                cached = _static_content = (version, contents)
+                logger.info(
+                    f"Pre-serialized static content (knowledge base v{version}): "
+                    + ", ".join(f"{key}={len(content.body)}B" for key, content in contents.items())
+                )
+
+    return cached[1][name]
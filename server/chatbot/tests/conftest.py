@@ -0,0 +1,11 @@
+import os
+import sys
+
+# The chatbot modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Offline backend, in-memory state and no simulated latency for every test
+os.environ.setdefault("CHATBOT_LLM_BACKEND", "fake")
+os.environ.setdefault("CHATBOT_STORE_BACKEND", "none")
+os.environ.setdefault("CHATBOT_FAKE_LATENCY_MS", "0")
+os.environ.setdefault("CHATBOT_FAKE_TOKENS_PER_SEC", "0")
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, UpstreamLimiter, UserRateLimiter
+
+
+def test_user_bucket_allows_a_burst_then_rejects():
+    limiter = UserRateLimiter(rate=1.0, burst=3)
+
+    assert [limiter.acquire("alice") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert 0 < limiter.acquire("alice") <= 1.0
+    assert limiter.acquire("bob") == 0.0
+
+
+def test_user_buckets_are_capped_in_lru_order():
+    limiter = UserRateLimiter(rate=1.0, burst=1, max_users=2)
+    limiter.acquire("alice")
+    limiter.acquire("bob")
+
+    limiter.acquire("carol")
+
+    # alice's empty bucket was dropped, so she starts again with a full one
+    assert limiter.acquire("alice") == 0.0
+
+
+def test_rate_limited_user_is_rejected_with_retry_after():
+    controller = AdmissionController(UserRateLimiter(rate=0.5, burst=1), UpstreamLimiter(1, 1, 1))
+    controller.admit("alice")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("alice")
+
+    assert rejected.value.reason == "rate_limited"
+    assert rejected.value.retry_after_header == "2"
+    assert controller.stats()["rejected"]["rate_limited"] == 1
+
+
+def test_full_upstream_queue_rejects_immediately():
+    async def run():
+        limiter = UpstreamLimiter(max_in_flight=1, max_queue=1, queue_timeout=5)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 1 and limiter.saturated()
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire()
+        assert rejected.value.reason == "queue_full"
+
+        # Releasing hands the slot straight to the queued waiter
+        limiter.release()
+        await waiter
+        assert limiter.in_flight == 1 and limiter.queue_depth == 0
+        return limiter
+
+    limiter = asyncio.run(run())
+    assert (limiter.admitted, limiter.queued, limiter.rejected_full) == (2, 1, 1)
+
+
+def test_queued_call_times_out():
+    async def run():
+        limiter = UpstreamLimiter(max_in_flight=1, max_queue=4, queue_timeout=0.01)
+        await limiter.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire()
+        assert rejected.value.reason == "queue_timeout"
+        assert limiter.queue_depth == 0 and limiter.in_flight == 1
+        return limiter
+
+    assert asyncio.run(run()).rejected_timeout == 1
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        limiter = UpstreamLimiter(max_in_flight=1, max_queue=4, queue_timeout=5)
+        async with limiter.slot():
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            assert limiter.queue_depth == 0
+        return limiter
+
+    assert asyncio.run(run()).in_flight == 0
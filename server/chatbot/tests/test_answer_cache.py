@@ -0,0 +1,92 @@
+import pytest
+
+from answer_cache import StudyAnswerCache, normalize_text
+
+
+def cache_with(topic: str, question: str, **kwargs) -> StudyAnswerCache:
+    cache = StudyAnswerCache(**kwargs)
+    cache.store("History", topic, question, "cached answer")
+    return cache
+
+
+def test_exact_hit_ignores_case_whitespace_and_punctuation():
+    cache = cache_with("Photosynthesis", "What does chlorophyll do?")
+
+    hit = cache.lookup("history", "  photosynthesis ", "what does Chlorophyll do")
+
+    assert hit is not None and hit.match == "exact"
+    assert cache.exact_hits == 1
+
+
+def test_reordered_or_padded_question_is_a_similar_hit():
+    cache = cache_with("Photosynthesis", "explain how chlorophyll absorbs sunlight during photosynthesis reactions")
+
+    hit = cache.lookup("History", "Photosynthesis",
+                       "please explain how chlorophyll absorbs sunlight during photosynthesis reactions")
+
+    assert hit is not None and hit.match == "similar"
+    assert hit.answer == "cached answer"
+
+
+def test_other_subject_misses():
+    cache = cache_with("Photosynthesis", "What does chlorophyll do?")
+
+    assert cache.lookup("Biology", "Photosynthesis", "What does chlorophyll do?") is None
+    assert cache.misses == 1
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("What caused World War I", "What caused World War II"),
+    ("explain the difference between a strong acid in water", "explain the difference between a strong base in water"),
+    ("differentiate x^2 with respect to x", "differentiate x^3 with respect to x"),
+    ("what is 2+3", "what is 2*3"),
+    ("summarize the causes of the french revolution in 1789", "summarize the causes of the french revolution in 1830"),
+])
+def test_near_miss_questions_are_not_served_each_others_answers(cached, asked):
+    cache = cache_with("Exam revision", cached)
+
+    assert cache.lookup("History", "Exam revision", asked) is None
+
+
+def test_math_operators_survive_normalization():
+    assert normalize_text("2+3") != normalize_text("2*3")
+    assert normalize_text("2+3") == normalize_text("2 + 3")
+    assert normalize_text("x^2") == "x ^ 2"
+    assert normalize_text("What's 3.5 / 7?") == "whats 3.5 / 7"
+
+
+def test_explicit_zero_threshold_is_kept(monkeypatch):
+    monkeypatch.setenv("CHATBOT_STUDY_CACHE_THRESHOLD", "0.95")
+
+    assert StudyAnswerCache(threshold=0.0).threshold == 0.0
+    assert StudyAnswerCache().threshold == 0.95
+
+
+def test_least_recently_used_answer_is_evicted():
+    cache = StudyAnswerCache(max_entries=2)
+    cache.store("Math", "Algebra", "solve 2x = 4", "x = 2")
+    cache.store("Math", "Algebra", "solve 3x = 9", "x = 3")
+    assert cache.lookup("Math", "Algebra", "solve 2x = 4") is not None
+
+    cache.store("Math", "Algebra", "solve 4x = 16", "x = 4")
+
+    assert cache.evictions == 1
+    assert cache.lookup("Math", "Algebra", "solve 3x = 9") is None
+    assert cache.lookup("Math", "Algebra", "solve 2x = 4").answer == "x = 2"
+    assert cache.stats()["entries"] == 2
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("name every planet of the solar system in order from the sun and describe their largest moons",
+     "name every planet of the solar system except earth in order from the sun and describe their largest moons"),
+    ("which european countries have used the euro as their national currency since the union began",
+     "which european countries have never used the euro as their national currency since the union began"),
+    ("explain which chemical elements behave like typical metals across the periodic table groups",
+     "explain which chemical elements dont behave like typical metals across the periodic table groups"),
+    ("list the major battles fought during the american civil war between union and confederate armies",
+     "list only the major battles fought during the american civil war between union and confederate armies"),
+])
+def test_negating_or_restricting_word_prevents_a_similar_hit(cached, asked):
+    cache = cache_with("Exam revision", cached)
+
+    assert cache.lookup("History", "Exam revision", asked) is None
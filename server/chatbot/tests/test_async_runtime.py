@@ -0,0 +1,44 @@
+import asyncio
+import contextvars
+
+from async_runtime import create_task_in
+from resilience import detached_context, remaining_time, request_deadline
+
+request_tag = contextvars.ContextVar("request_tag", default=None)
+
+
+def test_task_in_fresh_context_sees_none_of_the_callers_variables():
+    async def read_tag():
+        return request_tag.get()
+
+    async def run():
+        request_tag.set("req-1")
+        return await create_task_in(contextvars.Context(), read_tag())
+
+    assert asyncio.run(run()) is None
+
+
+def test_detached_task_keeps_request_variables_but_not_the_deadline():
+    async def read():
+        return request_tag.get(), remaining_time()
+
+    async def run():
+        request_tag.set("req-1")
+        with request_deadline(5000):
+            assert remaining_time() is not None
+            return await create_task_in(detached_context(), read())
+
+    assert asyncio.run(run()) == ("req-1", None)
+
+
+def test_task_changes_do_not_leak_back_into_the_context():
+    context = contextvars.Context()
+
+    async def write():
+        request_tag.set("inside")
+
+    async def run():
+        await create_task_in(context, write())
+
+    asyncio.run(run())
+    assert context.get(request_tag) is None
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+
+import pytest
+
+from chatbot_context import ChatbotContext, UserProfile
+from conversation_store import ConversationPersistence, SQLiteConversationStore
+from llm_backends import FakeLLMBackend, model_content, user_content
+from session_store import SessionStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "state.db")
+
+
+def open_store(path: str):
+    persistence = ConversationPersistence(SQLiteConversationStore(path), flush_interval=60)
+    sessions = SessionStore()
+    persistence.install(sessions, restore_chat=lambda history: FakeLLMBackend().start_chat(history))
+    return persistence, sessions
+
+
+def fill_session(sessions: SessionStore, user_id: str):
+    session = sessions.get_or_create(user_id)
+    session.context = ChatbotContext(UserProfile(user_id=user_id, name="Alice", study_level="University"))
+    session.context.memory.add_exchange("What is a streak?", "Days in a row you studied.")
+    session.context.interaction_count = 3
+    session.chat = FakeLLMBackend().start_chat([user_content("hi"), model_content("hello")])
+    return session
+
+
+def test_session_round_trips_through_sqlite(db_path):
+    persistence, sessions = open_store(db_path)
+    saved = fill_session(sessions, "alice")
+    persistence.save(saved)
+    persistence.close()
+
+    persistence, sessions = open_store(db_path)
+    session = asyncio.run(sessions.get_or_create_async("alice"))
+
+    assert session.context.user_profile.name == "Alice"
+    assert session.context.user_profile.study_level == "University"
+    assert session.context.interaction_count == 3
+    assert session.context.memory.snapshot() == saved.context.memory.snapshot()
+    assert [content["parts"][0]["text"] for content in session.chat.history] == ["hi", "hello"]
+    assert persistence.stats()["loads"] == 1
+    persistence.close()
+
+
+def test_async_load_reads_storage_off_the_event_loop(db_path):
+    persistence, sessions = open_store(db_path)
+    persistence.save(fill_session(sessions, "alice"))
+    persistence.flush()
+    sessions.clear()
+
+    reader_threads = []
+    fetch = persistence.fetch
+
+    def recording_fetch(user_id):
+        reader_threads.append(threading.current_thread())
+        return fetch(user_id)
+
+    sessions.set_loader(persistence.load_session, fetch=recording_fetch)
+    session = asyncio.run(sessions.get_or_create_async("alice"))
+
+    assert session.context.user_profile.name == "Alice"
+    assert reader_threads and threading.main_thread() not in reader_threads
+    persistence.close()
+
+
+def test_unflushed_snapshot_wins_over_stored_one(db_path):
+    persistence, sessions = open_store(db_path)
+    session = fill_session(sessions, "alice")
+    persistence.save(session)
+    persistence.flush()
+
+    session.context.user_profile.name = "Alice B."
+    persistence.save(session)
+    sessions.clear()
+
+    assert sessions.get_or_create("alice").context.user_profile.name == "Alice B."
+    persistence.close()
+
+
+def test_evicted_user_is_reloaded_and_cleared_user_is_not(db_path):
+    persistence, sessions = open_store(db_path)
+    sessions.on_evict(lambda session, reason: persistence.save(session))
+    sessions.max_entries = 1
+    fill_session(sessions, "alice")
+    fill_session(sessions, "bob")
+    assert "alice" not in sessions
+
+    alice = sessions.get_or_create("alice")
+    assert alice.context.user_profile.name == "Alice"
+
+    persistence.delete("bob")
+    persistence.flush()
+    sessions.pop("bob")
+    assert sessions.get_or_create("bob").context is None
+    persistence.close()
+
+
+def test_flush_between_fetch_and_load_keeps_the_snapshot(db_path):
+    persistence, sessions = open_store(db_path)
+    persistence.save(fill_session(sessions, "alice"))
+    sessions.clear()
+
+    fetch = persistence.fetch
+
+    def fetch_then_flush(user_id):
+        stored = fetch(user_id)
+        persistence.flush()
+        return stored
+
+    sessions.set_loader(persistence.load_session, fetch=fetch_then_flush)
+    session = asyncio.run(sessions.get_or_create_async("alice"))
+
+    assert session.context.user_profile.name == "Alice"
+    assert [content["parts"][0]["text"] for content in session.chat.history] == ["hi", "hello"]
+    persistence.close()
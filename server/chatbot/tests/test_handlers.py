@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+import handlers
+
+
+def run(handler, data):
+    return handlers.split_result(asyncio.run(handler(data)))
+
+
+POST_ROUTES = {
+    path: handler
+    for (method, path), handler in {**handlers.ROUTES, **handlers.INTERNAL_ROUTES}.items()
+    if method == "POST"
+}
+
+
+@pytest.mark.parametrize("path", sorted(POST_ROUTES))
+@pytest.mark.parametrize("body", [["user_id", "u1"], "hello", 42, None])
+def test_post_routes_reject_non_object_bodies(path, body):
+    payload, status, _ = run(POST_ROUTES[path], body)
+
+    assert status == 400
+    assert payload["error"] == "Request body must be a JSON object"
+
+
+@pytest.mark.parametrize("handler", [handlers.generate_response, handlers.generate_response_stream])
+def test_chat_handlers_require_user_and_message(handler):
+    payload, status, _ = run(handler, {"user_id": "u1"})
+
+    assert status == 400
+    assert "required" in payload["error"]
+
+
+def test_stream_sends_events_for_a_chat_turn():
+    async def collect():
+        payload, status, _ = handlers.split_result(await handlers.generate_response_stream({
+            "user_id": "stream-user",
+            "user_message": "Can you help me plan my chemistry revision this week?",
+        }))
+        return status, "".join([event async for event in payload])
+
+    status, events = asyncio.run(collect())
+
+    assert status == 200
+    assert events.startswith("data: ") and "event: done" in events
+
+
+def test_chat_turn_records_prompt_token_histogram():
+    histogram = handlers.get_metrics().histogram("prompt_tokens", "")
+    before = {part: sum(histogram.labels(part).counts) for part in ("system", "history", "turn", "total")}
+
+    run(handlers.generate_response, {
+        "user_id": "token-user",
+        "user_message": "Explain how I should split my week between physics and history revision",
+    })
+
+    for part, count in before.items():
+        assert sum(histogram.labels(part).counts) == count + 1
+    assert "chatbot_prompt_tokens_bucket" in handlers.get_metrics().render()
+
+
+@pytest.mark.parametrize("concurrency", ["x", "4", 2.5, True, [1]])
+def test_batch_rejects_non_integer_concurrency(concurrency):
+    payload, status, _ = run(handlers.batch, {
+        "operations": [{"op": "motivation", "data": {"user_id": "u1"}}],
+        "concurrency": concurrency,
+    })
+
+    assert status == 400
+    assert payload["error"] == "concurrency must be an integer"
+
+
+def test_batch_answers_malformed_item_data_per_item():
+    payload, status, _ = run(handlers.batch, {
+        "user_id": "batch-user",
+        "operations": [
+            {"id": "bad", "op": "motivation", "data": ["not", "an", "object"]},
+            {"id": "text", "op": "feature-info", "data": "study streak"},
+            {"id": "ok", "op": "feature-info", "data": {"feature": "study_sessions"}},
+        ],
+    })
+
+    assert status == 200
+    results = {item["id"]: item for item in payload["results"]}
+    assert results["bad"]["status"] == 400 and results["bad"]["error"] == "data must be a JSON object"
+    assert results["text"]["status"] == 400
+    assert results["ok"]["status"] == 200
+    assert (payload["succeeded"], payload["failed"]) == (1, 2)
@@ -0,0 +1,65 @@
+import json
+import asyncio
+
+import pytest
+
+import asgi
+import handlers
+
+
+def call(path: str, body: dict, client=("127.0.0.1", 50000), headers=()):
+    """(status, payload) of one request through the ASGI app."""
+    messages = []
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "method": "POST", "path": path, "query_string": b"",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+        "client": client,
+    }
+    asyncio.run(asgi.app(scope, receive, send))
+    body = b"".join(message.get("body", b"") for message in messages if message["type"] == "http.response.body")
+    return messages[0]["status"], json.loads(body)
+
+
+@pytest.fixture
+def worker_secret(monkeypatch):
+    monkeypatch.setattr(handlers, "WORKER_SECRET", "s3cret")
+    monkeypatch.setitem(handlers.ROUTES, ("POST", "/internal/handoff"), handlers.handoff_users)
+    return "s3cret"
+
+
+def test_handoff_is_not_served_outside_multi_worker_mode():
+    assert ("POST", "/internal/handoff") not in handlers.ROUTES
+    assert call("/internal/handoff", {"user_ids": ["alice"]})[0] == 404
+
+
+def test_handoff_requires_the_dispatcher_secret(worker_secret):
+    assert call("/internal/handoff", {"user_ids": ["alice"]})[0] == 403
+    assert call("/internal/handoff", {"user_ids": ["alice"]}, headers=[("X-Worker-Secret", "guess")])[0] == 403
+
+
+def test_handoff_accepts_only_loopback_callers(worker_secret):
+    status, _ = call(
+        "/internal/handoff", {"user_ids": ["alice"]},
+        client=("10.1.2.3", 50000), headers=[("X-Worker-Secret", worker_secret)],
+    )
+    assert status == 403
+
+
+def test_dispatcher_reaches_handoff(worker_secret):
+    status, payload = call("/internal/handoff", {"user_ids": ["alice"]}, headers=[("X-Worker-Secret", worker_secret)])
+
+    # Reached the handler; this test process runs without a conversation store
+    assert status == 409
+    assert "conversation store" in payload["error"]
@@ -0,0 +1,130 @@
+import asyncio
+
+from multiworker import Dispatcher, HashRing
+
+USERS = [f"user-{i}" for i in range(2000)]
+
+
+class LiveProcess:
+    pid = 0
+
+    def is_alive(self) -> bool:
+        return True
+
+
+def ring_with(*nodes: int) -> HashRing:
+    ring = HashRing()
+    for node in nodes:
+        ring.add(node)
+    return ring
+
+
+def dispatcher_with(*nodes: int, **kwargs) -> Dispatcher:
+    dispatcher = Dispatcher(len(nodes), **kwargs)
+    for node in nodes:
+        dispatcher.ring.add(node)
+        dispatcher.processes[node] = LiveProcess()
+    return dispatcher
+
+
+# ─────────────────────────────────────────────────────────────
+# CONSISTENT HASH RING
+# ─────────────────────────────────────────────────────────────
+
+def test_adding_a_worker_moves_only_its_share_of_users_to_it():
+    before, after = ring_with(0, 1, 2), ring_with(0, 1, 2, 3)
+
+    moved = [user for user in USERS if before.lookup(user) != after.lookup(user)]
+
+    assert all(after.lookup(user) == 3 for user in moved)
+    assert 0.15 < len(moved) / len(USERS) < 0.35
+
+
+def test_removing_a_worker_moves_only_its_users():
+    before, after = ring_with(0, 1, 2, 3), ring_with(0, 1, 2, 3)
+    after.remove(1)
+
+    for user in USERS:
+        if before.lookup(user) != 1:
+            assert after.lookup(user) == before.lookup(user)
+        else:
+            assert after.lookup(user) in (0, 2, 3)
+
+
+# ─────────────────────────────────────────────────────────────
+# DISPATCHER OWNERSHIP
+# ─────────────────────────────────────────────────────────────
+
+def test_routed_users_expire_after_the_worker_idle_ttl():
+    dispatcher = dispatcher_with(0, 1, owner_ttl=60)
+    dispatcher.route("alice")
+    dispatcher.route("bob")
+    worker, seen = dispatcher.owners["alice"]
+    dispatcher.owners["alice"] = (worker, seen - 120)
+
+    dispatcher.route("carol")
+
+    assert list(dispatcher.owners) == ["bob", "carol"]
+
+
+def test_routed_users_are_capped_per_worker():
+    dispatcher = dispatcher_with(0, 1, max_owners_per_worker=5)
+
+    for user in USERS[:50]:
+        dispatcher.route(user)
+
+    assert list(dispatcher.owners) == USERS[40:50]
+
+
+def test_rebalance_holds_only_moved_users_until_their_handoff():
+    dispatcher = dispatcher_with(0, 1)
+    for user in USERS[:300]:
+        dispatcher.route(user)
+    handoffs = {}
+
+    async def run():
+        gate = asyncio.Event()
+
+        async def handoff(worker_id, user_ids):
+            handoffs[worker_id] = list(user_ids)
+            await gate.wait()
+
+        dispatcher._handoff = handoff
+        dispatcher.ring.add(2)
+        dispatcher.processes[2] = LiveProcess()
+        rebalance = asyncio.ensure_future(dispatcher._rebalance())
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        moved = {user for user in USERS[:300] if dispatcher.ring.lookup(user) == 2}
+        assert moved and set(dispatcher._moving) == moved
+        assert set(handoffs) == {0, 1}
+        assert {user for users in handoffs.values() for user in users} == moved
+
+        gate.set()
+        await rebalance
+
+    asyncio.run(run())
+
+    assert dispatcher._moving == {}
+    assert all(dispatcher.owners[user][0] == dispatcher.ring.lookup(user) for user in USERS[:300])
+    assert dispatcher.rebalances == 1
+
+
+def test_users_of_a_dead_worker_move_without_handoff():
+    dispatcher = dispatcher_with(0, 1, 2)
+    for user in USERS[:300]:
+        dispatcher.route(user)
+    handoffs = []
+
+    async def handoff(worker_id, user_ids):
+        handoffs.append(worker_id)
+
+    dispatcher._handoff = handoff
+    orphaned = [user for user in USERS[:300] if dispatcher.owners[user][0] == 1]
+    dispatcher.ring.remove(1)
+    asyncio.run(dispatcher._rebalance(dead=1))
+
+    assert handoffs == []
+    assert dispatcher.users_moved == len(orphaned)
+    assert all(dispatcher.owners[user][0] in (0, 2) for user in USERS[:300])
@@ -0,0 +1,162 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import pytest
+
+from admission import AdmissionRejected, AdmittedBackend, UpstreamLimiter
+from llm_backends import LLMBackend, LLMBackendError
+from resilience import CircuitBreaker, CircuitOpenError, ResilientBackend
+
+
+class ScriptedBackend(LLMBackend):
+    """Fails with the queued statuses, then answers "ok"."""
+
+    name = "scripted"
+
+    def __init__(self, failures: Optional[List[int]] = None):
+        super().__init__("scripted-model")
+        self.failures = list(failures or [])
+        self.calls = 0
+
+    async def complete(self, contents: List[Dict], system_instruction: Optional[Dict] = None) -> str:
+        self.calls += 1
+        if self.failures:
+            raise LLMBackendError(self.failures.pop(0), "scripted failure")
+        return "ok"
+
+    async def stream(self, contents: List[Dict], system_instruction: Optional[Dict] = None):
+        yield await self.complete(contents, system_instruction)
+
+
+def open_breaker(breaker: CircuitBreaker):
+    while breaker.state != CircuitBreaker.OPEN:
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def elapse_reset_timeout(breaker: CircuitBreaker):
+    breaker.opened_at -= breaker.reset_timeout
+
+
+# ─────────────────────────────────────────────────────────────
+# CIRCUIT BREAKER STATES
+# ─────────────────────────────────────────────────────────────
+
+def test_breaker_opens_after_consecutive_failures_and_short_circuits():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    open_breaker(breaker)
+
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.short_circuited == 1
+
+
+def test_half_open_breaker_admits_one_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    open_breaker(breaker)
+    elapse_reset_timeout(breaker)
+
+    breaker.before_call()
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_probe_success_closes_and_probe_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    open_breaker(breaker)
+    elapse_reset_timeout(breaker)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+
+    elapse_reset_timeout(breaker)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+
+
+def test_released_probe_lets_the_next_call_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    open_breaker(breaker)
+    elapse_reset_timeout(breaker)
+    breaker.before_call()
+
+    breaker.release_probe()
+
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+# ─────────────────────────────────────────────────────────────
+# RESILIENT BACKEND
+# ─────────────────────────────────────────────────────────────
+
+def test_transient_failures_are_retried_and_open_the_breaker():
+    backend = ScriptedBackend(failures=[503, 503])
+    resilient = ResilientBackend(backend, CircuitBreaker(failure_threshold=3), max_retries=2, base_delay=0)
+
+    assert asyncio.run(resilient.complete([])) == "ok"
+    assert backend.calls == 3
+    assert resilient.retries == 2
+    assert resilient.breaker.state == CircuitBreaker.CLOSED
+
+    backend.failures = [503] * 3
+    with pytest.raises(LLMBackendError):
+        asyncio.run(resilient.complete([]))
+    assert resilient.breaker.state == CircuitBreaker.OPEN
+
+
+def test_client_errors_are_not_retried_and_keep_the_breaker_closed():
+    backend = ScriptedBackend(failures=[400])
+    resilient = ResilientBackend(backend, CircuitBreaker(failure_threshold=1), max_retries=2, base_delay=0)
+
+    with pytest.raises(LLMBackendError):
+        asyncio.run(resilient.complete([]))
+
+    assert backend.calls == 1
+    assert resilient.breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.parametrize("call", ["complete", "stream"])
+def test_admission_rejection_during_half_open_probe_leaves_breaker_alone(call):
+    limiter = UpstreamLimiter(max_in_flight=1, max_queue=0, queue_timeout=1)
+    backend = ScriptedBackend()
+    resilient = ResilientBackend(
+        AdmittedBackend(backend, limiter), CircuitBreaker(failure_threshold=2, reset_timeout=30),
+        max_retries=0,
+    )
+    errors = resilient._errors.labels("connection")
+    open_breaker(resilient.breaker)
+    elapse_reset_timeout(resilient.breaker)
+
+    async def run():
+        if call == "complete":
+            return await resilient.complete([])
+        return "".join([chunk async for chunk in resilient.stream([])])
+
+    limiter.in_flight = 1  # every upstream slot busy, no queue: queue_full
+    errors_before = errors.value
+    with pytest.raises(AdmissionRejected):
+        asyncio.run(run())
+
+    breaker = resilient.breaker
+    assert backend.calls == 0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.failures == 2
+    assert errors.value == errors_before
+
+    # The probe slot was released, so the next admitted call probes and closes
+    limiter.in_flight = 0
+    assert asyncio.run(run()) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,90 @@
+from session_store import SESSION_OVERHEAD_BYTES, SessionStore
+
+
+class Sized:
+    def __init__(self, size: int):
+        self.size = size
+
+    def estimate_size(self) -> int:
+        return self.size
+
+
+def evicted_users(store: SessionStore):
+    evicted = []
+    store.on_evict(lambda session, reason: evicted.append((session.user_id, reason)))
+    return evicted
+
+
+def test_least_recently_used_session_is_evicted():
+    store = SessionStore(max_entries=2, idle_ttl=0)
+    evicted = evicted_users(store)
+    store.get_or_create("alice")
+    store.get_or_create("bob")
+    store.get("alice")
+
+    store.get_or_create("carol")
+
+    assert evicted == [("bob", "lru")]
+    assert "alice" in store and "carol" in store
+    assert store.evictions["lru"] == 1
+
+
+def test_memory_limit_evicts_oldest_but_keeps_the_current_user():
+    store = SessionStore(max_entries=10, max_bytes=3 * SESSION_OVERHEAD_BYTES, idle_ttl=0)
+    evicted = evicted_users(store)
+    store.get_or_create("alice")
+    store.get_or_create("bob")
+
+    carol = store.get_or_create("carol")
+    carol.context = Sized(SESSION_OVERHEAD_BYTES)
+    store.resize("carol")
+
+    assert evicted == [("alice", "memory")]
+    assert store.total_bytes == 3 * SESSION_OVERHEAD_BYTES
+
+
+def test_get_does_not_remeasure_sessions():
+    store = SessionStore(idle_ttl=0)
+    measured = []
+    alice = store.get_or_create("alice")
+    alice.context = Sized(100)
+    alice.context.estimate_size = lambda: measured.append("alice") or 100
+
+    store.get("alice")
+    store.get_or_create("alice")
+    assert measured == [] and store.total_bytes == SESSION_OVERHEAD_BYTES
+
+    store.resize("alice")
+    assert measured == ["alice"] and store.total_bytes == SESSION_OVERHEAD_BYTES + 100
+
+
+def test_idle_sessions_expire():
+    store = SessionStore(idle_ttl=60)
+    evicted = evicted_users(store)
+    store.get_or_create("alice").last_access -= 120
+    store.get_or_create("bob")
+
+    assert store.get("alice") is None
+    assert evicted == [("alice", "ttl")]
+    assert store.get("bob") is not None
+
+
+def test_pop_is_not_an_eviction():
+    store = SessionStore()
+    evicted = evicted_users(store)
+    store.get_or_create("alice")
+
+    assert store.pop("alice").user_id == "alice"
+    assert evicted == [] and len(store) == 0 and store.total_bytes == 0
+
+
+def test_loader_fills_new_sessions_only():
+    store = SessionStore()
+    loaded = []
+    store.set_loader(lambda session, stored: loaded.append((session.user_id, stored)), fetch=str.upper)
+
+    store.get_or_create("alice")
+    store.get_or_create("alice")
+
+    assert loaded == [("alice", "ALICE")]
+    assert (store.hits, store.misses) == (1, 1)
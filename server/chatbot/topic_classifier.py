@@ -0,0 +1,115 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Topic -> keywords and phrases, matched as whole words. Order breaks ties
+# between equally scored topics. Inflected forms are listed explicitly so
+# that e.g. "update" does not fire on "updated" by accident.
+TOPIC_KEYWORDS: Dict[str, List[str]] = {
+    "registration": [
+        "register", "registration", "registering", "sign up", "signup",
+        "create account", "create an account", "onboarding",
+    ],
+    "study_sessions": [
+        "study", "studying", "session", "sessions", "timer", "focus",
+        "concentrate", "pomodoro",
+    ],
+    "streaks": ["streak", "streaks", "consistency", "daily study"],
+    "reports": ["report", "reports", "analytics", "statistics", "stats", "insights"],
+    "settings": ["settings", "setting", "preferences", "profile", "update"],
+    "features": ["feature", "features", "explain", "tell me about"],
+    "help": ["help", "support", "issue", "problem", "error", "bug"],
+    "motivation": ["motivation", "motivate", "motivated", "encourage", "tip", "tips"],
+}
+
+DEFAULT_TOPIC = "general"
+
+
+# ─────────────────────────────────────────────────────────────
+# COMPILED KEYWORD CLASSIFIER
+# ─────────────────────────────────────────────────────────────
+
+class TopicClassifier:
+    """Keyword topic classifier compiled once from a keyword table.
+
+    Messages are split into words with one precompiled regex and each word
+    is looked up once in a hash index; phrases are only checked where their
+    first word occurs. Matching is on whole words, so a message is scanned
+    once regardless of table size. Every hit adds the keyword's word count
+    to its topic's score (phrases are stronger evidence than single words);
+    the best-scoring topic wins, ties going to the earlier table entry.
+    """
+
+    _WORD_RE = re.compile(r"[a-z0-9]+")
+
+    def __init__(self, keywords: Dict[str, List[str]] = TOPIC_KEYWORDS, default: str = DEFAULT_TOPIC):
+        self.default = default
+        self.topic_order = {topic: i for i, topic in enumerate(keywords)}
+
+        # word -> ([(topic, weight)], [(remaining phrase words, topic, weight)])
+        self._index: Dict[str, Tuple[List[Tuple[str, int]], List[Tuple[Tuple[str, ...], str, int]]]] = {}
+
+        for topic, phrases in keywords.items():
+            for phrase in phrases:
+                words = tuple(self._WORD_RE.findall(phrase.lower()))
+                if not words:
+                    continue
+                singles, multi = self._index.setdefault(words[0], ([], []))
+                if len(words) == 1:
+                    singles.append((topic, 1))
+                else:
+                    multi.append((words[1:], topic, len(words)))
+
+    def scores(self, text: str) -> Dict[str, int]:
+        """Score every topic with at least one keyword hit."""
+        totals: Dict[str, int] = {}
+        if not text:
+            return totals
+
+        words = self._WORD_RE.findall(text.lower())
+        index = self._index
+
+        for i, word in enumerate(words):
+            entry = index.get(word)
+            if entry is None:
+                continue
+
+            singles, multi = entry
+            for topic, weight in singles:
+                totals[topic] = totals.get(topic, 0) + weight
+            for rest, topic, weight in multi:
+                if tuple(words[i + 1:i + 1 + len(rest)]) == rest:
+                    totals[topic] = totals.get(topic, 0) + weight
+
+        return totals
+
+    def classify_with_score(self, text: str) -> Tuple[str, int]:
+        totals = self.scores(text)
+        if not totals:
+            return self.default, 0
+        if len(totals) == 1:
+            return next(iter(totals.items()))
+        topic = max(totals, key=lambda t: (totals[t], -self.topic_order[t]))
+        return topic, totals[topic]
+
+    def classify(self, text: str) -> str:
+        return self.classify_with_score(text)[0]
+
+    def classify_many(self, texts: Iterable[str]) -> List[str]:
+        """Classify a batch of messages, hoisting attribute lookups out of the loop."""
+        classify = self.classify_with_score
+        return [classify(text)[0] for text in texts]
+
+
+_default_classifier: Optional[TopicClassifier] = None
+
+
+def get_topic_classifier() -> TopicClassifier:
+    """Return the shared TopicClassifier compiled from TOPIC_KEYWORDS (singleton pattern)."""
+
+    global _default_classifier
+
+    if _default_classifier is None:
+        _default_classifier = TopicClassifier()
+
+    return _default_classifier
@@ -1,5 +1,6 @@
 import express from "express";
 import axios from "axios";
+import { randomUUID } from "crypto";
 import { protect } from "../middleware/authMiddleware.js";
 import UserModel from "../models/userModel.js";
 import StudySessionModel from "../models/studySessionModel.js";
@@ -12,6 +13,31 @@ const conversationContexts = new Map();
 // Python backend URL (where chatbot service runs)
 const CHATBOT_API_URL = process.env.CHATBOT_API_URL || "http://localhost:5001";
 
+// Every chat request gets an ID that is forwarded to the Python service and
+// echoed back, so Node and Python log lines of one request can be joined
+router.use((req, res, next) => {
+  req.requestId = req.get("X-Request-ID") || randomUUID();
+  res.set("X-Request-ID", req.requestId);
+  next();
+});
+
+// axios options for calls to the Python service
+const chatbotRequestOptions = (req, timeout = 15000) => ({
+  timeout,
+  headers: {
+    "Content-Type": "application/json",
+    "X-Request-ID": req.requestId,
+  },
+});
+
+// One line per failed call; message text is never logged
+const logChatbotError = (req, path, error) => {
+  console.error(
+    `[${req.requestId}] chatbot ${path} failed: ` +
+      `${error.response?.status ?? error.code ?? "error"} ${error.message}`
+  );
+};
+
 /**
  * Initialize or get user's chatbot context
  * POST /api/chat/init
@@ -102,9 +128,6 @@ router.post("/message", protect, async (req, res) => {
 
     // Call Python chatbot service
     try {
-      console.log(`📤 Calling Flask at: ${CHATBOT_API_URL}/chat/generate`);
-      console.log(`💬 Message from user ${userId}: ${message}`);
-      
       // Prepare minimal context for Python service
       const minimalContext = {
         user_id: userId,
@@ -114,9 +137,7 @@ router.post("/message", protect, async (req, res) => {
         subjects_of_interest: context.subjects_of_interest || [],
         is_registered: context.is_registered || true,
       };
-      
-      console.log(`🔗 Making request to ${CHATBOT_API_URL}/chat/generate`);
-      
+
       const chatResponse = await axios.post(
         `${CHATBOT_API_URL}/chat/generate`,
         {
@@ -126,16 +147,9 @@ router.post("/message", protect, async (req, res) => {
           subject: subject,
           topic: topic,
         },
-        {
-          timeout: 15000, // 15 second timeout
-          headers: {
-            "Content-Type": "application/json",
-          },
-        }
+        chatbotRequestOptions(req)
       );
 
-      console.log(`✅ Flask responded successfully with status ${chatResponse.status}`);
-
       // Update last message in context
       if (!context.last_messages) {
         context.last_messages = [];
@@ -157,14 +171,7 @@ router.post("/message", protect, async (req, res) => {
         timestamp: new Date().toISOString(),
       });
     } catch (pythonError) {
-      console.error("❌ Python chatbot service error:", pythonError.message);
-      console.error("Error details:", {
-        url: `${CHATBOT_API_URL}/chat/generate`,
-        status: pythonError.response?.status,
-        statusText: pythonError.response?.statusText,
-        data: pythonError.response?.data,
-        code: pythonError.code,
-      });
+      logChatbotError(req, "/chat/generate", pythonError);
 
       // Fallback response if Python service is unavailable
       const fallbackResponses = {
@@ -219,13 +226,15 @@ router.post("/explain-feature", protect, async (req, res) => {
       const chatResponse = await axios.post(`${CHATBOT_API_URL}/chat/feature-info`, {
         feature: feature,
         user_id: userId,
-      });
+      }, chatbotRequestOptions(req));
 
       res.json({
         success: true,
         explanation: chatResponse.data.explanation,
       });
     } catch (pythonError) {
+      logChatbotError(req, "/chat/feature-info", pythonError);
+
       // Fallback explanations
       const explanations = {
         study_sessions:
@@ -274,7 +283,8 @@ router.post("/registration-help", protect, async (req, res) => {
         {
           step: step,
           user_id: userId,
-        }
+        },
+        chatbotRequestOptions(req)
       );
 
       res.json({
@@ -282,6 +292,8 @@ router.post("/registration-help", protect, async (req, res) => {
         guidance: chatResponse.data.guidance,
       });
     } catch (pythonError) {
+      logChatbotError(req, "/chat/registration-guidance", pythonError);
+
       const stepGuidance = {
         1: "Welcome! Let's start by creating your account. Choose a strong password and verify your email address. This ensures your account is secure!",
         2: "Now let's set up your profile! Tell us your name and what you'd like to study. This helps us personalize your experience.",
@@ -323,13 +335,15 @@ router.post("/study-help", protect, async (req, res) => {
         topic: topic,
         question: question,
         user_id: userId,
-      });
+      }, chatbotRequestOptions(req));
 
       res.json({
         success: true,
         help: chatResponse.data.help,
       });
     } catch (pythonError) {
+      logChatbotError(req, "/chat/study-help", pythonError);
+
       const genericHelp = `I'd be happy to help you understand ${topic} in ${subject}! Your question was: "${question.substring(0, 50)}...". 
 
 Try breaking down the problem into smaller parts, looking for examples, or relating it to something you already know. What part is most confusing?`;
@@ -376,7 +390,8 @@ router.get("/motivation", protect, async (req, res) => {
           user_name: user.name,
           streak: streak,
           user_id: userId,
-        }
+        },
+        chatbotRequestOptions(req)
       );
 
       res.json({
@@ -384,6 +399,8 @@ router.get("/motivation", protect, async (req, res) => {
         message: chatResponse.data.message,
       });
     } catch (pythonError) {
+      logChatbotError(req, "/chat/motivation", pythonError);
+
       const motivations = [
         `${user.name}, you're doing amazing! Keep up this momentum!`,
         `Every study session brings you closer to your goals. You've got this!`,
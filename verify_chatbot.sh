@@ -88,11 +88,11 @@ else
     ((CHECKS_FAILED++))
 fi
 
-if python3 -c "import google.generativeai" 2>/dev/null; then
-    echo -e "${GREEN}✓${NC} google-generativeai installed"
+if python3 -c "import aiohttp" 2>/dev/null; then
+    echo -e "${GREEN}✓${NC} aiohttp installed"
     ((CHECKS_PASSED++))
 else
-    echo -e "${YELLOW}!${NC} google-generativeai not installed (run: pip install -r server/chatbot/requirements.txt)"
+    echo -e "${YELLOW}!${NC} aiohttp not installed (run: pip install -r server/chatbot/requirements.txt)"
     ((CHECKS_FAILED++))
 fi
 